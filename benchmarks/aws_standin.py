@@ -0,0 +1,467 @@
+"""
+Local stand-in for the AWS APIs used by the unlock Lambda functions.
+
+One plain-HTTP port serves the calls the handlers make, so end-to-end load
+tests exercise real botocore serialization, signing, retries and connection
+pooling without an AWS account:
+
+* STS ``AssumeRoot`` (query protocol) – issues fake credentials bound to the
+  target account
+* S3 ``GetBucketPolicy``, ``DeleteBucketPolicy``, ``HeadBucket`` and
+  ``ListBuckets`` (REST-XML, path-style addressing)
+* SQS ``GetQueueUrl``, ``GetQueueAttributes``, ``SetQueueAttributes`` and
+  ``ListQueues`` (JSON protocol)
+
+S3 and SQS requests are routed to the account of the credentials they are
+signed with; signatures are not verified.  State is seeded from the JSON
+fixture format of the dry-run simulator (``DRY_RUN_FIXTURE``) and changes as
+policies are deleted.  Without a fixture, any bucket or queue whose name
+contains "present" exists, locked by a deny-all policy.
+
+Every operation waits ``--latency-ms`` plus up to ``--jitter-ms`` and fails
+with a throttling error at ``--throttle-rate`` and an internal error at
+``--error-rate``; ``--faults`` overrides these per operation with a JSON file
+such as ``{"AssumeRoot": {"latency_ms": 150, "throttle_rate": 0.05}}``.
+Request, throttle and error counts per operation are printed as JSON on exit.
+
+Usage::
+
+    python benchmarks/aws_standin.py --port 4566 --fixture accounts.json --latency-ms 20
+
+    ENDPOINT_URL=http://127.0.0.1:4566 AWS_ACCESS_KEY_ID=test \\
+        AWS_SECRET_ACCESS_KEY=test AWS_DEFAULT_REGION=us-east-1 ...
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from xml.sax.saxutils import escape
+
+STS_NAMESPACE = "https://sts.amazonaws.com/doc/2011-06-15/"
+S3_NAMESPACE = "http://s3.amazonaws.com/doc/2006-03-01/"
+_CREDENTIAL_RE = re.compile(r"Credential=([^/,\s]+)/")
+
+
+class FaultProfile:
+    """Latency and failure rates applied to one operation."""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, throttle_rate=0.0, error_rate=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+
+    def apply(self):
+        """Sleep the configured latency; return "throttle", "error" or None."""
+        delay_ms = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+        roll = random.random()
+        if roll < self.throttle_rate:
+            return "throttle"
+        if roll < self.throttle_rate + self.error_rate:
+            return "error"
+        return None
+
+
+class StandInState:
+    """Accounts, buckets, queues and policies held by the stand-in.
+
+    Policies are stored as JSON strings, or None for resources without one.
+    """
+
+    def __init__(self, fixture=None, region="us-east-1"):
+        self.region = region
+        self.seeded = fixture is not None
+        self._lock = threading.Lock()
+        self._credentials = {}
+        self._resources = {"buckets": {}, "queues": {}}
+        for account_id, account in (fixture or {}).get("accounts", {}).items():
+            for kind in ("buckets", "queues"):
+                self._resources[kind][account_id] = {
+                    name: None if policy is None else json.dumps(policy)
+                    for name, policy in (account.get(kind) or {}).items()
+                }
+
+    def issue_credentials(self, account_id, duration_seconds):
+        access_key = "ASIA" + uuid.uuid4().hex[:16].upper()
+        with self._lock:
+            self._credentials[access_key] = account_id
+        expiration = datetime.now(timezone.utc) + timedelta(seconds=duration_seconds)
+        return {
+            "AccessKeyId": access_key,
+            "SecretAccessKey": uuid.uuid4().hex,
+            "SessionToken": uuid.uuid4().hex,
+            "Expiration": expiration.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }
+
+    def account_for(self, access_key):
+        with self._lock:
+            return self._credentials.get(access_key)
+
+    def _account(self, kind, account_id, name=None):
+        # Callers hold self._lock.
+        account = self._resources[kind].setdefault(account_id, {})
+        if name is not None and name not in account:
+            if self.seeded or "present" not in name.lower():
+                return None
+            service = "s3" if kind == "buckets" else "sqs"
+            account[name] = json.dumps(
+                {
+                    "Version": "2012-10-17",
+                    "Statement": [
+                        {
+                            "Effect": "Deny",
+                            "Principal": "*",
+                            "Action": f"{service}:*",
+                            "Resource": "*",
+                        }
+                    ],
+                }
+            )
+        return account
+
+    def names(self, kind, account_id):
+        with self._lock:
+            return sorted(self._account(kind, account_id))
+
+    def get_policy(self, kind, account_id, name):
+        """Return ``(exists, policy)`` for ``name``."""
+        with self._lock:
+            account = self._account(kind, account_id, name)
+            if account is None:
+                return False, None
+            return True, account[name]
+
+    def set_policy(self, kind, account_id, name, policy):
+        """Replace the policy of ``name``; returns False when it does not exist."""
+        with self._lock:
+            account = self._account(kind, account_id, name)
+            if account is None:
+                return False
+            account[name] = policy or None
+            return True
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding the stand-in state and fault profiles."""
+
+    daemon_threads = True
+
+    def __init__(self, address, state, faults=None, default_fault=None, verbose=False):
+        super().__init__(address, StandInHandler)
+        self.state = state
+        self.faults = faults or {}
+        self.default_fault = default_fault or FaultProfile()
+        self.verbose = verbose
+        self.stats = defaultdict(lambda: {"requests": 0, "throttled": 0, "errors": 0})
+        self._stats_lock = threading.Lock()
+
+    @property
+    def endpoint_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def inject(self, operation):
+        """Apply the fault profile of ``operation`` and count the outcome."""
+        fault = self.faults.get(operation, self.default_fault).apply()
+        with self._stats_lock:
+            stats = self.stats[operation]
+            stats["requests"] += 1
+            if fault == "throttle":
+                stats["throttled"] += 1
+            elif fault == "error":
+                stats["errors"] += 1
+        return fault
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Routes one HTTP request to the STS, SQS or S3 implementation."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self._dispatch()
+
+    do_HEAD = do_DELETE = do_POST = do_PUT = do_GET
+
+    def _dispatch(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        target = self.headers.get("X-Amz-Target", "")
+        content_type = self.headers.get("Content-Type", "")
+        if target.startswith("AmazonSQS."):
+            self._sqs(target.split(".", 1)[1], json.loads(body or b"{}"))
+        elif self.command == "POST" and content_type.startswith(
+            "application/x-www-form-urlencoded"
+        ):
+            params = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+            self._sts(params.get("Action", ""), params)
+        else:
+            self._s3()
+
+    def _send(self, status, body=b"", content_type="application/xml", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("x-amzn-RequestId", str(uuid.uuid4()))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _caller_account(self):
+        match = _CREDENTIAL_RE.search(self.headers.get("Authorization", ""))
+        return self.server.state.account_for(match.group(1)) if match else None
+
+    # --- STS -----------------------------------------------------------------
+
+    def _sts_error(self, status, code, message):
+        body = (
+            f'<ErrorResponse xmlns="{STS_NAMESPACE}"><Error><Type>Sender</Type>'
+            f"<Code>{code}</Code><Message>{escape(message)}</Message></Error>"
+            f"<RequestId>{uuid.uuid4()}</RequestId></ErrorResponse>"
+        )
+        self._send(status, body.encode(), "text/xml")
+
+    def _sts(self, action, params):
+        if action != "AssumeRoot":
+            return self._sts_error(400, "InvalidAction", f"{action} is not supported")
+        fault = self.server.inject(action)
+        if fault == "throttle":
+            return self._sts_error(400, "Throttling", "Rate exceeded")
+        if fault == "error":
+            return self._sts_error(500, "InternalFailure", "Injected failure")
+
+        creds = self.server.state.issue_credentials(
+            params.get("TargetPrincipal", ""), int(params.get("DurationSeconds", 900))
+        )
+        body = (
+            f'<AssumeRootResponse xmlns="{STS_NAMESPACE}"><AssumeRootResult>'
+            "<Credentials>"
+            + "".join(f"<{key}>{value}</{key}>" for key, value in creds.items())
+            + "</Credentials>"
+            f"<SourceIdentity>{escape(params.get('TargetPrincipal', ''))}</SourceIdentity>"
+            "</AssumeRootResult>"
+            f"<ResponseMetadata><RequestId>{uuid.uuid4()}</RequestId></ResponseMetadata>"
+            "</AssumeRootResponse>"
+        )
+        self._send(200, body.encode(), "text/xml")
+
+    # --- S3 ------------------------------------------------------------------
+
+    def _s3_error(self, status, code, message):
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            f"<Error><Code>{code}</Code><Message>{escape(message)}</Message>"
+            f"<RequestId>{uuid.uuid4()}</RequestId></Error>"
+        )
+        self._send(status, body.encode())
+
+    def _s3(self):
+        url = urlsplit(self.path)
+        bucket = url.path.strip("/").split("/", 1)[0]
+        query = parse_qs(url.query, keep_blank_values=True)
+        if not bucket and self.command == "GET":
+            operation = "ListBuckets"
+        elif bucket and self.command == "HEAD":
+            operation = "HeadBucket"
+        elif bucket and "policy" in query and self.command in ("GET", "DELETE"):
+            operation = "GetBucketPolicy" if self.command == "GET" else "DeleteBucketPolicy"
+        else:
+            return self._s3_error(501, "NotImplemented", f"{self.command} {url.path}")
+
+        fault = self.server.inject(operation)
+        if fault == "throttle":
+            return self._s3_error(503, "SlowDown", "Please reduce your request rate.")
+        if fault == "error":
+            return self._s3_error(500, "InternalError", "Injected failure")
+        account_id = self._caller_account()
+        if account_id is None:
+            return self._s3_error(403, "InvalidAccessKeyId", "Unknown access key")
+
+        state = self.server.state
+        if operation == "ListBuckets":
+            # Like S3, report BucketRegion only on paginated or filtered listings.
+            paginated = any(
+                key in query
+                for key in ("max-buckets", "prefix", "continuation-token", "bucket-region")
+            )
+            region = f"<BucketRegion>{state.region}</BucketRegion>" if paginated else ""
+            buckets = "".join(
+                f"<Bucket><Name>{escape(name)}</Name>"
+                "<CreationDate>2024-01-01T00:00:00.000Z</CreationDate>"
+                f"{region}</Bucket>"
+                for name in state.names("buckets", account_id)
+            )
+            body = (
+                f'<ListAllMyBucketsResult xmlns="{S3_NAMESPACE}">'
+                f"<Owner><ID>{account_id}</ID></Owner><Buckets>{buckets}</Buckets>"
+                "</ListAllMyBucketsResult>"
+            )
+            return self._send(200, body.encode())
+
+        exists, policy = state.get_policy("buckets", account_id, bucket)
+        if not exists:
+            return self._s3_error(404, "NoSuchBucket", "The specified bucket does not exist")
+        if operation == "HeadBucket":
+            return self._send(200, headers={"x-amz-bucket-region": state.region})
+        if operation == "GetBucketPolicy":
+            if policy is None:
+                return self._s3_error(
+                    404, "NoSuchBucketPolicy", "The bucket policy does not exist"
+                )
+            return self._send(200, policy.encode(), "application/json")
+        state.set_policy("buckets", account_id, bucket, None)
+        self._send(204)
+
+    # --- SQS -----------------------------------------------------------------
+
+    def _sqs_error(self, status, code, message, query_code=None):
+        body = json.dumps({"__type": f"com.amazonaws.sqs#{code}", "message": message})
+        fault_type = "Sender" if status < 500 else "Receiver"
+        self._send(
+            status,
+            body.encode(),
+            "application/x-amz-json-1.0",
+            {"x-amzn-query-error": f"{query_code or code};{fault_type}"},
+        )
+
+    def _sqs_reply(self, payload):
+        self._send(200, json.dumps(payload).encode(), "application/x-amz-json-1.0")
+
+    def _queue_url(self, account_id, name):
+        return f"http://{self.headers.get('Host')}/{account_id}/{name}"
+
+    def _sqs(self, operation, params):
+        supported = ("GetQueueUrl", "GetQueueAttributes", "SetQueueAttributes", "ListQueues")
+        if operation not in supported:
+            return self._sqs_error(400, "InvalidAction", f"{operation} is not supported")
+        fault = self.server.inject(operation)
+        if fault == "throttle":
+            return self._sqs_error(400, "RequestThrottled", "Rate exceeded")
+        if fault == "error":
+            return self._sqs_error(500, "InternalError", "Injected failure")
+        account_id = self._caller_account()
+        if account_id is None:
+            return self._sqs_error(403, "InvalidClientTokenId", "Unknown access key")
+
+        state = self.server.state
+        if operation == "ListQueues":
+            prefix = params.get("QueueNamePrefix", "")
+            return self._sqs_reply(
+                {
+                    "QueueUrls": [
+                        self._queue_url(account_id, name)
+                        for name in state.names("queues", account_id)
+                        if name.startswith(prefix)
+                    ]
+                }
+            )
+
+        if operation == "GetQueueUrl":
+            name = params.get("QueueName", "")
+        else:
+            owner, name = params.get("QueueUrl", "").rstrip("/").rsplit("/", 2)[-2:]
+            if owner != account_id:
+                name = None
+        exists, policy = state.get_policy("queues", account_id, name) if name else (False, None)
+        if not exists:
+            return self._sqs_error(
+                400,
+                "QueueDoesNotExist",
+                "The specified queue does not exist.",
+                query_code="AWS.SimpleQueueService.NonExistentQueue",
+            )
+        if operation == "GetQueueUrl":
+            return self._sqs_reply({"QueueUrl": self._queue_url(account_id, name)})
+        if operation == "GetQueueAttributes":
+            return self._sqs_reply({"Attributes": {"Policy": policy}} if policy else {})
+        if "Policy" in params.get("Attributes", {}):
+            state.set_policy("queues", account_id, name, params["Attributes"]["Policy"])
+        self._sqs_reply({})
+
+
+def start_server(
+    host="127.0.0.1",
+    port=0,
+    fixture=None,
+    faults=None,
+    default_fault=None,
+    region="us-east-1",
+    verbose=False,
+):
+    """Start a stand-in server on a background thread and return it.
+
+    ``port`` 0 picks a free port; the URL is in ``server.endpoint_url``.
+    Call ``server.shutdown()`` to stop it.
+    """
+    server = StandInServer(
+        (host, port),
+        StandInState(fixture, region=region),
+        faults=faults,
+        default_fault=default_fault,
+        verbose=verbose,
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=4566, help="port to listen on")
+    parser.add_argument("--region", default="us-east-1", help="region reported for buckets")
+    parser.add_argument("--fixture", help="JSON file seeding accounts, buckets and queues")
+    parser.add_argument("--latency-ms", type=float, default=0, help="latency of every call")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="random extra latency")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="fraction throttled")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction failed")
+    parser.add_argument("--faults", help="JSON file of per-operation fault profiles")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    fixture = None
+    if args.fixture:
+        with open(args.fixture) as f:
+            fixture = json.load(f)
+    faults = {}
+    if args.faults:
+        with open(args.faults) as f:
+            faults = {op: FaultProfile(**profile) for op, profile in json.load(f).items()}
+    default_fault = FaultProfile(
+        args.latency_ms, args.jitter_ms, args.throttle_rate, args.error_rate
+    )
+
+    server = StandInServer(
+        (args.host, args.port),
+        StandInState(fixture, region=args.region),
+        faults=faults,
+        default_fault=default_fault,
+        verbose=args.verbose,
+    )
+    print(f"AWS stand-in listening on {server.endpoint_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,482 @@
+"""
+Load generator for the unlock Lambda functions.
+
+Replays a weighted mix of S3 and SQS GET/POST events against both
+``lambda_handler`` functions in one process, from ``--concurrency`` worker
+threads (the closest local equivalent of one warm container serving a burst),
+and reports:
+
+* ``throughput_rps`` – completed requests per second
+* ``latency_ms``     – mean, p50, p95, p99 and max, overall and per operation
+* ``outcomes``       – responses per operation by ``statusCode`` and body
+  ``status``, plus exceptions escaping the handler by type
+* ``allocations``    – with ``--tracemalloc``: peak and retained traced
+  memory and the top allocation sites in the Lambda code
+
+Three backends are available through ``--backend``:
+
+* ``mock``    – an in-process fake boto3 session in which every bucket and
+  queue is locked; measures the handler overhead alone
+* ``dry-run`` – ``ENVIRONMENT=development`` and the dry-run simulator, slowed
+  down and failed by the ``--latency-ms`` / ``--jitter-ms`` /
+  ``--throttle-rate`` / ``--error-rate`` options
+* ``standin`` – real botocore calls against ``benchmarks/aws_standin.py``,
+  started in-process with the same fault options
+
+With ``--rate``, requests are started on a fixed schedule and latency is
+measured from each scheduled start, so queueing behind a saturated worker pool
+shows up in the percentiles instead of silently lowering the rate.  All other
+configuration (caches, rate governor, pool sizes) is read from the usual
+environment variables.  Results are printed as JSON and optionally written to
+``--output`` for comparison between runs.
+
+Usage::
+
+    python benchmarks/load_test.py --backend mock --requests 5000 --concurrency 16
+    python benchmarks/load_test.py --backend standin --rate 200 --duration 30 \\
+        --latency-ms 20 --jitter-ms 10 --output load.json
+"""
+
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+_BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+_REPO_ROOT = os.path.dirname(_BENCHMARKS_DIR)
+_LAMBDA_CODE_DIR = os.path.join(_REPO_ROOT, "lambda_code")
+_COMMON_LAYER_DIR = os.path.join(_LAMBDA_CODE_DIR, "unlock_common_layer", "python")
+
+FUNCTIONS = {
+    "s3": {
+        "module": "unlock_s3_bucket",
+        "path": os.path.join(_LAMBDA_CODE_DIR, "unlock_s3_bucket_lambda"),
+        "name_key": "bucket_name",
+    },
+    "sqs": {
+        "module": "unlock_sqs_queue",
+        "path": os.path.join(_LAMBDA_CODE_DIR, "unlock_sqs_queue_lambda"),
+        "name_key": "queue_name",
+    },
+}
+
+DEFAULT_MIX = "s3:GET=8,s3:POST=2,sqs:GET=8,sqs:POST=2"
+
+
+def deny_all_policy(service):
+    return {
+        "Version": "2012-10-17",
+        "Statement": [
+            {"Effect": "Deny", "Principal": "*", "Action": f"{service}:*", "Resource": "*"}
+        ],
+    }
+
+
+def parse_mix(mix):
+    """Parse ``"s3:GET=8,sqs:POST=2"`` into ``[("s3", "GET", 8.0), ...]``."""
+    operations = []
+    for part in mix.split(","):
+        operation, _, weight = part.strip().partition("=")
+        service, _, action = operation.partition(":")
+        if service not in FUNCTIONS or action not in ("GET", "POST"):
+            raise ValueError(f"Unknown operation in mix: {operation!r}")
+        operations.append((service, action, float(weight or 1)))
+    return operations
+
+
+def account_ids(count):
+    return [f"{100000000000 + i:012d}" for i in range(count)]
+
+
+def resource_name(service, index):
+    # "present" makes the resource exist in the dry-run simulator without a fixture.
+    kind = "bucket" if service == "s3" else "queue"
+    return f"present-{kind}-{index:05d}"
+
+
+class EventGenerator:
+    """Thread-safe, seeded source of handler events following the mix."""
+
+    def __init__(self, operations, accounts, resources, seed):
+        self.operations = operations
+        self.weights = [weight for _, _, weight in operations]
+        self.accounts = accounts
+        self.resources = resources
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            service, action, _ = self._random.choices(self.operations, self.weights)[0]
+            account_id = self._random.choice(self.accounts)
+            index = self._random.randrange(self.resources)
+        event = {
+            "account_id": account_id,
+            FUNCTIONS[service]["name_key"]: resource_name(service, index),
+            "action": action,
+        }
+        return f"{service}:{action}", service, event
+
+
+# ---------------------------------------------------------------------------
+# Mock backend: a fake boto3 session answering from memory
+# ---------------------------------------------------------------------------
+
+
+class _Meta:
+    def __init__(self, region_name):
+        self.region_name = region_name
+
+
+class _Events:
+    def register(self, *args, **kwargs):
+        pass
+
+
+class MockSTSClient:
+    def __init__(self, region_name):
+        self.meta = _Meta(region_name)
+
+    def assume_root(self, **kwargs):
+        return {
+            "Credentials": {
+                "AccessKeyId": "ASIAMOCKACCESSKEY",
+                "SecretAccessKey": "mock-secret-access-key",
+                "SessionToken": "mock-session-token",
+                "Expiration": datetime.now(timezone.utc) + timedelta(minutes=15),
+            }
+        }
+
+
+class MockS3Client:
+    def __init__(self, region_name):
+        self.meta = _Meta(region_name)
+        self._policy = json.dumps(deny_all_policy("s3"))
+
+    def head_bucket(self, Bucket):
+        headers = {"x-amz-bucket-region": self.meta.region_name}
+        return {"ResponseMetadata": {"HTTPHeaders": headers}}
+
+    def get_bucket_policy(self, Bucket):
+        return {"Policy": self._policy}
+
+    def delete_bucket_policy(self, Bucket):
+        return {}
+
+
+class MockSQSClient:
+    def __init__(self, region_name):
+        self.meta = _Meta(region_name)
+        self._policy = json.dumps(deny_all_policy("sqs"))
+
+    def get_queue_url(self, QueueName, **kwargs):
+        return {"QueueUrl": f"https://sqs.{self.meta.region_name}.amazonaws.com/{QueueName}"}
+
+    def get_queue_attributes(self, QueueUrl, AttributeNames):
+        return {"Attributes": {"Policy": self._policy}}
+
+    def set_queue_attributes(self, QueueUrl, Attributes):
+        return {}
+
+
+class MockSession:
+    """Stands in for ``boto3.Session``; every bucket and queue stays locked."""
+
+    _clients = {"sts": MockSTSClient, "s3": MockS3Client, "sqs": MockSQSClient}
+
+    def __init__(self, region_name="us-east-1"):
+        self.region_name = region_name
+        self.events = _Events()
+
+    def client(self, service, region_name=None, **kwargs):
+        return self._clients[service](region_name or self.region_name)
+
+
+# ---------------------------------------------------------------------------
+# Running the load
+# ---------------------------------------------------------------------------
+
+
+def configure_environment(args):
+    """Set the environment read by the Lambda modules at import time."""
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ["POWERTOOLS_LOG_LEVEL"] = args.log_level
+    os.environ.setdefault("POWERTOOLS_SERVICE_NAME", "load-test")
+    if args.backend == "dry-run":
+        os.environ["DRY_RUN_LATENCY_MS"] = str(int(args.latency_ms))
+        os.environ["DRY_RUN_JITTER_MS"] = str(int(args.jitter_ms))
+        os.environ["DRY_RUN_THROTTLE_RATE"] = str(args.throttle_rate)
+        os.environ["DRY_RUN_ERROR_RATE"] = str(args.error_rate)
+    if args.backend == "standin":
+        os.environ["AWS_ACCESS_KEY_ID"] = "test"
+        os.environ["AWS_SECRET_ACCESS_KEY"] = "test"
+        os.environ.pop("AWS_PROFILE", None)
+
+
+def load_handlers(services):
+    handlers = {}
+    if _COMMON_LAYER_DIR not in sys.path:
+        sys.path.insert(0, _COMMON_LAYER_DIR)
+    for service in services:
+        spec = FUNCTIONS[service]
+        if spec["path"] not in sys.path:
+            sys.path.insert(0, spec["path"])
+        handlers[service] = importlib.import_module(spec["module"])
+    return handlers
+
+
+@contextlib.contextmanager
+def backend(name, handlers, args):
+    """Point every handler module at the selected backend for the run."""
+    with contextlib.ExitStack() as stack:
+        server = None
+        if name == "standin":
+            if _BENCHMARKS_DIR not in sys.path:
+                sys.path.insert(0, _BENCHMARKS_DIR)
+            import aws_standin
+
+            accounts = {
+                account_id: {
+                    "buckets": {
+                        resource_name("s3", i): deny_all_policy("s3")
+                        for i in range(args.resources)
+                    },
+                    "queues": {
+                        resource_name("sqs", i): deny_all_policy("sqs")
+                        for i in range(args.resources)
+                    },
+                }
+                for account_id in account_ids(args.accounts)
+            }
+            server = aws_standin.start_server(
+                fixture={"accounts": accounts},
+                default_fault=aws_standin.FaultProfile(
+                    latency_ms=args.latency_ms,
+                    jitter_ms=args.jitter_ms,
+                    throttle_rate=args.throttle_rate,
+                    error_rate=args.error_rate,
+                ),
+            )
+            stack.callback(server.server_close)
+            stack.callback(server.shutdown)
+        import unlock_common
+
+        for module in handlers.values():
+            environment = "development" if name == "dry-run" else ""
+            stack.enter_context(patch.object(module, "ENVIRONMENT", environment))
+        if name == "mock":
+            stack.enter_context(
+                patch.object(unlock_common, "get_boto3_session", return_value=MockSession())
+            )
+        if server is not None:
+            stack.enter_context(
+                patch.object(unlock_common, "ENDPOINT_URL", server.endpoint_url)
+            )
+        unlock_common.reset_clients()
+        stack.callback(unlock_common.reset_clients)
+        # EMF metrics are serialized as in Lambda, but not printed.
+        devnull = stack.enter_context(open(os.devnull, "w"))
+        stack.enter_context(contextlib.redirect_stdout(devnull))
+        yield server
+
+
+def outcome_of(response):
+    body = response.get("body") if isinstance(response, dict) else None
+    status = body.get("status") if isinstance(body, dict) else None
+    return f"{response.get('statusCode')} {status}", response.get("statusCode", 500)
+
+
+def run_load(handlers, generator, args):
+    """Issue the requests and return ``(samples, elapsed_seconds)``.
+
+    Each sample is ``(operation, latency_ms, outcome, is_error)``.
+    """
+    samples = []
+    lock = threading.Lock()
+    issued = 0
+    start = time.perf_counter()
+    stop_at = start + args.duration if args.duration else None
+    total = None if args.duration else args.requests
+
+    def worker():
+        nonlocal issued
+        while True:
+            with lock:
+                index = issued
+                issued += 1
+            if total is not None and index >= total:
+                return
+            scheduled = start + index / args.rate if args.rate else time.perf_counter()
+            if stop_at is not None and scheduled >= stop_at:
+                return
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            operation, service, event = generator.next()
+            try:
+                response = handlers[service].lambda_handler(event, None)
+                outcome, status_code = outcome_of(response)
+                is_error = status_code >= 400
+            except Exception as e:
+                outcome, is_error = f"exception {type(e).__name__}", True
+            latency_ms = (time.perf_counter() - scheduled) * 1000
+            samples.append((operation, latency_ms, outcome, is_error))
+
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def latency_summary(values):
+    if not values:
+        return {}
+    ordered = sorted(values)
+    if len(ordered) > 1:
+        cuts = statistics.quantiles(ordered, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = ordered[0]
+    return {
+        "mean": round(statistics.fmean(ordered), 3),
+        "p50": round(p50, 3),
+        "p95": round(p95, 3),
+        "p99": round(p99, 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+def summarize(samples, elapsed):
+    by_operation = defaultdict(list)
+    outcomes = defaultdict(Counter)
+    errors = 0
+    for operation, latency_ms, outcome, is_error in samples:
+        by_operation[operation].append(latency_ms)
+        outcomes[operation][outcome] += 1
+        errors += is_error
+    return {
+        "requests": len(samples),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "latency_ms": latency_summary([sample[1] for sample in samples]),
+        "operations": {
+            operation: {
+                "requests": len(latencies),
+                "latency_ms": latency_summary(latencies),
+                "outcomes": dict(outcomes[operation].most_common()),
+            }
+            for operation, latencies in sorted(by_operation.items())
+        },
+    }
+
+
+def allocation_summary(before, after, peak, requests, top):
+    stats = [
+        stat
+        for stat in after.compare_to(before, "lineno")
+        if stat.traceback[0].filename.startswith(_LAMBDA_CODE_DIR)
+    ]
+    stats.sort(key=lambda stat: stat.size_diff, reverse=True)
+    retained = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return {
+        "peak_kib": round(peak / 1024, 1),
+        "retained_kib": round(retained / 1024, 1),
+        "retained_bytes_per_request": round(retained / requests, 1) if requests else 0,
+        "top_sites": [
+            {
+                "location": f"{os.path.basename(stat.traceback[0].filename)}:"
+                f"{stat.traceback[0].lineno}",
+                "size_kib": round(stat.size_diff / 1024, 1),
+                "blocks": stat.count_diff,
+            }
+            for stat in stats[:top]
+        ],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--backend", choices=("mock", "dry-run", "standin"), default="mock"
+    )
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="weighted service:ACTION mix")
+    parser.add_argument("--requests", type=int, default=1000, help="requests to send")
+    parser.add_argument("--duration", type=float, help="send for this many seconds instead")
+    parser.add_argument("--rate", type=float, default=0, help="target req/s (0: unthrottled)")
+    parser.add_argument("--concurrency", type=int, default=8, help="worker threads")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured warm-up requests")
+    parser.add_argument("--accounts", type=int, default=1, help="distinct account IDs")
+    parser.add_argument("--resources", type=int, default=100, help="buckets/queues per service")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the request mix")
+    parser.add_argument("--latency-ms", type=float, default=0, help="backend call latency")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="random extra latency")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="fraction throttled")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction failed")
+    parser.add_argument("--tracemalloc", action="store_true", help="trace allocations")
+    parser.add_argument("--top", type=int, default=10, help="allocation sites to report")
+    parser.add_argument("--log-level", default="CRITICAL", help="Powertools log level")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args(argv)
+
+    operations = parse_mix(args.mix)
+    configure_environment(args)
+    handlers = load_handlers(sorted({service for service, _, _ in operations}))
+    accounts = account_ids(args.accounts)
+
+    with backend(args.backend, handlers, args) as server:
+        warmup = EventGenerator(operations, accounts, args.resources, args.seed + 1)
+        for _ in range(args.warmup):
+            _, service, event = warmup.next()
+            handlers[service].lambda_handler(event, None)
+        if server is not None:
+            server.stats.clear()
+
+        generator = EventGenerator(operations, accounts, args.resources, args.seed)
+        if args.tracemalloc:
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+        samples, elapsed = run_load(handlers, generator, args)
+        if args.tracemalloc:
+            after = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    results = {
+        "python": sys.version.split()[0],
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "top", "log_level")
+        },
+        **summarize(samples, elapsed),
+    }
+    if args.tracemalloc:
+        results["allocations"] = allocation_summary(
+            before, after, peak, len(samples), args.top
+        )
+    if server is not None:
+        results["backend_calls"] = server.stats
+
+    output = json.dumps(results, indent=2, default=str)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
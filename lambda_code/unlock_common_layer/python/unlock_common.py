@@ -0,0 +1,2338 @@
+"""Infrastructure shared by the unlock Lambda functions.
+
+Shipped to both functions as a Lambda layer: logging, metrics, tracing,
+profiling, invocation deadlines, clients and root credentials, rate
+governors, idempotency, and the batch, job and SQS event modes.  The
+function modules keep what is specific to their service and describe it to
+the shared request handling with an ``UnlockService``.
+"""
+
+import fnmatch
+import hashlib
+import importlib
+import re
+import os
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timezone
+from aws_lambda_powertools import Logger
+from aws_lambda_powertools.metrics import EphemeralMetrics, MetricUnit, single_metric
+from aws_lambda_powertools.metrics.provider import cold_start
+
+# Log volume controls.  Events are summarized at INFO and logged in full only
+# at DEBUG, and policies larger than LOG_POLICY_MAX_BYTES are logged as their
+# size and hash.  POWERTOOLS_LOGGER_SAMPLE_RATE logs that fraction of
+# invocations at DEBUG.  Each invocation writes at most LOG_BYTE_BUDGET bytes
+# of records below WARNING; the rest are dropped and counted (0 disables).
+LOG_BYTE_BUDGET = int(os.environ.get("LOG_BYTE_BUDGET", "262144"))
+LOG_POLICY_MAX_BYTES = int(os.environ.get("LOG_POLICY_MAX_BYTES", "1024"))
+
+
+class LogBudgetHandler(logging.StreamHandler):
+    """Stream handler that caps the bytes written per invocation.
+
+    Records are formatted once; when one would take the invocation past
+    ``budget`` it is dropped, unless it is a WARNING or above.
+    """
+
+    def __init__(self, stream=None, budget=0):
+        super().__init__(stream)
+        self.budget = budget
+        self.start_invocation()
+
+    def start_invocation(self):
+        self.written = 0
+        self.dropped = 0
+        self.dropped_bytes = 0
+
+    def emit(self, record):
+        try:
+            msg = self.format(record) + self.terminator
+            size = len(msg.encode("utf-8", "replace"))
+            if (
+                self.budget
+                and record.levelno < logging.WARNING
+                and self.written + size > self.budget
+            ):
+                self.dropped += 1
+                self.dropped_bytes += size
+                return
+            self.written += size
+            self.stream.write(msg)
+            self.flush()
+        except Exception:
+            self.handleError(record)
+
+
+logger = Logger(logger_handler=LogBudgetHandler(sys.stdout, LOG_BYTE_BUDGET))
+# The handler actually attached: loggers sharing a service name reuse the
+# handler of the first one.
+log_handler = logger.powertools_handler
+
+PROFILE_NAME = "sandbox"  # Used only for local testing
+
+# Dry-run mode (ENVIRONMENT=development) answers from an in-memory simulator
+# instead of AWS.  DRY_RUN_FIXTURE names a JSON file seeding its accounts,
+# resources and policies; every simulated call can be slowed down and fail
+# with throttling or internal errors, to load-test the handlers offline.
+DRY_RUN_FIXTURE = os.environ.get("DRY_RUN_FIXTURE", "")
+DRY_RUN_LATENCY_MS = int(os.environ.get("DRY_RUN_LATENCY_MS", "0"))
+DRY_RUN_JITTER_MS = int(os.environ.get("DRY_RUN_JITTER_MS", "0"))
+DRY_RUN_THROTTLE_RATE = float(os.environ.get("DRY_RUN_THROTTLE_RATE", "0"))
+DRY_RUN_ERROR_RATE = float(os.environ.get("DRY_RUN_ERROR_RATE", "0"))
+
+# Per-phase latency, throttle and outcome metrics are emitted as CloudWatch
+# EMF under the action dimension; the account ID is attached as metadata to
+# keep the number of metric series independent of the number of accounts.
+METRICS_NAMESPACE = os.environ.get(
+    "POWERTOOLS_METRICS_NAMESPACE", "AWSRootAccessManagement"
+)
+THROTTLE_ERROR_CODES = frozenset(
+    (
+        "Throttling",
+        "ThrottlingException",
+        "ThrottledException",
+        "RequestThrottled",
+        "RequestThrottledException",
+        "TooManyRequestsException",
+        "SlowDown",
+        "RequestLimitExceeded",
+    )
+)
+TRANSIENT_ERROR_CODES = frozenset(
+    (
+        "InternalError",
+        "InternalFailure",
+        "ServiceUnavailable",
+        "RequestTimeout",
+        "RequestTimeoutException",
+    )
+)
+# Phases and fan-out workers are traced as X-Ray subsegments when the
+# function runs with active tracing.  Setting TRACE_EXPORT_FILE also writes
+# every span as a JSON line to that file, for offline profiling.
+TRACE_EXPORT_FILE = os.environ.get("TRACE_EXPORT_FILE", "")
+
+# Set PROFILE_INVOCATIONS=true, or send "profile": true in the event, to
+# profile invocations.  PROFILE_MODE "cprofile" records every call made by the
+# handler and the threads it starts and writes pstats; "sample" samples the
+# stacks of all threads every PROFILE_INTERVAL_MS and writes collapsed stacks
+# for flame graphs.
+# Files go to PROFILE_OUTPUT_DIR, and the top PROFILE_LOG_TOP functions are
+# logged with the output path (0 disables the summary).
+PROFILE_INVOCATIONS = os.environ.get("PROFILE_INVOCATIONS", "false") == "true"
+PROFILE_MODE = os.environ.get("PROFILE_MODE", "cprofile")
+PROFILE_OUTPUT_DIR = os.environ.get("PROFILE_OUTPUT_DIR", "/tmp")
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+PROFILE_LOG_TOP = int(os.environ.get("PROFILE_LOG_TOP", "20"))
+
+# AssumeRoot credentials are reused across warm invocations until shortly
+# before they expire.
+CREDENTIALS_DURATION_SECONDS = 900
+CREDENTIALS_CACHE_SIZE = int(os.environ.get("CREDENTIALS_CACHE_SIZE", "64"))
+CREDENTIALS_REFRESH_MARGIN_SECONDS = int(
+    os.environ.get("CREDENTIALS_REFRESH_MARGIN_SECONDS", "60")
+)
+
+# boto3 clients are expensive to build (service model loading, TLS set-up), so
+# they are created once per container and shared by every invocation.  boto3
+# itself is only imported on first use: the dry-run path never needs it.  With
+# PREWARM_CLIENTS the clients and endpoint data are loaded during Lambda init.
+PREWARM_CLIENTS = os.environ.get("PREWARM_CLIENTS", "false") == "true"
+SERVICE_CLIENT_CACHE_SIZE = int(os.environ.get("SERVICE_CLIENT_CACHE_SIZE", "64"))
+CLIENT_CONFIG_OPTIONS = dict(
+    connect_timeout=int(os.environ.get("CLIENT_CONNECT_TIMEOUT", "5")),
+    read_timeout=int(os.environ.get("CLIENT_READ_TIMEOUT", "10")),
+    max_pool_connections=int(os.environ.get("CLIENT_MAX_POOL_CONNECTIONS", "20")),
+    tcp_keepalive=True,
+    retries={"max_attempts": 3, "mode": "standard"},
+)
+# STS and S3/SQS calls go to ENDPOINT_URL when set, e.g. the local stand-in
+# server in benchmarks/aws_standin.py used for offline end-to-end load tests.
+ENDPOINT_URL = os.environ.get("ENDPOINT_URL", "")
+
+# Outcomes kept in the functions' negative caches.
+NEGATIVE_STATUSES = ("not_found", "not_locked")
+
+# Repeated unlock requests for the same resource (double clicks, client
+# retries) are answered from the first result: concurrent duplicates share one
+# in-flight call and POST results are kept for IDEMPOTENCY_TTL_SECONDS, in
+# DynamoDB when IDEMPOTENCY_TABLE is set and in memory otherwise.
+IDEMPOTENCY_TABLE = os.environ.get("IDEMPOTENCY_TABLE", "")
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "60"))
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "1024"))
+
+# Every invocation works to a deadline: the Lambda context's remaining time
+# minus DEADLINE_MARGIN_MS, kept back to build and return the response.  No
+# AWS call or retry is started after the deadline, the read timeout of every
+# attempt is capped to fit it, and a request still running then is answered
+# with a 504 timeout.  Worker threads keep the deadline of the invocation that
+# started them.
+DEADLINE_MARGIN_MS = int(os.environ.get("DEADLINE_MARGIN_MS", "1000"))
+
+# AssumeRoot and the S3/SQS calls of an unlock go through client-side rate
+# governors, so mass unlocks approach the API quotas instead of failing in
+# throttling storms: token buckets (STS_RATE_LIMIT AssumeRoot calls per second
+# per container, ACCOUNT_RATE_LIMIT S3/SQS calls per second per target
+# account), an AIMD concurrency limit that is halved on throttling, and
+# jittered retries of throttled and transient failures.  The governed STS and
+# S3/SQS clients make a single attempt per call, so all retries and backoff
+# are the governor's.  Requests still throttled after the retries get a 429.
+STS_RATE_LIMIT = float(os.environ.get("STS_RATE_LIMIT", "20"))
+ACCOUNT_RATE_LIMIT = float(os.environ.get("ACCOUNT_RATE_LIMIT", "50"))
+GOVERNOR_MAX_CONCURRENCY = int(os.environ.get("GOVERNOR_MAX_CONCURRENCY", "16"))
+GOVERNOR_MAX_RETRIES = int(os.environ.get("GOVERNOR_MAX_RETRIES", "3"))
+GOVERNOR_BASE_DELAY_MS = int(os.environ.get("GOVERNOR_BASE_DELAY_MS", "100"))
+
+# Batch invocations ({"items": [...]}) are processed on a bounded thread pool
+# and must return before the Lambda timeout.
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "500"))
+BATCH_MAX_WORKERS = int(os.environ.get("BATCH_MAX_WORKERS", "16"))
+BATCH_TIMEOUT_MARGIN_MS = int(os.environ.get("BATCH_TIMEOUT_MARGIN_MS", "2000"))
+
+# Asynchronous jobs ({"async": true} on a POST or batch event) return a job ID
+# straight away and run in an invocation of their own (a background thread
+# outside Lambda); callers poll {"action": "STATUS", "job_id": ...} for
+# progress.  Jobs are kept for JOB_TTL_SECONDS in DynamoDB when JOB_TABLE is
+# set and in a local SQLite file (JOB_DB_PATH) otherwise; in Lambda the job
+# runs in another container, so JOB_TABLE is required there.  DynamoDB items
+# are limited to 400 KB: a job record larger than JOB_ITEM_MAX_BYTES is stored
+# with only the status and message of each item result.
+JOB_TABLE = os.environ.get("JOB_TABLE", "")
+JOB_DB_PATH = os.environ.get("JOB_DB_PATH", "/tmp/unlock_jobs.sqlite3")
+JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", "86400"))
+JOB_ITEM_MAX_BYTES = int(os.environ.get("JOB_ITEM_MAX_BYTES", "350000"))
+
+
+class TTLCache:
+    """Thread-safe, size-bounded LRU cache with per-entry expiry.
+
+    Entries expire ``ttl_seconds`` after they are stored (or after the TTL
+    passed to ``set``).  When the cache is full the least recently used entry
+    is evicted.  Hit, miss and eviction counters are kept for diagnostics.
+    """
+
+    def __init__(self, max_size, ttl_seconds=None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def peek(self, key, default=None):
+        """Like ``get`` but without touching the LRU order or the counters."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+            return default
+
+    def set(self, key, value, ttl_seconds=None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if self.max_size <= 0 or ttl is None or ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class ProtectedResourceMatcher:
+    """Decide whether a resource name is protected from unlocking.
+
+    Built once from a list of rules:
+
+    * ``name``         – exact name, looked up in a set
+    * ``prefix*``      – trailing ``*`` only, matched with a prefix trie
+    * ``*glob?[ch]*``  – any other glob, see ``fnmatch``
+    * ``re:<pattern>`` – regular expression, matched from the start of the name
+
+    All globs and regular expressions are combined into a single compiled
+    pattern so a lookup costs one set probe, one trie walk and one regex
+    match regardless of the number of rules.  Regular expressions that
+    cannot be combined (inline global flags such as ``(?i)``, capturing or
+    named groups) are kept as separate patterns.  An invalid regular
+    expression raises ``ValueError`` naming the rule.
+    """
+
+    _END = object()
+
+    def __init__(self, rules=()):
+        self.exact = set()
+        self._trie = {}
+        self._separate = []
+        patterns = []
+        for rule in rules:
+            rule = rule.strip()
+            if not rule:
+                continue
+            if rule.startswith("re:"):
+                try:
+                    compiled = re.compile(rule[3:])
+                except re.error as e:
+                    raise ValueError(f"Invalid protection rule {rule!r}: {e}") from None
+                if self._can_combine(compiled):
+                    patterns.append(compiled.pattern)
+                else:
+                    self._separate.append(compiled)
+            elif rule.endswith("*") and not any(c in rule[:-1] for c in "*?["):
+                self._add_prefix(rule[:-1])
+            elif any(c in rule for c in "*?["):
+                patterns.append(fnmatch.translate(rule))
+            else:
+                self.exact.add(rule)
+        self._pattern = (
+            re.compile("|".join(f"(?:{p})" for p in patterns)) if patterns else None
+        )
+
+    @staticmethod
+    def _can_combine(compiled):
+        # Group numbers and names shift or clash in the alternation, and
+        # global flags are only allowed at the start of the whole expression.
+        if compiled.groups:
+            return False
+        try:
+            re.compile(f"(?:{compiled.pattern})")
+        except re.error:
+            return False
+        return True
+
+    def _add_prefix(self, prefix):
+        node = self._trie
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[self._END] = True
+
+    def _has_prefix(self, name):
+        node = self._trie
+        if self._END in node:
+            return True
+        for char in name:
+            node = node.get(char)
+            if node is None:
+                return False
+            if self._END in node:
+                return True
+        return False
+
+    def matches(self, name):
+        if name in self.exact:
+            return True
+        if self._trie and self._has_prefix(name):
+            return True
+        if self._pattern and self._pattern.match(name):
+            return True
+        return any(pattern.match(name) for pattern in self._separate)
+
+
+class FileSpanExporter:
+    """Append finished spans to ``path``, one JSON document per line."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, record):
+        line = json.dumps(record, default=str)
+        with self._lock, open(self.path, "a") as f:
+            f.write(line + "\n")
+
+
+class InMemorySpanExporter:
+    """Keep finished spans in ``spans``; a stub collector for local runs."""
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def export(self, record):
+        with self._lock:
+            self.spans.append(record)
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+
+
+class SamplingProfiler:
+    """Sample the Python stacks of every thread from a background thread.
+
+    ``stacks`` counts each stack, root first, as a tuple of
+    ``"function (file:line)"`` frames under the thread name; threads that
+    were idle in their own code show up too, which is what a flame graph of
+    the whole container needs.
+    """
+
+    def __init__(self, interval_ms=5.0):
+        self.interval = interval_ms / 1000
+        self.stacks = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _frame_label(self, frame):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)))
+            key = tuple(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def runcall(self, fn, *args, **kwargs):
+        self.start()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.stop()
+
+    def collapsed(self):
+        """Return the stacks in the collapsed format of ``flamegraph.pl``."""
+        return "".join(
+            f"{';'.join(stack)} {count}\n"
+            for stack, count in sorted(self.stacks.items())
+        )
+
+    def top(self, limit):
+        """Return the functions with the most samples at the top of a stack."""
+        counts = {}
+        for stack, count in self.stacks.items():
+            counts[stack[-1]] = counts.get(stack[-1], 0) + count
+        total = sum(counts.values()) or 1
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        return [
+            {
+                "function": name,
+                "samples": count,
+                "percent": round(100 * count / total, 1),
+            }
+            for name, count in ranked[:limit]
+        ]
+
+
+class ThreadedProfile:
+    """cProfile for the calling thread and every thread it starts meanwhile.
+
+    From Python 3.12 cProfile is built on ``sys.monitoring``, which sees all
+    threads, so one profiler covers the invocation; enabling a second one
+    fails with "Another profiling tool is already active".  Before 3.12
+    cProfile only sees the thread that enabled it, while requests run on
+    worker threads; a profiler is therefore enabled in each new thread and
+    their stats are merged.  Pooled threads started before ``runcall`` are
+    profiled for the work ``traced`` hands them; other threads started
+    before it are missed, and a thread whose profiler cannot be enabled runs
+    unprofiled.
+    """
+
+    per_thread = sys.version_info < (3, 12)
+
+    def __init__(self):
+        self._profilers = []
+
+    def _profile_thread(self, *args):
+        import cProfile
+
+        sys.setprofile(None)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except Exception as e:
+            logger.debug("Thread not profiled: %s", e)
+            return
+        self._profilers.append(profiler)
+        _profile_local.profile = self
+
+    def runcall(self, fn, *args, **kwargs):
+        import cProfile
+
+        profiler = cProfile.Profile()
+        self._profilers.append(profiler)
+        if not self.per_thread:
+            return profiler.runcall(fn, *args, **kwargs)
+        threading.setprofile(self._profile_thread)
+        _profile_local.profile = self
+        try:
+            return profiler.runcall(fn, *args, **kwargs)
+        finally:
+            _profile_local.profile = None
+            threading.setprofile(None)
+
+    def run_in_thread(self, fn, *args, **kwargs):
+        """Run ``fn`` profiled on a pooled thread started before ``runcall``."""
+        import cProfile
+
+        if getattr(_profile_local, "profile", None) is self:
+            return fn(*args, **kwargs)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except Exception as e:
+            logger.debug("Thread not profiled: %s", e)
+            return fn(*args, **kwargs)
+        self._profilers.append(profiler)
+        _profile_local.profile = self
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _profile_local.profile = None
+            profiler.disable()
+
+    def stats(self):
+        import pstats
+
+        stats = pstats.Stats(self._profilers[0])
+        for profiler in self._profilers[1:]:
+            stats.add(profiler)
+        return stats
+
+    def top(self, stats, limit):
+        """Return the functions with the highest cumulative time."""
+        # Stats entries: (file, line, function) -> (primitive calls, calls,
+        # own time, cumulative time, callers).
+        ranked = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        return [
+            {
+                "function": f"{name} ({os.path.basename(filename)}:{lineno})",
+                "calls": calls,
+                "cumulative_ms": round(cumulative * 1000, 3),
+                "own_ms": round(own * 1000, 3),
+            }
+            for (filename, lineno, name), (_, calls, own, cumulative, _) in ranked
+        ][:limit]
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Run ``fn`` once for all concurrent callers of ``key``.
+
+        Returns ``(result, shared)``; ``shared`` is True for callers that
+        waited on another caller's execution.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            # Waiters must be released even by SystemExit or
+            # KeyboardInterrupt, or they block forever.
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return result, False
+
+
+class InMemoryIdempotencyStore:
+    """Idempotency records kept in this container only."""
+
+    def __init__(self, max_size):
+        self._cache = TTLCache(max_size)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def put(self, key, data, ttl_seconds):
+        self._cache.set(key, data, ttl_seconds=ttl_seconds)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class DynamoDBIdempotencyStore:
+    """Idempotency records shared by all containers through a DynamoDB table.
+
+    Items are keyed by ``id`` and expire through the table's TTL attribute
+    ``expiration``; expired items not yet removed by DynamoDB are ignored.
+    """
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+
+    def get(self, key):
+        item = (
+            get_dynamodb_client()
+            .get_item(
+                TableName=self.table_name, Key={"id": {"S": key}}, ConsistentRead=True
+            )
+            .get("Item")
+        )
+        if not item or int(item["expiration"]["N"]) <= time.time():
+            return None
+        return item["data"]["S"]
+
+    def put(self, key, data, ttl_seconds):
+        if ttl_seconds <= 0:
+            return
+        get_dynamodb_client().put_item(
+            TableName=self.table_name,
+            Item={
+                "id": {"S": key},
+                "data": {"S": data},
+                "expiration": {"N": str(int(time.time() + ttl_seconds))},
+            },
+        )
+
+    def clear(self):
+        pass
+
+
+class SQLiteJobStore:
+    """Job records in a local SQLite file.
+
+    Stand-in for ``DynamoDBJobStore`` when running locally: the file is not
+    shared between Lambda containers, so a STATUS request may not find a job
+    started by another container.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            import sqlite3
+
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs "
+                "(id TEXT PRIMARY KEY, data TEXT NOT NULL, expiration INTEGER NOT NULL)"
+            )
+        return self._connection
+
+    def get(self, job_id):
+        with self._lock:
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT data FROM jobs WHERE id = ? AND expiration > ?",
+                    (job_id, time.time()),
+                )
+                .fetchone()
+            )
+        return json.loads(row[0]) if row else None
+
+    def put(self, job):
+        with self._lock, self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?)",
+                (job["job_id"], json.dumps(job), job["expiration"]),
+            )
+
+    def clear(self):
+        with self._lock, self._connect() as connection:
+            connection.execute("DELETE FROM jobs")
+
+
+class DynamoDBJobStore:
+    """Job records shared by all containers through a DynamoDB table.
+
+    Items use the layout of ``DynamoDBIdempotencyStore``: the job ID in
+    ``id``, the JSON record in ``data`` and the TTL attribute ``expiration``.
+    """
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+
+    def get(self, job_id):
+        item = (
+            get_dynamodb_client()
+            .get_item(
+                TableName=self.table_name,
+                Key={"id": {"S": job_id}},
+                ConsistentRead=True,
+            )
+            .get("Item")
+        )
+        if not item or int(item["expiration"]["N"]) <= time.time():
+            return None
+        return json.loads(item["data"]["S"])
+
+    def put(self, job):
+        get_dynamodb_client().put_item(
+            TableName=self.table_name,
+            Item={
+                "id": {"S": job["job_id"]},
+                "data": {"S": self._serialize(job)},
+                "expiration": {"N": str(job["expiration"])},
+            },
+        )
+
+    @staticmethod
+    def _serialize(job):
+        """Return the JSON record of ``job``, truncated to fit ``JOB_ITEM_MAX_BYTES``.
+
+        An oversized record keeps every item result, but each body is cut
+        down to its status and message and flagged with ``"truncated": true``.
+        """
+        data = json.dumps(job)
+        if len(data.encode("utf-8")) <= JOB_ITEM_MAX_BYTES:
+            return data
+        logger.warning(
+            "Job %s record is %s bytes, storing truncated results",
+            job["job_id"],
+            len(data.encode("utf-8")),
+        )
+        results = {
+            key: {
+                **result,
+                "body": {
+                    "status": result["body"].get("status"),
+                    "message": result["body"].get("message"),
+                    "truncated": True,
+                },
+            }
+            for key, result in job["results"].items()
+        }
+        return json.dumps({**job, "results": results})
+
+    def clear(self):
+        pass
+
+
+class DeadlineExceeded(Exception):
+    """Raised instead of sending an AWS request after the invocation deadline."""
+
+
+class Deadline:
+    """The deadline of one invocation, as a ``time.monotonic()`` value."""
+
+    def __init__(self, at):
+        self.at = at
+
+    def remaining(self):
+        return max(self.at - time.monotonic(), 0.0)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at ``rate`` tokens per second.
+
+    The bucket holds at most one second of tokens; a rate of 0 disables it.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.capacity = max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Take a token and return 0, or return the seconds until one is free."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            if now > self._updated:
+                refill = (now - self._updated) * self.rate
+                self._tokens = min(self.capacity, self._tokens + refill)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+class AdaptiveConcurrencyLimit:
+    """AIMD limit on concurrent calls.
+
+    The limit grows by about one per round of successful calls, up to
+    ``max_limit``, and is halved whenever a call is throttled.
+    """
+
+    def __init__(self, max_limit):
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(
+                lambda: self._in_flight < int(self.limit), timeout
+            ):
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self, throttled=False):
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class RateGovernor:
+    """Client-side rate limiting and retries for one AWS API family.
+
+    Every attempt takes a token from the global bucket (``rate``) and from
+    the target account's bucket (``account_rate``), and holds a slot of an
+    AIMD concurrency limit.  Throttled and transient failures are retried up
+    to ``max_retries`` times with full-jitter exponential backoff; only
+    throttling shrinks the concurrency limit.  Waiting never runs past the
+    invocation deadline.
+    """
+
+    def __init__(
+        self,
+        rate=0,
+        account_rate=0,
+        max_concurrency=GOVERNOR_MAX_CONCURRENCY,
+        max_retries=GOVERNOR_MAX_RETRIES,
+        base_delay_ms=GOVERNOR_BASE_DELAY_MS,
+    ):
+        self.rate = rate
+        self.account_rate = account_rate
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay_ms = base_delay_ms
+        self.reset()
+
+    def reset(self):
+        self._bucket = TokenBucket(self.rate)
+        # Account buckets are kept for an hour, then recreated full.
+        self._account_buckets = TTLCache(1024, 3600)
+        self._lock = threading.Lock()
+        self.concurrency = AdaptiveConcurrencyLimit(self.max_concurrency)
+
+    def _account_bucket(self, account_id):
+        with self._lock:
+            bucket = self._account_buckets.get(account_id)
+            if bucket is None:
+                bucket = TokenBucket(self.account_rate)
+                self._account_buckets.set(account_id, bucket)
+            return bucket
+
+    def _take(self, bucket):
+        while True:
+            delay = bucket.take()
+            if not delay:
+                return
+            remaining = remaining_seconds()
+            if remaining is not None and delay >= remaining:
+                raise DeadlineExceeded("Rate limit wait would pass the deadline")
+            time.sleep(delay)
+
+    def call(self, account_id, fn, **kwargs):
+        """Return ``fn(**kwargs)``, rate limited for ``account_id``."""
+        attempt = 0
+        while True:
+            self._take(self._bucket)
+            if account_id is not None:
+                self._take(self._account_bucket(account_id))
+            if not self.concurrency.acquire(timeout=remaining_seconds()):
+                raise DeadlineExceeded("No call slot was free before the deadline")
+            throttled = False
+            try:
+                return fn(**kwargs)
+            except Exception as e:
+                throttled = is_throttling_error(e)
+                delay = random.uniform(0, self.base_delay_ms * 2**attempt / 1000)
+                remaining = remaining_seconds()
+                if (
+                    not (throttled or is_transient_error(e))
+                    or attempt >= self.max_retries
+                    or (remaining is not None and delay >= remaining)
+                ):
+                    raise
+                error = e
+            finally:
+                self.concurrency.release(throttled)
+            attempt += 1
+            if throttled:
+                logger.warning(
+                    "Throttled on %s, retry %s in %.0f ms",
+                    account_id,
+                    attempt,
+                    delay * 1000,
+                )
+                add_metric("ThrottleRetries", MetricUnit.Count, 1)
+            else:
+                logger.warning(
+                    "Transient error on %s, retry %s in %.0f ms: %s",
+                    account_id,
+                    attempt,
+                    delay * 1000,
+                    error,
+                )
+            time.sleep(delay)
+
+
+class SimulatedAWSError(Exception):
+    """Fault injected by ``DryRunSimulator``, shaped like a botocore ClientError."""
+
+    def __init__(self, code, message):
+        super().__init__(f"An error occurred ({code}): {message}")
+        self.response = {"Error": {"Code": code, "Message": message}}
+
+
+class DryRunSimulator:
+    """Stateful stand-in for the resource policies used in dry-run mode.
+
+    With a fixture (``{"accounts": {"<id>": {"<resource_type>": {"<name>":
+    <policy or null>}}}}``, e.g. ``"buckets"``) only the listed resources
+    exist.  Without one, any resource whose name contains "present" exists,
+    locked by a policy denying ``deny_action`` to everyone.  Unlocks delete
+    the policy, so a repeated POST is ``not_locked``.  Every call waits
+    ``latency_ms`` plus up to ``jitter_ms``, then fails at ``throttle_rate``
+    with a throttling error and at ``error_rate`` with an internal error.
+    """
+
+    def __init__(
+        self,
+        resource_type,
+        deny_action,
+        fixture_path="",
+        latency_ms=0,
+        jitter_ms=0,
+        throttle_rate=0.0,
+        error_rate=0.0,
+    ):
+        self.resource_type = resource_type
+        self.deny_action = deny_action
+        self.fixture_path = fixture_path
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._policies = None
+
+    def reset(self):
+        """Drop every change; the fixture is read again on next use."""
+        with self._lock:
+            self._policies = None
+
+    def _load(self):
+        policies = {}
+        if self.fixture_path:
+            with open(self.fixture_path) as f:
+                accounts = json.load(f).get("accounts", {})
+            for account_id, account in accounts.items():
+                policies[account_id] = dict(account.get(self.resource_type) or {})
+        return policies
+
+    def _simulate(self, operation):
+        # Like the before-send hook of real clients: nothing is read or
+        # changed once the invocation deadline has passed, including after
+        # the simulated latency.
+        check_deadline()
+        delay_ms = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+            check_deadline()
+        roll = random.random()
+        if roll < self.throttle_rate:
+            raise SimulatedAWSError("Throttling", f"{operation} rate exceeded")
+        if roll < self.throttle_rate + self.error_rate:
+            raise SimulatedAWSError("InternalError", f"{operation} failed")
+
+    def _account(self, account_id, name):
+        # Callers hold self._lock; raises KeyError for unknown resources.
+        if self._policies is None:
+            self._policies = self._load()
+        account = self._policies.setdefault(account_id, {})
+        if name not in account:
+            if self.fixture_path or "present" not in name.lower():
+                raise KeyError(name)
+            account[name] = {
+                "Version": "2012-10-17",
+                "Statement": [
+                    {
+                        "Effect": "Deny",
+                        "Principal": "*",
+                        "Action": self.deny_action,
+                        "Resource": "*",
+                    }
+                ],
+            }
+        return account
+
+    def get_policy(self, account_id, name):
+        """Return the policy of ``name``, or None; KeyError when it does not exist."""
+        self._simulate("GetPolicy")
+        with self._lock:
+            return self._account(account_id, name)[name]
+
+    def delete_policy(self, account_id, name):
+        """Delete the policy of ``name`` and return it (None if it had none)."""
+        self._simulate("DeletePolicy")
+        with self._lock:
+            account = self._account(account_id, name)
+            policy, account[name] = account[name], None
+            return policy
+
+
+class UnlockService:
+    """What the shared request handling needs to know about one service.
+
+    ``label`` names its resources in log messages (``"S3 bucket"``) and
+    ``name_key`` is the event and batch item key holding a resource name.
+    ``unlock_item(item, action)`` answers a single request given as an event
+    or batch item, and ``actions`` maps the service's own event actions
+    (such as ``"SCAN"``) to ``handler(event, context)``.
+    """
+
+    def __init__(self, label, name_key, unlock_item, actions=None):
+        self.label = label
+        self.name_key = name_key
+        self.unlock_item = unlock_item
+        self.actions = actions or {}
+
+
+CREDENTIALS_CACHE = TTLCache(CREDENTIALS_CACHE_SIZE)
+SERVICE_CLIENT_CACHE = TTLCache(SERVICE_CLIENT_CACHE_SIZE)
+
+IDEMPOTENCY_STORE = (
+    DynamoDBIdempotencyStore(IDEMPOTENCY_TABLE)
+    if IDEMPOTENCY_TABLE
+    else InMemoryIdempotencyStore(IDEMPOTENCY_CACHE_SIZE)
+)
+JOB_STORE = DynamoDBJobStore(JOB_TABLE) if JOB_TABLE else SQLiteJobStore(JOB_DB_PATH)
+STS_GOVERNOR = RateGovernor(rate=STS_RATE_LIMIT)
+SERVICE_GOVERNOR = RateGovernor(account_rate=ACCOUNT_RATE_LIMIT)
+span_exporter = FileSpanExporter(TRACE_EXPORT_FILE) if TRACE_EXPORT_FILE else None
+
+_client_lock = threading.Lock()
+_metrics_lock = threading.Lock()
+_tracer_lock = threading.Lock()
+_profile_lock = threading.Lock()
+_trace_local = threading.local()
+_metrics_local = threading.local()
+_profile_local = threading.local()
+_tracer = None
+_tracer_checked = False
+_client_configs = {}
+_shared_clients = {}
+_deadline_local = threading.local()
+_assume_root_locks = tuple(
+    threading.Lock() for _ in range(max(CREDENTIALS_CACHE_SIZE, 1))
+)
+_base_session = None
+_single_flight = SingleFlight()
+# Runs single requests that must be answered before the deadline; shared by
+# invocations so a warm container does not start a pool per request.
+_request_executor = ThreadPoolExecutor(
+    max_workers=BATCH_MAX_WORKERS, thread_name_prefix="unlock-request"
+)
+
+
+def __getattr__(name):
+    # boto3 and botocore are imported lazily; expose them as module attributes
+    # so ``unlock_common.boto3`` keeps working for callers and tests.
+    if name in ("boto3", "botocore"):
+        module = importlib.import_module(name)
+        globals()[name] = module
+        return module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_client_config(retries=False):
+    """Return a shared botocore ``Config``.
+
+    By default botocore makes a single attempt per call: the STS and S3/SQS
+    calls go through a ``RateGovernor``, which owns retries and backoff.
+    ``retries=True`` keeps the botocore retries of ``CLIENT_CONFIG_OPTIONS``
+    for the clients whose calls are not governed.  Built once per container
+    from ``CLIENT_CONFIG_OPTIONS`` alone; the invocation deadline is applied
+    to each request by ``check_deadline``.
+    """
+    config = _client_configs.get(retries)
+    if config is None:
+        from botocore.config import Config
+
+        options = dict(CLIENT_CONFIG_OPTIONS)
+        if retries:
+            # botocore rewrites the retries dict it is given, so pass a copy.
+            options["retries"] = dict(options["retries"])
+        else:
+            options["retries"] = {"total_max_attempts": 1, "mode": "standard"}
+        if ENDPOINT_URL:
+            # A single local endpoint cannot serve virtual-hosted buckets.
+            options["s3"] = {"addressing_style": "path"}
+        config = _client_configs.setdefault(retries, Config(**options))
+    return config
+
+
+def endpoint_options():
+    """Return the ``endpoint_url`` option for STS and service clients, if any."""
+    return {"endpoint_url": ENDPOINT_URL} if ENDPOINT_URL else {}
+
+
+def start_deadline(context):
+    """Set the invocation deadline from the Lambda ``context`` (None: no deadline).
+
+    The deadline belongs to the calling thread; ``traced`` hands it to the
+    worker threads the invocation starts.
+    """
+    if context is None:
+        _deadline_local.deadline = None
+        return
+    remaining_ms = context.get_remaining_time_in_millis() - DEADLINE_MARGIN_MS
+    _deadline_local.deadline = Deadline(time.monotonic() + max(remaining_ms, 0) / 1000)
+
+
+def current_deadline():
+    """The ``Deadline`` of the invocation running on this thread, or None."""
+    return getattr(_deadline_local, "deadline", None)
+
+
+def remaining_seconds():
+    """Seconds left before the invocation deadline, or None without one."""
+    deadline = current_deadline()
+    return None if deadline is None else deadline.remaining()
+
+
+def deadline_passed():
+    """True once the invocation deadline of this thread has passed.
+
+    Abandoned workers check it before writing results to caches or stores,
+    so work finished after the handler answered with a timeout is not kept.
+    """
+    remaining = remaining_seconds()
+    return remaining is not None and remaining <= 0
+
+
+def check_deadline(request=None, **kwargs):
+    """botocore ``before-send`` hook enforcing the invocation deadline.
+
+    It runs on the calling thread before every attempt, so retries also stop
+    at the deadline, and caps the attempt's read timeout to the time left.
+    """
+    remaining = remaining_seconds()
+    if remaining is None:
+        return
+    if remaining <= 0:
+        raise DeadlineExceeded("Invocation deadline reached before the AWS call")
+    context = getattr(request, "context", None)
+    if context is not None:
+        read_timeout = (
+            context.get("read_timeout") or CLIENT_CONFIG_OPTIONS["read_timeout"]
+        )
+        context["read_timeout"] = min(read_timeout, remaining)
+
+
+def run_before_deadline(fn, *args, **kwargs):
+    """Return ``fn(*args, **kwargs)``, or None when the deadline passes first.
+
+    Without a deadline ``fn`` runs on the calling thread.  Otherwise it runs
+    on a worker thread so the handler can still answer while an AWS call
+    hangs; the worker is left to finish and cannot start further AWS calls.
+    """
+    timeout = remaining_seconds()
+    if timeout is None:
+        return fn(*args, **kwargs)
+    if timeout <= 0:
+        return None
+    future = _request_executor.submit(traced("Request", fn), *args, **kwargs)
+    done, _ = wait([future], timeout=timeout)
+    return future.result() if done else None
+
+
+def lambda_response(status_code, body_dict):
+    return {
+        "statusCode": status_code,
+        "body": body_dict,
+    }
+
+
+def policy_log_fields(policy_str):
+    """Describe a policy for a log record without logging large documents.
+
+    Returns the size and a short SHA-256 of the policy, plus the parsed
+    document when it is at most ``LOG_POLICY_MAX_BYTES``.
+    """
+    data = policy_str.encode("utf-8")
+    fields = {"bytes": len(data), "sha256": hashlib.sha256(data).hexdigest()[:16]}
+    if len(data) <= LOG_POLICY_MAX_BYTES:
+        fields["document"] = json.loads(policy_str)
+    return fields
+
+
+def policy_response(account_id, resource_name, policy_str, cached=False):
+    """Build the GET response for a policy document found on ``resource_name``."""
+    return lambda_response(
+        200,
+        {
+            "status": "success",
+            "account_id": account_id,
+            "resource_name": resource_name,
+            "policy": json.loads(policy_str),
+            "cached": cached,
+        },
+    )
+
+
+def deadline_response(account_id, resource_name):
+    """Build the response for a request that did not finish before the deadline."""
+    return lambda_response(
+        504,
+        {
+            "status": "timeout",
+            "account_id": account_id,
+            "resource_name": resource_name,
+            "message": "Request did not complete before the Lambda timeout",
+        },
+    )
+
+
+def throttled_response(account_id, resource_name):
+    """Build the response for a request AWS kept throttling after retries."""
+    return lambda_response(
+        429,
+        {
+            "status": "throttled",
+            "account_id": account_id,
+            "resource_name": resource_name,
+            "message": "AWS throttled the request, retry later",
+        },
+    )
+
+
+def cached_negative_response(cache, resource_key, action):
+    """Return the not-found / not-locked response ``cache`` holds for a request."""
+    stored = cache.get(resource_key + (action,))
+    if stored is None:
+        return None
+    add_metric("NegativeCacheHits", MetricUnit.Count, 1)
+    response = json.loads(stored)
+    response["body"]["cached"] = True
+    return response
+
+
+def record_negative_outcome(cache, resource_key, action, response):
+    """Keep not-found / not-locked outcomes in ``cache``; drop them on a policy."""
+    if response["body"].get("status") in NEGATIVE_STATUSES:
+        if deadline_passed():
+            return
+        cache.set(resource_key + (action,), json.dumps(response))
+    elif response["statusCode"] == 200:
+        for cached_action in ("GET", "POST"):
+            cache.invalidate(resource_key + (cached_action,))
+
+
+def is_throttling_error(e):
+    """Return True when ``e`` is an AWS throttling error."""
+    error_code = getattr(e, "response", {}).get("Error", {}).get("Code")
+    return error_code in THROTTLE_ERROR_CODES
+
+
+def is_transient_error(e):
+    """Return True when ``e`` is a server-side or connection error worth retrying."""
+    error = getattr(e, "response", {}).get("Error", {})
+    if error.get("Code") in TRANSIENT_ERROR_CODES:
+        return True
+    status = (
+        getattr(e, "response", {}).get("ResponseMetadata", {}).get("HTTPStatusCode")
+    )
+    if isinstance(status, int) and status >= 500:
+        return True
+    # botocore is only imported when a real client was built.
+    exceptions = sys.modules.get("botocore.exceptions")
+    return exceptions is not None and isinstance(
+        e, (exceptions.ConnectionError, exceptions.HTTPClientError)
+    )
+
+
+@contextmanager
+def timed(phase, **annotations):
+    """Trace ``phase`` as a span and record its ``<phase>Latency`` metric.
+
+    Throttling errors raised inside the block are also counted as
+    ``Throttles``.
+    """
+    start = time.perf_counter()
+    try:
+        with span(phase, **annotations):
+            yield
+    except Exception as e:
+        if is_throttling_error(e):
+            add_metric("Throttles", MetricUnit.Count, 1)
+        raise
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        add_metric(f"{phase}Latency", MetricUnit.Milliseconds, elapsed_ms)
+
+
+def current_metrics():
+    """The metric set of the invocation running on this thread, or None."""
+    return getattr(_metrics_local, "metrics", None)
+
+
+@contextmanager
+def invocation_metrics(action, account_id=None):
+    """Collect the metrics of one request in its own set and flush it at the end.
+
+    Concurrent invocations in one process (local runs, load tests) each get
+    their own metric set, dimensions and metadata, so none is published
+    under another request's ``action`` or ``status_code``.  ``traced`` hands
+    the set to the worker threads the request starts.
+    """
+    # Default dimensions survive the automatic flush of a full metric set.
+    request_metrics = EphemeralMetrics(
+        namespace=METRICS_NAMESPACE, default_dimensions={"action": str(action)}
+    )
+    if account_id:
+        request_metrics.add_metadata(key="account_id", value=str(account_id))
+    previous = current_metrics()
+    _metrics_local.metrics = request_metrics
+    try:
+        yield request_metrics
+    finally:
+        _metrics_local.metrics = previous
+        with _metrics_lock:
+            if request_metrics.metric_set:
+                request_metrics.flush_metrics()
+
+
+def add_metric(name, unit, value):
+    request_metrics = current_metrics()
+    if request_metrics is None:
+        # Outside a request (e.g. a job run on a local thread) the metric is
+        # published on its own.
+        with single_metric(
+            name=name, unit=unit, value=value, namespace=METRICS_NAMESPACE
+        ):
+            return
+    # Batch and scan workers add metrics concurrently; Powertools may flush
+    # a full metric set from inside add_metric.
+    with _metrics_lock:
+        request_metrics.add_metric(name=name, unit=unit, value=value)
+
+
+def record_outcome(status_code):
+    """Count the request and tag its metrics with the response status code."""
+    current_metrics().add_dimension(name="status_code", value=str(status_code))
+    add_metric("Requests", MetricUnit.Count, 1)
+
+
+def record_cold_start(name):
+    """Publish ``ColdStart`` on the first invocation of the execution environment.
+
+    It is keyed on the Lambda function name (``AWS_LAMBDA_FUNCTION_NAME``,
+    the same as ``context.function_name``); local runs use ``name``.
+    """
+    if not cold_start.is_cold_start:
+        return
+    cold_start.is_cold_start = False
+    function_name = os.environ.get(
+        "POWERTOOLS_METRICS_FUNCTION_NAME",
+        os.environ.get("AWS_LAMBDA_FUNCTION_NAME", name),
+    )
+    with single_metric(
+        name="ColdStart", unit=MetricUnit.Count, value=1, namespace=METRICS_NAMESPACE
+    ) as metric:
+        metric.add_dimension(name="function_name", value=function_name)
+        if metric.service:
+            metric.add_dimension(name="service", value=str(metric.service))
+
+
+def get_tracer():
+    """Return the Powertools ``Tracer``, or None when X-Ray is unavailable.
+
+    Tracing is off outside Lambda, when ``POWERTOOLS_TRACE_DISABLED`` is set
+    and when ``aws_xray_sdk`` is not installed.  botocore is patched so every
+    AWS API call gets its own subsegment.
+    """
+    global _tracer, _tracer_checked
+    if not _tracer_checked:
+        with _tracer_lock:
+            if not _tracer_checked:
+                try:
+                    from aws_lambda_powertools import Tracer
+
+                    tracer = Tracer(auto_patch=False)
+                except ImportError as e:
+                    logger.debug("X-Ray tracing unavailable: %s", e)
+                    tracer = None
+                if tracer is not None and tracer.disabled:
+                    tracer = None
+                if tracer is not None:
+                    tracer.patch(["botocore"])
+                _tracer = tracer
+                _tracer_checked = True
+    return _tracer
+
+
+def _span_stack():
+    stack = getattr(_trace_local, "stack", None)
+    if stack is None:
+        stack = _trace_local.stack = []
+    return stack
+
+
+def current_trace_context():
+    """Return the calling thread's trace context, to parent spans in workers."""
+    tracer = get_tracer()
+    xray_entity = tracer.provider.get_trace_entity() if tracer is not None else None
+    stack = _span_stack()
+    return xray_entity, (stack[-1] if stack else None)
+
+
+@contextmanager
+def span(name, parent=None, **annotations):
+    """Trace the enclosed block as an X-Ray subsegment and an exported span.
+
+    Spans nest under the thread's current span, or under ``parent`` (from
+    ``current_trace_context``) in worker threads.  Annotations are inherited
+    by nested spans, so every AWS call carries the account and resource.
+    """
+    tracer = get_tracer()
+    if tracer is None and span_exporter is None:
+        yield
+        return
+
+    xray_entity, parent_frame = (
+        parent if parent is not None else current_trace_context()
+    )
+    annotations = {k: v for k, v in annotations.items() if v is not None}
+    if parent_frame is not None:
+        annotations = {**parent_frame["annotations"], **annotations}
+    frame = {
+        "id": os.urandom(8).hex(),
+        "trace_id": parent_frame["trace_id"] if parent_frame else _new_trace_id(),
+        "parent_id": parent_frame["id"] if parent_frame else None,
+        "name": name,
+        "annotations": annotations,
+    }
+
+    stack = _span_stack()
+    with ExitStack() as scope:
+        if tracer is not None:
+            if xray_entity is not None:
+                tracer.provider.set_trace_entity(xray_entity)
+            subsegment = scope.enter_context(tracer.provider.in_subsegment(name))
+            for key, value in annotations.items():
+                subsegment.put_annotation(key, value)
+        stack.append(frame)
+        start_time = time.time()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            stack.pop()
+            if span_exporter is not None:
+                span_exporter.export(
+                    dict(
+                        frame,
+                        start_time=start_time,
+                        end_time=time.time(),
+                        error=error,
+                        thread=threading.current_thread().name,
+                    )
+                )
+
+
+def traced(name, fn, **annotations):
+    """Wrap ``fn`` to run in a span parented to the caller's current span.
+
+    Thread-pool workers do not inherit the submitting thread's trace
+    context, invocation deadline, metric set or profiler, so fan-out work is
+    submitted through this wrapper.  A worker outliving its invocation keeps that invocation's
+    (expired) deadline and cannot start further AWS calls.
+    """
+    parent = current_trace_context()
+    deadline = current_deadline()
+    request_metrics = current_metrics()
+    profile = getattr(_profile_local, "profile", None)
+
+    def _run(*args, **kwargs):
+        _deadline_local.deadline = deadline
+        _metrics_local.metrics = request_metrics
+        with span(name, parent=parent, **annotations):
+            if profile is not None:
+                return profile.run_in_thread(fn, *args, **kwargs)
+            return fn(*args, **kwargs)
+
+    return _run
+
+
+def _new_trace_id():
+    # X-Ray trace ID format: 1-<epoch seconds, 8 hex>-<96-bit random, 24 hex>
+    return f"1-{int(time.time()):08x}-{os.urandom(12).hex()}"
+
+
+def get_boto3_session():
+    import boto3
+
+    if (
+        os.environ.get("AWS_SAM_LOCAL") == "true"
+        or os.environ.get("LOCAL_TEST") == "true"
+    ):
+        return boto3.Session(profile_name=PROFILE_NAME)
+    else:
+        return boto3.Session()
+
+
+def get_base_session():
+    """Return the container-wide boto3 session, creating it on first use."""
+    global _base_session
+    if _base_session is None:
+        with _client_lock:
+            if _base_session is None:
+                session = get_boto3_session()
+                session.events.register("before-send", check_deadline)
+                _base_session = session
+    return _base_session
+
+
+def get_shared_client(service_name, retries=True, **kwargs):
+    """Return the container-wide ``service_name`` client of the function's role.
+
+    ``retries`` is passed to ``get_client_config`` and ``kwargs`` to the
+    client; the client is created on first use.
+    """
+    client = _shared_clients.get(service_name)
+    if client is None:
+        session = get_base_session()
+        with _client_lock:
+            client = _shared_clients.get(service_name)
+            if client is None:
+                client = _shared_clients[service_name] = session.client(
+                    service_name, config=get_client_config(retries=retries), **kwargs
+                )
+    return client
+
+
+def get_sts_client():
+    """Return the container-wide STS client used for ``sts:AssumeRoot``."""
+    return get_shared_client("sts", retries=False, **endpoint_options())
+
+
+def get_dynamodb_client():
+    """Return the shared DynamoDB client used by the idempotency and job stores."""
+    return get_shared_client("dynamodb")
+
+
+def get_lambda_client():
+    """Return the shared Lambda client used to start asynchronous jobs."""
+    return get_shared_client("lambda")
+
+
+def get_service_client(service_name, creds, region_name=None):
+    """Return a pooled client for ``service_name`` bound to ``creds``.
+
+    Clients are cached per (service, access key, region) and dropped together
+    with the credentials they were built from.
+    """
+    cache_key = (service_name, creds["AccessKeyId"], region_name)
+    client = SERVICE_CLIENT_CACHE.get(cache_key)
+    if client is not None:
+        return client
+
+    session = get_base_session()
+    # Client creation on a shared session is not thread-safe.
+    with _client_lock, timed("ClientInit", service=service_name):
+        client = session.client(
+            service_name,
+            aws_access_key_id=creds["AccessKeyId"],
+            aws_secret_access_key=creds["SecretAccessKey"],
+            aws_session_token=creds["SessionToken"],
+            region_name=region_name,
+            config=get_client_config(),
+            **endpoint_options(),
+        )
+    ttl_seconds = _credentials_ttl(creds, CREDENTIALS_DURATION_SECONDS)
+    SERVICE_CLIENT_CACHE.set(cache_key, client, ttl_seconds=ttl_seconds)
+    return client
+
+
+def prewarm(service_name):
+    """Build the shared clients during the Lambda init phase.
+
+    Creating a throwaway ``service_name`` client loads its service model and
+    endpoint rules into the shared session, so the first credential-bound
+    client of an invocation is built from memory.
+    """
+    session = get_base_session()
+    get_sts_client()
+    with _client_lock:
+        session.client(service_name, config=get_client_config())
+
+
+def reset_clients():
+    """Drop the shared session, the client config and every cached client."""
+    global _base_session
+    with _client_lock:
+        _base_session = None
+        _client_configs.clear()
+        _shared_clients.clear()
+    SERVICE_CLIENT_CACHE.clear()
+    STS_GOVERNOR.reset()
+    SERVICE_GOVERNOR.reset()
+
+
+def _credentials_ttl(creds, duration_seconds):
+    """Seconds the credentials may be reused before they must be refreshed."""
+    expiration = creds.get("Expiration")
+    if isinstance(expiration, datetime):
+        lifetime = (expiration - datetime.now(timezone.utc)).total_seconds()
+    else:
+        lifetime = duration_seconds
+    return lifetime - CREDENTIALS_REFRESH_MARGIN_SECONDS
+
+
+def assume_root(
+    account_id, policy_name, duration_seconds=CREDENTIALS_DURATION_SECONDS
+):
+    cache_key = (account_id, policy_name)
+    creds = CREDENTIALS_CACHE.get(cache_key)
+    if creds is not None:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Reusing cached credentials for policy: %s in account: %s",
+                policy_name,
+                account_id,
+                extra={"credentials_cache": CREDENTIALS_CACHE.stats()},
+            )
+        return creds
+
+    # Concurrent batch workers targeting the same account share one STS call.
+    # The locks are striped, so a warm container never holds more than
+    # CREDENTIALS_CACHE_SIZE of them however many accounts it has seen.
+    key_lock = _assume_root_locks[hash(cache_key) % len(_assume_root_locks)]
+    with key_lock:
+        creds = CREDENTIALS_CACHE.peek(cache_key)
+        if creds is not None:
+            return creds
+
+        sts = get_sts_client()
+        policy_arn = f"arn:aws:iam::aws:policy/root-task/{policy_name}"
+        logger.info("Assuming policy: %s in account: %s", policy_name, account_id)
+        with timed("AssumeRoot", account_id=account_id):
+            resp = STS_GOVERNOR.call(
+                account_id,
+                sts.assume_root,
+                TargetPrincipal=account_id,
+                TaskPolicyArn={"arn": policy_arn},
+                DurationSeconds=duration_seconds,
+            )
+        creds = resp["Credentials"]
+        CREDENTIALS_CACHE.set(
+            cache_key, creds, ttl_seconds=_credentials_ttl(creds, duration_seconds)
+        )
+        return creds
+
+
+def profiling_requested(event):
+    return PROFILE_INVOCATIONS or (
+        isinstance(event, dict) and bool(event.get("profile"))
+    )
+
+
+def run_profiled(handler, event, context):
+    """Run ``handler`` under the PROFILE_MODE profiler and write its output.
+
+    Only one invocation is profiled at a time; concurrent ones run without
+    a profiler.  A failure to write or log the profile never fails the
+    invocation.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return handler(event, context)
+    try:
+        if PROFILE_MODE == "sample":
+            profiler = SamplingProfiler(PROFILE_INTERVAL_MS)
+        else:
+            profiler = ThreadedProfile()
+        try:
+            return profiler.runcall(handler, event, context)
+        finally:
+            try:
+                write_profile(profiler, context, handler.__module__)
+            except Exception as e:
+                logger.warning("Could not write profile: %s", e)
+    finally:
+        _profile_lock.release()
+
+
+def write_profile(profiler, context, name):
+    """Write ``profiler``'s output to PROFILE_OUTPUT_DIR and log its top functions.
+
+    Files are named ``<name>-<request ID>``; ``name`` is the function's module.
+    """
+    import uuid
+
+    request_id = getattr(context, "aws_request_id", None) or uuid.uuid4().hex
+    base = os.path.join(PROFILE_OUTPUT_DIR, f"{name}-{request_id}")
+    if isinstance(profiler, SamplingProfiler):
+        path = base + ".collapsed"
+        with open(path, "w") as f:
+            f.write(profiler.collapsed())
+        top = profiler.top(PROFILE_LOG_TOP)
+    else:
+        path = base + ".pstats"
+        stats = profiler.stats()
+        stats.dump_stats(path)
+        top = profiler.top(stats, PROFILE_LOG_TOP)
+    if PROFILE_LOG_TOP > 0:
+        logger.info(
+            "Profile written to %s",
+            path,
+            extra={"profile": {"path": path, "mode": PROFILE_MODE, "top": top}},
+        )
+    return path
+
+
+def handle_invocation(handler, event, context):
+    """Run ``handler(event, context)`` as one invocation of a function.
+
+    Starts the invocation's log budget and sampling decision, profiles it
+    when requested, publishes ``ColdStart`` on the first invocation and logs
+    how much the log budget dropped.
+    """
+    if logger.sampling_rate:
+        logger.refresh_sample_rate_calculation()
+    log_handler.start_invocation()
+    try:
+        if profiling_requested(event):
+            response = run_profiled(handler, event, context)
+        else:
+            response = handler(event, context)
+        record_cold_start(handler.__module__)
+        return response
+    finally:
+        if log_handler.dropped:
+            logger.warning(
+                "Log budget of %d bytes exceeded: dropped %d records (%d bytes)",
+                log_handler.budget,
+                log_handler.dropped,
+                log_handler.dropped_bytes,
+            )
+
+
+def dispatch_event(service, event, context):
+    """Answer ``event`` for ``service`` in the mode it asks for.
+
+    SQS, batch, asynchronous job, STATUS and RUN_JOB events are handled
+    here and the service's own actions by ``service.actions``; anything else
+    is a single request answered by ``service.unlock_item`` before the
+    deadline.
+    """
+    if is_sqs_event(event):
+        action = "SQS_EVENT"
+    elif "items" in event:
+        action = "BATCH"
+    else:
+        action = event.get("action", "POST")
+    logger.info(
+        "Starting unlock %s process",
+        service.label,
+        extra={
+            "request": {
+                "action": action,
+                "account_id": event.get("account_id"),
+                service.name_key: event.get(service.name_key),
+                "items": len(event.get("items") or event.get("Records") or ()),
+            }
+        },
+    )
+    logger.debug("Incoming event", extra={"event": event})
+    start_deadline(context)
+
+    with invocation_metrics(action, event.get("account_id")):
+        with span(
+            "## lambda_handler",
+            action=str(action),
+            account_id=event.get("account_id"),
+            resource_name=event.get(service.name_key),
+        ):
+            if action == "SQS_EVENT":
+                response = handle_sqs_event(service, event, context)
+                record_outcome(207 if response["batchItemFailures"] else 200)
+                return response
+            if event.get("async") and action in ("POST", "BATCH"):
+                response = submit_job(service, event)
+            elif action == "BATCH":
+                response = handle_batch(service, event, context)
+            elif isinstance(action, str) and action in service.actions:
+                response = service.actions[action](event, context)
+            elif action == "STATUS":
+                response = get_job_status(event.get("job_id"))
+            elif action == "RUN_JOB":
+                response = run_job(service, event.get("job_id"), context)
+            else:
+                response = run_before_deadline(
+                    service.unlock_item, event, action
+                ) or deadline_response(
+                    event.get("account_id"), event.get(service.name_key)
+                )
+        record_outcome(response["statusCode"])
+    return response
+
+
+def run_idempotent(key_parts, fn, persist=True, replay=True):
+    """Return ``fn()``, sharing the result with duplicate requests.
+
+    The key is built from ``key_parts``, which start with the service's
+    root task policy name.  Concurrent calls with the same key run ``fn`` once.  With ``persist``,
+    responses below 500 (except 429) are also stored for
+    ``IDEMPOTENCY_TTL_SECONDS`` and replayed (with ``idempotent_replay`` set)
+    to later duplicates; ``replay`` False skips the stored result but still
+    records the new one.
+    Idempotency store errors never fail the request itself.
+    """
+    key = "#".join(str(part) for part in key_parts)
+    if persist and replay:
+        try:
+            stored = IDEMPOTENCY_STORE.get(key)
+        except Exception as e:
+            logger.warning("Idempotency store read failed: %s", e)
+            stored = None
+        if stored is not None:
+            logger.info("Replaying stored result for %s", key)
+            add_metric("IdempotentReplays", MetricUnit.Count, 1)
+            response = json.loads(stored)
+            response["body"]["idempotent_replay"] = True
+            return response
+
+    response, shared = _single_flight.do(key, fn)
+    if shared:
+        logger.info("Shared in-flight result for %s", key)
+        add_metric("IdempotentReplays", MetricUnit.Count, 1)
+        return json.loads(json.dumps(response))
+
+    if (
+        persist
+        and response["statusCode"] < 500
+        and response["statusCode"] != 429
+        and not deadline_passed()
+    ):
+        try:
+            IDEMPOTENCY_STORE.put(key, json.dumps(response), IDEMPOTENCY_TTL_SECONDS)
+        except Exception as e:
+            logger.warning("Idempotency store write failed: %s", e)
+    return response
+
+
+def _run_batch_item(service, item, default_action):
+    if not isinstance(item, dict):
+        return lambda_response(
+            400,
+            {
+                "status": "error",
+                "account_id": None,
+                "message": "Batch item must be an object",
+            },
+        )
+    try:
+        return service.unlock_item(item, item.get("action", default_action))
+    except Exception as e:
+        logger.error("Unhandled exception in batch item: %s", e)
+        return lambda_response(
+            500,
+            {
+                "status": "error",
+                "message": f"Unhandled exception: {str(e)}",
+            },
+        )
+
+
+def run_items(service, items, default_action, context):
+    """Unlock ``items`` concurrently and return their responses, in order.
+
+    Items are unlocked on a bounded thread pool; credentials are shared per
+    account through ``assume_root``.  Items still running when the Lambda is
+    about to time out get a ``timeout`` (504) response.
+    """
+    timeout = None
+    if context is not None:
+        remaining_ms = context.get_remaining_time_in_millis() - BATCH_TIMEOUT_MARGIN_MS
+        timeout = max(remaining_ms, 0) / 1000
+
+    executor = ThreadPoolExecutor(max_workers=min(BATCH_MAX_WORKERS, len(items)))
+    futures = [
+        executor.submit(
+            _traced_batch_item(service, item), service, item, default_action
+        )
+        for item in items
+    ]
+    wait(futures, timeout=timeout)
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    responses = []
+    for future in futures:
+        if future.done() and not future.cancelled():
+            responses.append(future.result())
+        else:
+            responses.append(
+                lambda_response(
+                    504,
+                    {
+                        "status": "timeout",
+                        "message": "Item did not complete before the Lambda timeout",
+                    },
+                )
+            )
+    return responses
+
+
+def _traced_batch_item(service, item):
+    item = item if isinstance(item, dict) else {}
+    return traced(
+        "BatchItem",
+        _run_batch_item,
+        account_id=item.get("account_id"),
+        resource_name=item.get(service.name_key),
+    )
+
+
+def validate_batch_items(items):
+    """Return a 400 response when ``items`` is not a usable batch, else None."""
+    if not isinstance(items, list) or not items:
+        logger.error("Missing or empty items in batch event")
+        return lambda_response(
+            400,
+            {
+                "status": "error",
+                "message": "Batch event requires a non-empty items list",
+            },
+        )
+    if len(items) > BATCH_MAX_ITEMS:
+        logger.error("Batch of %s items exceeds BATCH_MAX_ITEMS", len(items))
+        return lambda_response(
+            400,
+            {
+                "status": "error",
+                "message": f"Batch exceeds the maximum of {BATCH_MAX_ITEMS} items",
+            },
+        )
+    return None
+
+
+def item_result(service, index, item, response):
+    """Return the batch/job result entry for ``items[index]``."""
+    item = item if isinstance(item, dict) else {}
+    return {
+        "index": index,
+        "account_id": item.get("account_id"),
+        service.name_key: item.get(service.name_key),
+        "statusCode": response["statusCode"],
+        "body": response["body"],
+    }
+
+
+def summarize_results(results):
+    """Return ``(succeeded, failed, status)`` for a list of item results."""
+    failed = sum(1 for result in results if result["statusCode"] >= 400)
+    succeeded = len(results) - failed
+    if not failed:
+        status = "success"
+    elif succeeded:
+        status = "partial"
+    else:
+        status = "error"
+    return succeeded, failed, status
+
+
+def handle_batch(service, event, context):
+    """Process ``event["items"]`` concurrently and report a result per item."""
+    items = event.get("items")
+    error = validate_batch_items(items)
+    if error is not None:
+        return error
+
+    responses = run_items(service, items, event.get("action", "POST"), context)
+    results = [
+        item_result(service, index, item, response)
+        for index, (item, response) in enumerate(zip(items, responses))
+    ]
+    succeeded, failed, status = summarize_results(results)
+    logger.info("Batch finished: %s succeeded, %s failed", succeeded, failed)
+    return lambda_response(
+        200 if not failed else 207,
+        {
+            "status": status,
+            "total": len(results),
+            "succeeded": succeeded,
+            "failed": failed,
+            "results": results,
+        },
+    )
+
+
+def submit_job(service, event):
+    """Store ``event`` as a job, start it and return 202 with the job ID.
+
+    A batch event becomes a job with one entry per item; any other event is
+    a job of a single item.
+    """
+    if os.environ.get("AWS_LAMBDA_FUNCTION_NAME") and not JOB_TABLE:
+        logger.error("Asynchronous jobs need JOB_TABLE in Lambda")
+        return lambda_response(
+            400,
+            {
+                "status": "error",
+                "message": "Asynchronous jobs are not enabled (JOB_TABLE is not set)",
+            },
+        )
+    if "items" in event:
+        items = event.get("items")
+        error = validate_batch_items(items)
+        if error is not None:
+            return error
+    else:
+        items = [{key: value for key, value in event.items() if key != "async"}]
+
+    import uuid
+
+    now = int(time.time())
+    job = {
+        "job_id": str(uuid.uuid4()),
+        "status": "pending",
+        "action": event.get("action", "POST"),
+        "items": items,
+        "total": len(items),
+        "results": {},
+        "created_at": now,
+        "updated_at": now,
+        "expiration": now + JOB_TTL_SECONDS,
+    }
+    try:
+        JOB_STORE.put(job)
+        start_job(service, job["job_id"])
+    except Exception as e:
+        logger.error("Failed to start job: %s", e)
+        return lambda_response(
+            500,
+            {
+                "status": "error",
+                "message": f"Failed to start job: {str(e)}",
+            },
+        )
+    logger.info("Job %s accepted with %s items", job["job_id"], len(items))
+    add_metric("JobsStarted", MetricUnit.Count, 1)
+    return lambda_response(
+        202,
+        {
+            "status": "accepted",
+            "job_id": job["job_id"],
+            "total": len(items),
+        },
+    )
+
+
+def start_job(service, job_id):
+    """Run job ``job_id`` in the background.
+
+    In Lambda the function invokes itself asynchronously with a RUN_JOB event
+    so the job gets a whole invocation of its own; elsewhere it runs on a
+    daemon thread.
+    """
+    function_name = os.environ.get("AWS_LAMBDA_FUNCTION_NAME")
+    if function_name:
+        get_lambda_client().invoke(
+            FunctionName=function_name,
+            InvocationType="Event",
+            Payload=json.dumps({"action": "RUN_JOB", "job_id": job_id}),
+        )
+    else:
+        threading.Thread(
+            target=_run_local_job, args=(service, job_id), daemon=True
+        ).start()
+
+
+def _run_local_job(service, job_id):
+    # The thread is the job's invocation; give it a metric set of its own.
+    with invocation_metrics("RUN_JOB"):
+        run_job(service, job_id, None)
+
+
+def job_status(job):
+    """Return the STATUS view of ``job``: its state, progress and item results."""
+    results = [job["results"][key] for key in sorted(job["results"], key=int)]
+    succeeded, failed, _ = summarize_results(results)
+    return {
+        "status": job["status"],
+        "job_id": job["job_id"],
+        "total": job["total"],
+        "completed": len(results),
+        "succeeded": succeeded,
+        "failed": failed,
+        "results": results,
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        **({"message": job["message"]} if "message" in job else {}),
+    }
+
+
+def save_job(job):
+    """Write ``job`` to the job store and return whether the write succeeded.
+
+    When it fails, the job is marked as failed with the store error as its
+    message and written once more, so STATUS reports the failure instead of
+    a job that never finishes.
+    """
+    job["updated_at"] = int(time.time())
+    try:
+        JOB_STORE.put(job)
+        return True
+    except Exception as e:
+        logger.error("Job store write failed for %s: %s", job["job_id"], e)
+        job["status"] = "error"
+        job["message"] = f"Failed to save job: {str(e)}"
+    try:
+        JOB_STORE.put(job)
+    except Exception as e:
+        logger.error("Could not mark job %s as failed: %s", job["job_id"], e)
+    add_metric("JobsFailed", MetricUnit.Count, 1)
+    return False
+
+
+def load_job(job_id):
+    """Return ``(job, None)``, or ``(None, error response)`` when it can't be read."""
+    if not job_id:
+        logger.error("Missing job_id")
+        return None, lambda_response(
+            400, {"status": "error", "message": "Missing job_id"}
+        )
+    try:
+        job = JOB_STORE.get(str(job_id))
+    except Exception as e:
+        logger.error("Job store read failed for %s: %s", job_id, e)
+        return None, lambda_response(
+            500,
+            {
+                "status": "error",
+                "job_id": job_id,
+                "message": f"Failed to read job: {str(e)}",
+            },
+        )
+    if job is None:
+        logger.error("Job %s not found", job_id)
+        return None, lambda_response(
+            404,
+            {
+                "status": "not_found",
+                "job_id": job_id,
+                "message": f"Job {job_id} not found",
+            },
+        )
+    return job, None
+
+
+def get_job_status(job_id):
+    """Return the progress of job ``job_id`` (the STATUS action)."""
+    job, error = load_job(job_id)
+    return error or lambda_response(200, job_status(job))
+
+
+def run_job(service, job_id, context):
+    """Run the unfinished items of job ``job_id``, saving each result.
+
+    The job is saved after every item so STATUS reports progress.  Items
+    still running shortly before the Lambda timeout are left to a follow-up
+    RUN_JOB invocation; when a run completes no item at all they are
+    recorded as timed out instead, so a job always finishes.
+    """
+    job, error = load_job(job_id)
+    if error is not None:
+        return error
+    if job["status"] in ("success", "partial", "error"):
+        return lambda_response(200, job_status(job))
+
+    pending = [
+        index for index in range(job["total"]) if str(index) not in job["results"]
+    ]
+    job["status"] = "running"
+    if not save_job(job):
+        return lambda_response(500, job_status(job))
+
+    timeout = None
+    if context is not None:
+        remaining_ms = context.get_remaining_time_in_millis() - BATCH_TIMEOUT_MARGIN_MS
+        timeout = max(remaining_ms, 0) / 1000
+
+    lock = threading.Lock()
+    saved = True
+    executor = ThreadPoolExecutor(
+        max_workers=max(1, min(BATCH_MAX_WORKERS, len(pending)))
+    )
+    futures = {
+        executor.submit(
+            _traced_batch_item(service, job["items"][index]),
+            service,
+            job["items"][index],
+            job["action"],
+        ): index
+        for index in pending
+    }
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            index = futures[future]
+            with lock:
+                job["results"][str(index)] = item_result(
+                    service, index, job["items"][index], future.result()
+                )
+                saved = save_job(job)
+            if not saved:
+                break
+    except FuturesTimeoutError:
+        logger.warning("Job %s reached the Lambda timeout", job_id)
+    executor.shutdown(wait=False, cancel_futures=True)
+    if not saved:
+        return lambda_response(500, job_status(job))
+
+    remaining = [index for index in pending if str(index) not in job["results"]]
+    if remaining and len(remaining) < len(pending):
+        logger.info("Job %s: %s items left for the next run", job_id, len(remaining))
+        try:
+            start_job(service, job_id)
+        except Exception as e:
+            logger.error("Failed to continue job %s: %s", job_id, e)
+        else:
+            return lambda_response(202, job_status(job))
+
+    for index in remaining:
+        job["results"][str(index)] = item_result(
+            service,
+            index,
+            job["items"][index],
+            lambda_response(
+                504,
+                {
+                    "status": "timeout",
+                    "message": "Item did not complete before the Lambda timeout",
+                },
+            ),
+        )
+    succeeded, failed, job["status"] = summarize_results(list(job["results"].values()))
+    if not save_job(job):
+        return lambda_response(500, job_status(job))
+    logger.info("Job %s finished: %s succeeded, %s failed", job_id, succeeded, failed)
+    add_metric("JobsCompleted", MetricUnit.Count, 1)
+    return lambda_response(200, job_status(job))
+
+
+def is_sqs_event(event):
+    """Return True when ``event`` was delivered by an SQS event source mapping."""
+    records = event.get("Records")
+    return (
+        isinstance(records, list)
+        and bool(records)
+        and isinstance(records[0], dict)
+        and records[0].get("eventSource") == "aws:sqs"
+    )
+
+
+def handle_sqs_event(service, event, context):
+    """Process unlock requests delivered by an SQS event source mapping.
+
+    Every message body is one request, as for a direct invocation (the
+    action defaults to POST).  Messages are processed concurrently and only
+    those that failed with a retryable status (429, 5xx, timeout) are
+    returned in ``batchItemFailures``, so SQS redelivers just those.
+    Malformed or rejected requests are logged and dropped: a retry would
+    fail the same way.
+    """
+    records = event["Records"]
+    items = []
+    for record in records:
+        try:
+            items.append(json.loads(record.get("body") or ""))
+        except ValueError:
+            items.append(None)
+
+    failures = []
+    for record, response in zip(records, run_items(service, items, "POST", context)):
+        status_code = response["statusCode"]
+        if status_code == 429 or status_code >= 500:
+            failures.append({"itemIdentifier": record["messageId"]})
+        elif status_code >= 400:
+            logger.warning(
+                "Dropping message %s: %s",
+                record["messageId"],
+                response["body"].get("message"),
+            )
+    logger.info(
+        "SQS batch finished: %s done, %s to retry",
+        len(records) - len(failures),
+        len(failures),
+    )
+    return {"batchItemFailures": failures}
@@ -1,105 +1,275 @@
-import re
-import boto3
-import os
-import botocore
 import json
-from aws_lambda_powertools import Logger
-
-logger = Logger()
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from aws_lambda_powertools.metrics import MetricUnit
+from unlock_common import (
+    BATCH_TIMEOUT_MARGIN_MS,
+    DRY_RUN_ERROR_RATE,
+    DRY_RUN_FIXTURE,
+    DRY_RUN_JITTER_MS,
+    DRY_RUN_LATENCY_MS,
+    DRY_RUN_THROTTLE_RATE,
+    PREWARM_CLIENTS,
+    SERVICE_GOVERNOR,
+    DeadlineExceeded,
+    DryRunSimulator,
+    ProtectedResourceMatcher,
+    TTLCache,
+    UnlockService,
+    add_metric,
+    assume_root,
+    cached_negative_response,
+    deadline_passed,
+    deadline_response,
+    dispatch_event,
+    get_service_client,
+    get_shared_client,
+    handle_invocation,
+    is_throttling_error,
+    lambda_response,
+    logger,
+    policy_log_fields,
+    policy_response,
+    prewarm,
+    record_negative_outcome,
+    run_idempotent,
+    throttled_response,
+    timed,
+    traced,
+)
 
 TARGET_POLICY_NAME = "S3UnlockBucketPolicy"
-PROFILE_NAME = "sandbox"  # Used only for local testing
+# Comma-separated protection rules: exact names, "prefix*", globs or "re:<regex>"
 PROTECTED_BUCKETS = os.environ.get("PROTECTED_BUCKETS", "").split(",")
+# Terraform state buckets: <12-digit-accountid>-tf-state
+TF_STATE_BUCKET_RULE = r"re:\d{12}-tf-state$"
 ENVIRONMENT = os.environ.get("ENVIRONMENT", "")
 
+# GET results are cached per (account, resource) so dashboards polling the
+# same resource do not assume root on every call; a successful POST for the
+# resource drops its entry.
+POLICY_CACHE_SIZE = int(os.environ.get("POLICY_CACHE_SIZE", "1024"))
+POLICY_CACHE_TTL_SECONDS = int(os.environ.get("POLICY_CACHE_TTL_SECONDS", "30"))
 
-def lambda_response(status_code, body_dict):
-    return {
-        "statusCode": status_code,
-        "body": body_dict,
-    }
+# Not-found and not-locked outcomes are cached separately, for a shorter time,
+# so retried bad input is answered without AWS calls.  Requests with
+# "refresh": true bypass both caches and stored idempotent results.
+NEGATIVE_CACHE_SIZE = int(os.environ.get("NEGATIVE_CACHE_SIZE", "1024"))
+NEGATIVE_CACHE_TTL_SECONDS = int(os.environ.get("NEGATIVE_CACHE_TTL_SECONDS", "10"))
+
+# Organization-wide scan ({"action": "SCAN"}) fan-out limits.
+SCAN_ACCOUNT_CONCURRENCY = int(os.environ.get("SCAN_ACCOUNT_CONCURRENCY", "16"))
+SCAN_BUCKET_CONCURRENCY = int(os.environ.get("SCAN_BUCKET_CONCURRENCY", "8"))
+
+# Each bucket's region is resolved once (HeadBucket) and cached so requests go
+# straight to a client in that region instead of following redirects.
+S3_REGION_DISCOVERY = os.environ.get("S3_REGION_DISCOVERY", "true") == "true"
+BUCKET_REGION_CACHE_SIZE = int(os.environ.get("BUCKET_REGION_CACHE_SIZE", "4096"))
+BUCKET_REGION_CACHE_TTL_SECONDS = int(
+    os.environ.get("BUCKET_REGION_CACHE_TTL_SECONDS", "3600")
+)
 
+POLICY_CACHE = TTLCache(POLICY_CACHE_SIZE, POLICY_CACHE_TTL_SECONDS)
+NEGATIVE_CACHE = TTLCache(NEGATIVE_CACHE_SIZE, NEGATIVE_CACHE_TTL_SECONDS)
+BUCKET_REGION_CACHE = TTLCache(
+    BUCKET_REGION_CACHE_SIZE, BUCKET_REGION_CACHE_TTL_SECONDS
+)
 
-def get_boto3_session():
-    if (
-        os.environ.get("AWS_SAM_LOCAL") == "true"
-        or os.environ.get("LOCAL_TEST") == "true"
-    ):
-        return boto3.Session(profile_name=PROFILE_NAME)
-    else:
-        return boto3.Session()
+PROTECTED_BUCKET_MATCHER = ProtectedResourceMatcher(
+    PROTECTED_BUCKETS + [TF_STATE_BUCKET_RULE]
+)
+DRY_RUN_SIMULATOR = DryRunSimulator(
+    "buckets",
+    "s3:*",
+    DRY_RUN_FIXTURE,
+    latency_ms=DRY_RUN_LATENCY_MS,
+    jitter_ms=DRY_RUN_JITTER_MS,
+    throttle_rate=DRY_RUN_THROTTLE_RATE,
+    error_rate=DRY_RUN_ERROR_RATE,
+)
+
+
+def get_organizations_client():
+    """Return the container-wide Organizations client used by the scan mode."""
+    return get_shared_client("organizations")
+
+
+def get_bucket_region(s3, bucket_name):
+    """Return the region of ``bucket_name``, or None when it cannot be found.
+
+    The region is taken from the ``x-amz-bucket-region`` header, which S3
+    also returns on 301/403 HeadBucket errors, and cached by bucket name.
+    """
+    import botocore.exceptions
+
+    region = BUCKET_REGION_CACHE.get(bucket_name)
+    if region is not None:
+        return region
+    try:
+        with timed("RegionLookup"):
+            response = SERVICE_GOVERNOR.call(None, s3.head_bucket, Bucket=bucket_name)
+    except botocore.exceptions.ClientError as e:
+        response = e.response
+    headers = response.get("ResponseMetadata", {}).get("HTTPHeaders", {})
+    region = headers.get("x-amz-bucket-region")
+    if region:
+        BUCKET_REGION_CACHE.set(bucket_name, region)
+    return region
+
+
+def get_s3_client(creds, bucket_name):
+    """Return an S3 client in the region of ``bucket_name``."""
+    s3 = get_service_client("s3", creds)
+    if not S3_REGION_DISCOVERY:
+        return s3
+    region = get_bucket_region(s3, bucket_name)
+    if region and region != s3.meta.region_name:
+        return get_service_client("s3", creds, region_name=region)
+    return s3
 
 
 def handle_dry_run_s3(account_id, bucket_name, action):
-    """Simulate S3 bucket responses for development dry-run mode."""
-    logger.info(
-        f"DRY RUN: Simulating S3 bucket operation for {bucket_name} in account {account_id}"
+    """Answer a request from ``DRY_RUN_SIMULATOR`` instead of S3.
+
+    Simulated calls go through ``SERVICE_GOVERNOR`` like real ones, so
+    injected throttling is retried and ends in a 429 when it persists.
+    """
+    logger.debug(
+        "DRY RUN: Simulating S3 bucket operation for %s in account %s",
+        bucket_name,
+        account_id,
+    )
+    operation = (
+        DRY_RUN_SIMULATOR.get_policy
+        if action == "GET"
+        else DRY_RUN_SIMULATOR.delete_policy
     )
-    bucket_exists = "present" in bucket_name.lower()
+    try:
+        policy = SERVICE_GOVERNOR.call(
+            account_id, lambda: operation(account_id, bucket_name)
+        )
+    except KeyError:
+        return lambda_response(
+            404,
+            {
+                "status": "not_found",
+                "account_id": account_id,
+                "resource_name": bucket_name,
+                "message": f"[DRY RUN] Bucket {bucket_name} not found on {account_id}",
+            },
+        )
+    except DeadlineExceeded:
+        return deadline_response(account_id, bucket_name)
+    except Exception as e:
+        if is_throttling_error(e):
+            return throttled_response(account_id, bucket_name)
+        logger.error("DRY RUN: Simulated failure: %s", e)
+        return lambda_response(
+            500,
+            {
+                "status": "error",
+                "message": f"[DRY RUN] Unhandled exception: {str(e)}",
+            },
+        )
 
     if action == "GET":
-        if bucket_exists:
-            return lambda_response(
-                200,
-                {
-                    "status": "success",
-                    "account_id": account_id,
-                    "resource_name": bucket_name,
-                    "policy": {"dry_run": True},
-                },
-            )
-        else:
+        if policy is None:
             return lambda_response(
                 404,
                 {
                     "status": "not_found",
+                    "account_id": account_id,
                     "message": f"[DRY RUN] No bucket policy found for {bucket_name} on {account_id}",
                 },
             )
+        return policy_response(account_id, bucket_name, json.dumps(policy))
 
-    # POST: simulate unlock
-    if bucket_exists:
+    if policy is None:
         return lambda_response(
             200,
             {
-                "status": "unlocked",
+                "status": "not_locked",
                 "account_id": account_id,
                 "resource_name": bucket_name,
-                "message": f"[DRY RUN] Bucket policy deleted for {bucket_name} on {account_id}",
-            },
-        )
-    else:
-        return lambda_response(
-            404,
-            {
-                "status": "not_found",
-                "account_id": account_id,
-                "resource_name": bucket_name,
-                "message": f"[DRY RUN] Bucket {bucket_name} not found on {account_id}",
+                "message": f"[DRY RUN] No bucket policy found for {bucket_name} on {account_id}",
             },
         )
+    return lambda_response(
+        200,
+        {
+            "status": "unlocked",
+            "account_id": account_id,
+            "resource_name": bucket_name,
+            "message": f"[DRY RUN] Bucket policy deleted for {bucket_name} on {account_id}",
+        },
+    )
 
 
-def assume_root(account_id, policy_name, duration_seconds=900):
-    session = get_boto3_session()
-    sts = session.client("sts")
-    policy_arn = f"arn:aws:iam::aws:policy/root-task/{policy_name}"
-    logger.info(f"Assuming policy: {policy_name} in account: {account_id}")
-    resp = sts.assume_root(
-        TargetPrincipal=account_id,
-        TaskPolicyArn={"arn": policy_arn},
-        DurationSeconds=duration_seconds,
-    )
-    creds = resp["Credentials"]
-    return creds
+def is_protected_bucket(bucket_name):
+    # Protect buckets in PROTECTED_BUCKETS or matching <12-digit-accountid>-tf-state
+    return PROTECTED_BUCKET_MATCHER.matches(bucket_name)
+
+
+def policy_denies_all(policy):
+    """Return True when ``policy`` unconditionally denies every principal.
+
+    This is the lock-out pattern the unlock task exists for: a ``Deny``
+    statement for ``*`` principals and all S3 actions without conditions.
+    """
+    statements = policy.get("Statement", [])
+    if isinstance(statements, dict):
+        statements = [statements]
+    for statement in statements:
+        if statement.get("Effect") != "Deny" or statement.get("Condition"):
+            continue
+        principal = statement.get("Principal")
+        if isinstance(principal, dict):
+            principal = principal.get("AWS")
+        principals = principal if isinstance(principal, list) else [principal]
+        actions = statement.get("Action", [])
+        actions = actions if isinstance(actions, list) else [actions]
+        if "*" in principals and any(a in ("*", "s3:*") for a in actions):
+            return True
+    return False
 
 
 def lambda_handler(event, context):
-    logger.info("Starting unlock S3 bucket process", extra={"event": event})
+    return handle_invocation(handle_event, event, context)
+
 
-    account_id = event.get("account_id")
-    bucket_name = event.get("bucket_name")
+def handle_event(event, context):
+    return dispatch_event(SERVICE, event, context)
+
+
+def unlock_request(item, action):
+    """Answer one request, given as an event or a batch item, with ``action``."""
+    return unlock_bucket(
+        item.get("account_id"),
+        item.get("bucket_name"),
+        action,
+        return_policy=bool(item.get("return_policy", False)),
+        fast=bool(item.get("fast", False)),
+        refresh=bool(item.get("refresh", False)),
+    )
 
+
+def unlock_bucket(
+    account_id,
+    bucket_name,
+    action="POST",
+    return_policy=False,
+    fast=False,
+    refresh=False,
+):
+    """Validate a single request and view (GET) or delete (POST) the bucket policy.
+
+    For POST, ``return_policy`` adds the deleted policy to the response as
+    ``previous_policy`` so callers do not need a separate GET, and ``fast``
+    skips the ``get_bucket_policy`` existence check (ignored together with
+    ``return_policy``, which needs the read).  ``refresh`` ignores cached
+    and stored results and always asks S3.
+    """
     if not account_id:
         logger.error("Missing account_id in event")
         return lambda_response(
@@ -121,11 +291,10 @@ def lambda_handler(event, context):
             },
         )
 
-    # Protect buckets in PROTECTED_BUCKETS or matching <12-digit-accountid>-tf-state
-    tf_state_pattern = re.compile(r"^\d{12}-tf-state$")
-    if bucket_name in PROTECTED_BUCKETS or tf_state_pattern.match(bucket_name):
+    if is_protected_bucket(bucket_name):
         logger.error(
-            f"Bucket {bucket_name} is protected (either in PROTECTED_BUCKETS or matches <accountid>-tf-state pattern)"
+            "Bucket %s is protected (either in PROTECTED_BUCKETS or matches <accountid>-tf-state pattern)",
+            bucket_name,
         )
         return lambda_response(
             403,
@@ -137,50 +306,75 @@ def lambda_handler(event, context):
             },
         )
 
-    action = event.get("action", "POST")
-
     if ENVIRONMENT == "development":
         return handle_dry_run_s3(account_id, bucket_name, action)
 
-    try:
-        creds = assume_root(account_id, TARGET_POLICY_NAME)
+    resource_key = (account_id, bucket_name)
+    if not refresh:
+        if action == "GET":
+            policy_str = POLICY_CACHE.get(resource_key)
+            if policy_str is not None:
+                logger.debug("Bucket policy served from cache")
+                add_metric("PolicyCacheHits", MetricUnit.Count, 1)
+                return policy_response(account_id, bucket_name, policy_str, cached=True)
+        response = cached_negative_response(NEGATIVE_CACHE, resource_key, action)
+        if response is not None:
+            logger.debug("Bucket %s served from negative cache", bucket_name)
+            return response
 
-        if (
-            os.environ.get("AWS_SAM_LOCAL") == "true"
-            or os.environ.get("LOCAL_TEST") == "true"
-        ):
-            session = boto3.Session(
-                aws_access_key_id=creds["AccessKeyId"],
-                aws_secret_access_key=creds["SecretAccessKey"],
-                aws_session_token=creds["SessionToken"],
-                profile_name=PROFILE_NAME,
-            )
-        else:
-            session = boto3.Session(
-                aws_access_key_id=creds["AccessKeyId"],
-                aws_secret_access_key=creds["SecretAccessKey"],
-                aws_session_token=creds["SessionToken"],
-            )
+    response = run_idempotent(
+        (TARGET_POLICY_NAME, account_id, bucket_name, action, return_policy, fast),
+        lambda: _unlock_bucket_policy(
+            account_id, bucket_name, action, return_policy, fast
+        ),
+        persist=action == "POST",
+        replay=not refresh,
+    )
+    record_negative_outcome(NEGATIVE_CACHE, resource_key, action, response)
+    if action == "POST" and response["statusCode"] == 200:
+        POLICY_CACHE.invalidate(resource_key)
+    return response
+
+
+def bucket_not_found_response(account_id, bucket_name):
+    logger.info("Bucket %s does not exist", bucket_name)
+    return lambda_response(
+        404,
+        {
+            "status": "not_found",
+            "account_id": account_id,
+            "message": f"Bucket {bucket_name} not found for {account_id}",
+        },
+    )
+
+
+def _unlock_bucket_policy(account_id, bucket_name, action, return_policy, fast):
+    import botocore.exceptions
 
-        s3 = session.client("s3")
+    try:
+        creds = assume_root(account_id, TARGET_POLICY_NAME)
+        s3 = get_s3_client(creds, bucket_name)
 
         if action == "GET":
             # Return the bucket policy
             try:
-                response = s3.get_bucket_policy(Bucket=bucket_name)
-                policy_json = json.loads(response["Policy"])
-                logger.info("Bucket policy found", extra={"policy": policy_json})
-                return lambda_response(
-                    200,
-                    {
-                        "status": "success",
-                        "account_id": account_id,
-                        "resource_name": bucket_name,
-                        "policy": policy_json,
-                    },
-                )
+                with timed("PolicyRead"):
+                    response = SERVICE_GOVERNOR.call(
+                        account_id, s3.get_bucket_policy, Bucket=bucket_name
+                    )
+                policy_str = response["Policy"]
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info(
+                        "Bucket policy found",
+                        extra={"policy": policy_log_fields(policy_str)},
+                    )
+                if not deadline_passed():
+                    POLICY_CACHE.set((account_id, bucket_name), policy_str)
+                return policy_response(account_id, bucket_name, policy_str)
             except botocore.exceptions.ClientError as e:
                 error_code = e.response.get("Error", {}).get("Code")
+                if error_code == "NoSuchBucket":
+                    return bucket_not_found_response(account_id, bucket_name)
                 if error_code == "NoSuchBucketPolicy":
                     logger.info("Bucket policy does not exist")
                     return lambda_response(
@@ -190,8 +384,10 @@ def lambda_handler(event, context):
                             "message": f"No bucket policy found for {bucket_name} on {account_id}",
                         },
                     )
+                elif is_throttling_error(e):
+                    raise
                 else:
-                    logger.error(f"Error reading bucket policy: {e}")
+                    logger.error("Error reading bucket policy: %s", e)
                     return lambda_response(
                         500,
                         {
@@ -201,35 +397,62 @@ def lambda_handler(event, context):
                     )
 
         # POST method: unlock (delete) the bucket policy
-        # Check if bucket policy exists
-        try:
-            response = s3.get_bucket_policy(Bucket=bucket_name)
-            logger.info("Bucket policy found", extra={"policy": response["Policy"]})
+        previous_policy = None
+        if fast and not return_policy:
+            # Fast mode: skip the existence check, S3 reports a missing policy
             bucket_policy_exist = True
-        except botocore.exceptions.ClientError as e:
-            error_code = e.response.get("Error", {}).get("Code")
-            if error_code == "NoSuchBucketPolicy":
-                logger.info("Bucket policy does not exist")
-                bucket_policy_exist = False
-            else:
-                logger.error(f"Error checking bucket policy: {e}")
-                raise
+        else:
+            # Check if bucket policy exists
+            try:
+                with timed("PolicyRead"):
+                    response = SERVICE_GOVERNOR.call(
+                        account_id, s3.get_bucket_policy, Bucket=bucket_name
+                    )
+                previous_policy = response["Policy"]
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info(
+                        "Bucket policy found",
+                        extra={"policy": policy_log_fields(previous_policy)},
+                    )
+                bucket_policy_exist = True
+            except botocore.exceptions.ClientError as e:
+                error_code = e.response.get("Error", {}).get("Code")
+                if error_code == "NoSuchBucket":
+                    return bucket_not_found_response(account_id, bucket_name)
+                if error_code == "NoSuchBucketPolicy":
+                    logger.info("Bucket policy does not exist")
+                    bucket_policy_exist = False
+                else:
+                    logger.error("Error checking bucket policy: %s", e)
+                    raise
 
         if bucket_policy_exist:
             try:
-                s3.delete_bucket_policy(Bucket=bucket_name)
-                logger.info("Bucket policy deleted successfully")
-                return lambda_response(
-                    200,
-                    {
-                        "status": "unlocked",
-                        "account_id": account_id,
-                        "resource_name": bucket_name,
-                        "message": f"Bucket policy deleted for {bucket_name} on {account_id}",
-                    },
-                )
+                with timed("PolicyDelete"):
+                    SERVICE_GOVERNOR.call(
+                        account_id, s3.delete_bucket_policy, Bucket=bucket_name
+                    )
+            except botocore.exceptions.ClientError as e:
+                error_code = e.response.get("Error", {}).get("Code")
+                if error_code == "NoSuchBucket":
+                    return bucket_not_found_response(account_id, bucket_name)
+                if is_throttling_error(e):
+                    raise
+                if error_code != "NoSuchBucketPolicy":
+                    logger.error("Failed to delete bucket policy: %s", e)
+                    return lambda_response(
+                        500,
+                        {
+                            "status": "error",
+                            "message": f"Failed to delete bucket policy: {str(e)}",
+                        },
+                    )
+                logger.info("Bucket policy does not exist")
+                bucket_policy_exist = False
+            except DeadlineExceeded:
+                raise
             except Exception as e:
-                logger.error(f"Failed to delete bucket policy: {e}")
+                logger.error("Failed to delete bucket policy: %s", e)
                 return lambda_response(
                     500,
                     {
@@ -237,6 +460,18 @@ def lambda_handler(event, context):
                         "message": f"Failed to delete bucket policy: {str(e)}",
                     },
                 )
+
+        if bucket_policy_exist:
+            logger.info("Bucket policy deleted successfully")
+            body = {
+                "status": "unlocked",
+                "account_id": account_id,
+                "resource_name": bucket_name,
+                "message": f"Bucket policy deleted for {bucket_name} on {account_id}",
+            }
+            if return_policy:
+                body["previous_policy"] = json.loads(previous_policy)
+            return lambda_response(200, body)
         else:
             return lambda_response(
                 200,
@@ -247,8 +482,14 @@ def lambda_handler(event, context):
                     "message": f"No bucket policy found for {bucket_name} on {account_id}",
                 },
             )
+    except DeadlineExceeded as e:
+        logger.warning("Stopped before the Lambda timeout: %s", e)
+        return deadline_response(account_id, bucket_name)
     except Exception as e:
-        logger.error(f"Unhandled exception: {e}")
+        if is_throttling_error(e):
+            logger.warning("Still throttled after retries: %s", e)
+            return throttled_response(account_id, bucket_name)
+        logger.error("Unhandled exception: %s", e)
         return lambda_response(
             500,
             {
@@ -258,6 +499,213 @@ def lambda_handler(event, context):
         )
 
 
+def list_organization_accounts():
+    """Return the IDs of every ACTIVE account in the organization."""
+    paginator = get_organizations_client().get_paginator("list_accounts")
+    return [
+        account["Id"]
+        for page in paginator.paginate()
+        for account in page["Accounts"]
+        if account.get("Status", "ACTIVE") == "ACTIVE"
+    ]
+
+
+def _bucket_policy_or_none(s3, account_id, bucket_name):
+    import botocore.exceptions
+
+    try:
+        with timed("PolicyRead"):
+            response = SERVICE_GOVERNOR.call(
+                account_id, s3.get_bucket_policy, Bucket=bucket_name
+            )
+    except botocore.exceptions.ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "NoSuchBucketPolicy":
+            return None
+        raise
+    return json.loads(response["Policy"])
+
+
+def scan_account_buckets(account_id, bucket_concurrency=SCAN_BUCKET_CONCURRENCY):
+    """Yield a finding for every bucket in ``account_id`` whose policy denies all.
+
+    ``S3UnlockBucketPolicy`` is assumed once for the account and the bucket
+    policies are fetched concurrently.
+    """
+    creds = assume_root(account_id, TARGET_POLICY_NAME)
+    s3 = get_service_client("s3", creds)
+    # ListBuckets only reports BucketRegion on paginated requests, which
+    # send MaxBuckets.
+    buckets = SERVICE_GOVERNOR.call(
+        account_id,
+        lambda: [
+            bucket
+            for page in s3.get_paginator("list_buckets").paginate(
+                PaginationConfig={"PageSize": 1000}
+            )
+            for bucket in page.get("Buckets", [])
+        ],
+    )
+    if not buckets:
+        return
+
+    def _client_for(bucket):
+        # A listed BucketRegion saves the HeadBucket of get_bucket_region.
+        if not S3_REGION_DISCOVERY:
+            return s3
+        region = bucket.get("BucketRegion")
+        if region:
+            BUCKET_REGION_CACHE.set(bucket["Name"], region)
+        else:
+            region = get_bucket_region(s3, bucket["Name"])
+        if not region or region == s3.meta.region_name:
+            return s3
+        return get_service_client("s3", creds, region_name=region)
+
+    def _scan_bucket(bucket):
+        return _bucket_policy_or_none(_client_for(bucket), account_id, bucket["Name"])
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(bucket_concurrency, len(buckets)))
+    ) as executor:
+        futures = {
+            executor.submit(
+                traced("ScanBucket", _scan_bucket, resource_name=bucket["Name"]),
+                bucket,
+            ): bucket["Name"]
+            for bucket in buckets
+        }
+        for future in as_completed(futures):
+            bucket_name = futures[future]
+            try:
+                policy = future.result()
+            except Exception as e:
+                logger.error(
+                    "Error reading policy of %s on %s: %s", bucket_name, account_id, e
+                )
+                continue
+            if policy and policy_denies_all(policy):
+                yield {
+                    "account_id": account_id,
+                    "bucket_name": bucket_name,
+                    "protected": is_protected_bucket(bucket_name),
+                }
+
+
+def scan_concurrency(event, key, default):
+    """Return the worker count ``event[key]`` (or ``default``), at least 1.
+
+    Raises ``ValueError`` when the value is not a whole number.
+    """
+    value = event.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"{key} must be an integer")
+    try:
+        return max(1, int(value))
+    except ValueError:
+        raise ValueError(f"{key} must be an integer") from None
+
+
+def handle_scan(event, context):
+    """Find locked buckets across the organization (or ``event["account_ids"]``).
+
+    Accounts are scanned concurrently; every locked bucket is logged as soon
+    as it is found.  Accounts not finished shortly before the Lambda timeout
+    are returned in ``pending_accounts`` so the caller can resume the scan.
+    """
+    try:
+        account_concurrency = scan_concurrency(
+            event, "account_concurrency", SCAN_ACCOUNT_CONCURRENCY
+        )
+        bucket_concurrency = scan_concurrency(
+            event, "bucket_concurrency", SCAN_BUCKET_CONCURRENCY
+        )
+    except ValueError as e:
+        logger.error("Invalid SCAN options: %s", e)
+        return lambda_response(400, {"status": "error", "message": str(e)})
+
+    if ENVIRONMENT == "development":
+        logger.info("DRY RUN: Simulating organization bucket scan")
+        return lambda_response(
+            200,
+            {
+                "status": "success",
+                "accounts_scanned": 0,
+                "locked_buckets": [],
+                "message": "[DRY RUN] Organization scan skipped",
+            },
+        )
+
+    try:
+        account_ids = event.get("account_ids") or list_organization_accounts()
+    except Exception as e:
+        logger.error("Failed to list organization accounts: %s", e)
+        return lambda_response(
+            500,
+            {
+                "status": "error",
+                "message": f"Failed to list organization accounts: {str(e)}",
+            },
+        )
+    logger.info("Scanning %s accounts for locked buckets", len(account_ids))
+
+    timeout = None
+    if context is not None:
+        remaining_ms = context.get_remaining_time_in_millis() - BATCH_TIMEOUT_MARGIN_MS
+        timeout = max(remaining_ms, 0) / 1000
+
+    locked_buckets = []
+    failed_accounts = []
+    scanned = set()
+
+    def _scan(account_id):
+        for finding in scan_account_buckets(account_id, bucket_concurrency):
+            logger.info("Locked bucket found", extra=finding)
+            locked_buckets.append(finding)
+
+    executor = ThreadPoolExecutor(
+        max_workers=max(1, min(account_concurrency, len(account_ids)))
+    )
+    futures = {
+        executor.submit(
+            traced("ScanAccount", _scan, account_id=account_id), account_id
+        ): account_id
+        for account_id in account_ids
+    }
+    done, _ = wait(futures, timeout=timeout)
+    executor.shutdown(wait=False, cancel_futures=True)
+    for future in done:
+        account_id = futures[future]
+        scanned.add(account_id)
+        if future.exception() is not None:
+            logger.error(
+                "Failed to scan account %s: %s", account_id, future.exception()
+            )
+            failed_accounts.append(
+                {"account_id": account_id, "message": str(future.exception())}
+            )
+
+    pending_accounts = [a for a in account_ids if a not in scanned]
+    return lambda_response(
+        200,
+        {
+            "status": "partial" if pending_accounts else "success",
+            "accounts_scanned": len(scanned),
+            "locked_buckets": list(locked_buckets),
+            "failed_accounts": failed_accounts,
+            "pending_accounts": pending_accounts,
+        },
+    )
+
+
+SERVICE = UnlockService(
+    "S3 bucket", "bucket_name", unlock_request, actions={"SCAN": handle_scan}
+)
+
+
+if PREWARM_CLIENTS and ENVIRONMENT != "development":
+    prewarm("s3")
+
+
 if __name__ == "__main__":
     # Example event for local testing
     os.environ["LOCAL_TEST"] = "true"
@@ -1,54 +1,139 @@
-import boto3
-import os
-import botocore
 import json
-
-from aws_lambda_powertools import Logger
-
-logger = Logger()
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from aws_lambda_powertools.metrics import MetricUnit
+from unlock_common import (
+    BATCH_TIMEOUT_MARGIN_MS,
+    DRY_RUN_ERROR_RATE,
+    DRY_RUN_FIXTURE,
+    DRY_RUN_JITTER_MS,
+    DRY_RUN_LATENCY_MS,
+    DRY_RUN_THROTTLE_RATE,
+    PREWARM_CLIENTS,
+    SERVICE_GOVERNOR,
+    DeadlineExceeded,
+    DryRunSimulator,
+    ProtectedResourceMatcher,
+    TTLCache,
+    UnlockService,
+    add_metric,
+    assume_root,
+    cached_negative_response,
+    deadline_passed,
+    deadline_response,
+    dispatch_event,
+    get_service_client,
+    handle_invocation,
+    is_throttling_error,
+    lambda_response,
+    logger,
+    policy_log_fields,
+    policy_response,
+    prewarm,
+    record_negative_outcome,
+    run_idempotent,
+    throttled_response,
+    timed,
+    traced,
+)
 
 TARGET_POLICY_NAME = "SQSUnlockQueuePolicy"
-PROFILE_NAME = "sandbox"  # Used only for local testing
+# Comma-separated protection rules: exact names, "prefix*", globs or "re:<regex>"
+PROTECTED_QUEUES = os.environ.get("PROTECTED_QUEUES", "").split(",")
 
 ENVIRONMENT = os.environ.get("ENVIRONMENT", "")
 
+# GET results are cached per (account, resource) so dashboards polling the
+# same resource do not assume root on every call; a successful POST for the
+# resource drops its entry.
+POLICY_CACHE_SIZE = int(os.environ.get("POLICY_CACHE_SIZE", "1024"))
+POLICY_CACHE_TTL_SECONDS = int(os.environ.get("POLICY_CACHE_TTL_SECONDS", "30"))
+
+# Not-found and not-locked outcomes are cached separately, for a shorter time,
+# so retried bad input is answered without AWS calls.  Requests with
+# "refresh": true bypass both caches and stored idempotent results.
+NEGATIVE_CACHE_SIZE = int(os.environ.get("NEGATIVE_CACHE_SIZE", "1024"))
+NEGATIVE_CACHE_TTL_SECONDS = int(os.environ.get("NEGATIVE_CACHE_TTL_SECONDS", "10"))
 
-def lambda_response(status_code, body_dict):
-    return {
-        "statusCode": status_code,
-        "body": body_dict,
-    }
+# Account-wide sweep ({"action": "SWEEP"}) policy check fan-out.
+SWEEP_CONCURRENCY = int(os.environ.get("SWEEP_CONCURRENCY", "16"))
 
+# Queue URLs are cached per (account, region, queue name).  With
+# SQS_BUILD_QUEUE_URL the URL is built from the client's endpoint and the
+# account ID instead of calling get_queue_url, which is only used as a
+# fallback.
+QUEUE_URL_CACHE_SIZE = int(os.environ.get("QUEUE_URL_CACHE_SIZE", "1024"))
+QUEUE_URL_CACHE_TTL_SECONDS = int(os.environ.get("QUEUE_URL_CACHE_TTL_SECONDS", "3600"))
+SQS_BUILD_QUEUE_URL = os.environ.get("SQS_BUILD_QUEUE_URL", "false") == "true"
+# Only these get_queue_url errors mean the queue does not exist; any other
+# failure is an error, never a cached "not found".
+QUEUE_NOT_FOUND_ERROR_CODES = frozenset(
+    ("QueueDoesNotExist", "AWS.SimpleQueueService.NonExistentQueue")
+)
 
-def get_boto3_session():
-    if (
-        os.environ.get("AWS_SAM_LOCAL") == "true"
-        or os.environ.get("LOCAL_TEST") == "true"
-    ):
-        return boto3.Session(profile_name=PROFILE_NAME)
-    else:
-        return boto3.Session()
+POLICY_CACHE = TTLCache(POLICY_CACHE_SIZE, POLICY_CACHE_TTL_SECONDS)
+NEGATIVE_CACHE = TTLCache(NEGATIVE_CACHE_SIZE, NEGATIVE_CACHE_TTL_SECONDS)
+QUEUE_URL_CACHE = TTLCache(QUEUE_URL_CACHE_SIZE, QUEUE_URL_CACHE_TTL_SECONDS)
+
+PROTECTED_QUEUE_MATCHER = ProtectedResourceMatcher(PROTECTED_QUEUES)
+DRY_RUN_SIMULATOR = DryRunSimulator(
+    "queues",
+    "sqs:*",
+    DRY_RUN_FIXTURE,
+    latency_ms=DRY_RUN_LATENCY_MS,
+    jitter_ms=DRY_RUN_JITTER_MS,
+    throttle_rate=DRY_RUN_THROTTLE_RATE,
+    error_rate=DRY_RUN_ERROR_RATE,
+)
 
 
 def handle_dry_run_sqs(account_id, queue_name, action):
-    """Simulate SQS queue responses for development dry-run mode."""
-    logger.info(
-        f"DRY RUN: Simulating SQS queue operation for {queue_name} in account {account_id}"
+    """Answer a request from ``DRY_RUN_SIMULATOR`` instead of SQS.
+
+    Simulated calls go through ``SERVICE_GOVERNOR`` like real ones, so
+    injected throttling is retried and ends in a 429 when it persists.
+    """
+    logger.debug(
+        "DRY RUN: Simulating SQS queue operation for %s in account %s",
+        queue_name,
+        account_id,
+    )
+    operation = (
+        DRY_RUN_SIMULATOR.get_policy
+        if action == "GET"
+        else DRY_RUN_SIMULATOR.delete_policy
     )
-    queue_exists = "present" in queue_name.lower()
+    try:
+        policy = SERVICE_GOVERNOR.call(
+            account_id, lambda: operation(account_id, queue_name)
+        )
+    except KeyError:
+        return lambda_response(
+            404,
+            {
+                "status": "not_found",
+                "account_id": account_id,
+                "resource_name": queue_name,
+                "message": f"[DRY RUN] Queue {queue_name} not found on {account_id}",
+            },
+        )
+    except DeadlineExceeded:
+        return deadline_response(account_id, queue_name)
+    except Exception as e:
+        if is_throttling_error(e):
+            return throttled_response(account_id, queue_name)
+        logger.error("DRY RUN: Simulated failure: %s", e)
+        return lambda_response(
+            500,
+            {
+                "status": "error",
+                "message": f"[DRY RUN] Unhandled exception: {str(e)}",
+            },
+        )
 
     if action == "GET":
-        if queue_exists:
-            return lambda_response(
-                200,
-                {
-                    "status": "success",
-                    "account_id": account_id,
-                    "resource_name": queue_name,
-                    "policy": {"dry_run": True},
-                },
-            )
-        else:
+        if policy is None:
             return lambda_response(
                 404,
                 {
@@ -57,49 +142,142 @@ def handle_dry_run_sqs(account_id, queue_name, action):
                     "message": f"[DRY RUN] No queue policy found for {queue_name} on {account_id}",
                 },
             )
+        return policy_response(account_id, queue_name, json.dumps(policy))
 
-    # POST: simulate unlock
-    if queue_exists:
+    if policy is None:
         return lambda_response(
             200,
             {
-                "status": "unlocked",
+                "status": "not_locked",
                 "account_id": account_id,
                 "resource_name": queue_name,
-                "message": f"[DRY RUN] Queue policy deleted for {queue_name} on {account_id}",
+                "message": f"[DRY RUN] No queue policy found for {queue_name} on {account_id}",
             },
         )
-    else:
-        return lambda_response(
-            404,
-            {
-                "status": "not_found",
-                "account_id": account_id,
-                "resource_name": queue_name,
-                "message": f"[DRY RUN] Queue {queue_name} not found on {account_id}",
-            },
+    return lambda_response(
+        200,
+        {
+            "status": "unlocked",
+            "account_id": account_id,
+            "resource_name": queue_name,
+            "message": f"[DRY RUN] Queue policy deleted for {queue_name} on {account_id}",
+        },
+    )
+
+
+def is_protected_queue(queue_name):
+    # Protect queues matching a PROTECTED_QUEUES rule
+    return PROTECTED_QUEUE_MATCHER.matches(queue_name)
+
+
+def policy_denies_all(policy):
+    """Return True when ``policy`` unconditionally denies every principal.
+
+    This is the lock-out pattern the unlock task exists for: a ``Deny``
+    statement for ``*`` principals and all SQS actions without conditions.
+    """
+    statements = policy.get("Statement", [])
+    if isinstance(statements, dict):
+        statements = [statements]
+    for statement in statements:
+        if statement.get("Effect") != "Deny" or statement.get("Condition"):
+            continue
+        principal = statement.get("Principal")
+        if isinstance(principal, dict):
+            principal = principal.get("AWS")
+        principals = principal if isinstance(principal, list) else [principal]
+        actions = statement.get("Action", [])
+        actions = actions if isinstance(actions, list) else [actions]
+        if "*" in principals and any(a in ("*", "sqs:*") for a in actions):
+            return True
+    return False
+
+
+class QueueNotFoundError(Exception):
+    """Raised when the URL of a queue cannot be resolved."""
+
+
+def build_queue_url(sqs, account_id, queue_name):
+    # The endpoint covers other partitions (amazonaws.com.cn) and ENDPOINT_URL.
+    return f"{sqs.meta.endpoint_url.rstrip('/')}/{account_id}/{queue_name}"
+
+
+def _queue_account(queue_url):
+    # Queue URLs end in /<account id>/<queue name>.
+    return queue_url.rsplit("/", 2)[-2]
+
+
+def _policy_attribute(sqs, queue_url):
+    with timed("PolicyRead"):
+        attrs = SERVICE_GOVERNOR.call(
+            _queue_account(queue_url),
+            sqs.get_queue_attributes,
+            QueueUrl=queue_url,
+            AttributeNames=["Policy"],
         )
+    return attrs.get("Attributes", {}).get("Policy")
 
 
-def assume_root(account_id, policy_name, duration_seconds=900):
-    session = get_boto3_session()
-    sts = session.client("sts")
-    policy_arn = f"arn:aws:iam::aws:policy/root-task/{policy_name}"
-    logger.info(f"Assuming policy: {policy_name} in account: {account_id}")
-    resp = sts.assume_root(
-        TargetPrincipal=account_id,
-        TaskPolicyArn={"arn": policy_arn},
-        DurationSeconds=duration_seconds,
-    )
-    creds = resp["Credentials"]
-    return creds
+def read_queue_policy(sqs, account_id, queue_name):
+    """Return ``(queue_url, policy_str)`` for ``queue_name`` in ``account_id``.
+
+    A cached (or, with ``SQS_BUILD_QUEUE_URL``, a constructed) URL is tried
+    first; ``get_queue_url`` is only called when there is none or when the
+    attribute call on it fails.  Raises ``QueueNotFoundError`` when
+    ``get_queue_url`` reports that the queue does not exist; other errors are
+    raised unchanged.
+    """
+    import botocore.exceptions
+
+    cache_key = (account_id, sqs.meta.region_name, queue_name)
+    queue_url = QUEUE_URL_CACHE.get(cache_key)
+    if queue_url is None and SQS_BUILD_QUEUE_URL:
+        queue_url = build_queue_url(sqs, account_id, queue_name)
+    if queue_url is not None:
+        try:
+            return queue_url, _policy_attribute(sqs, queue_url)
+        except botocore.exceptions.ClientError as e:
+            if is_throttling_error(e):
+                raise
+            logger.info("Queue URL %s rejected, falling back: %s", queue_url, e)
+            QUEUE_URL_CACHE.invalidate(cache_key)
+
+    try:
+        with timed("GetQueueUrl"):
+            queue_url = SERVICE_GOVERNOR.call(
+                account_id, sqs.get_queue_url, QueueName=queue_name
+            )["QueueUrl"]
+    except botocore.exceptions.ClientError as e:
+        if e.response.get("Error", {}).get("Code") in QUEUE_NOT_FOUND_ERROR_CODES:
+            raise QueueNotFoundError(str(e)) from e
+        raise
+    QUEUE_URL_CACHE.set(cache_key, queue_url)
+    return queue_url, _policy_attribute(sqs, queue_url)
 
 
 def lambda_handler(event, context):
-    logger.info("Starting unlock SQS queue process", extra={"event": event})
+    return handle_invocation(handle_event, event, context)
 
-    account_id = event.get("account_id")
-    queue_name = event.get("queue_name")
+
+def handle_event(event, context):
+    return dispatch_event(SERVICE, event, context)
+
+
+def unlock_request(item, action):
+    """Answer one request, given as an event or a batch item, with ``action``."""
+    return unlock_queue(
+        item.get("account_id"),
+        item.get("queue_name"),
+        action,
+        refresh=bool(item.get("refresh", False)),
+    )
+
+
+def unlock_queue(account_id, queue_name, action="POST", refresh=False):
+    """Validate a single request and view (GET) or delete (POST) the queue policy.
+
+    ``refresh`` ignores cached and stored results and always asks SQS.
+    """
 
     if not account_id:
         logger.error("Missing account_id in event")
@@ -122,38 +300,55 @@ def lambda_handler(event, context):
             },
         )
 
-    action = event.get("action", "POST")
+    if is_protected_queue(queue_name):
+        logger.error("Queue %s is protected (matches PROTECTED_QUEUES)", queue_name)
+        return lambda_response(
+            403,
+            {
+                "status": "error",
+                "account_id": account_id,
+                "queue_name": queue_name,
+                "message": f"Queue {queue_name} is protected",
+            },
+        )
 
     if ENVIRONMENT == "development":
         return handle_dry_run_sqs(account_id, queue_name, action)
 
-    try:
-        creds = assume_root(account_id, TARGET_POLICY_NAME)
+    resource_key = (account_id, queue_name)
+    if not refresh:
+        if action == "GET":
+            policy_str = POLICY_CACHE.get(resource_key)
+            if policy_str is not None:
+                logger.debug("Queue policy served from cache")
+                add_metric("PolicyCacheHits", MetricUnit.Count, 1)
+                return policy_response(account_id, queue_name, policy_str, cached=True)
+        response = cached_negative_response(NEGATIVE_CACHE, resource_key, action)
+        if response is not None:
+            logger.debug("Queue %s served from negative cache", queue_name)
+            return response
 
-        if (
-            os.environ.get("AWS_SAM_LOCAL") == "true"
-            or os.environ.get("LOCAL_TEST") == "true"
-        ):
-            session = boto3.Session(
-                aws_access_key_id=creds["AccessKeyId"],
-                aws_secret_access_key=creds["SecretAccessKey"],
-                aws_session_token=creds["SessionToken"],
-                profile_name=PROFILE_NAME,
-            )
-        else:
-            session = boto3.Session(
-                aws_access_key_id=creds["AccessKeyId"],
-                aws_secret_access_key=creds["SecretAccessKey"],
-                aws_session_token=creds["SessionToken"],
-            )
+    response = run_idempotent(
+        (TARGET_POLICY_NAME, account_id, queue_name, action),
+        lambda: _unlock_queue_policy(account_id, queue_name, action),
+        persist=action == "POST",
+        replay=not refresh,
+    )
+    record_negative_outcome(NEGATIVE_CACHE, resource_key, action, response)
+    if action == "POST" and response["statusCode"] == 200:
+        POLICY_CACHE.invalidate(resource_key)
+    return response
 
-        sqs = session.client("sqs")
 
-        # Get the queue URL
+def _unlock_queue_policy(account_id, queue_name, action):
+    try:
+        creds = assume_root(account_id, TARGET_POLICY_NAME)
+        sqs = get_service_client("sqs", creds)
+
         try:
-            queue_url = sqs.get_queue_url(QueueName=queue_name)["QueueUrl"]
-        except Exception as e:
-            logger.error(f"Failed to get SQS queue URL: {e}")
+            queue_url, policy_str = read_queue_policy(sqs, account_id, queue_name)
+        except QueueNotFoundError as e:
+            logger.error("Failed to get SQS queue URL: %s", e)
             return lambda_response(
                 404,
                 {
@@ -162,61 +357,54 @@ def lambda_handler(event, context):
                     "message": f"Queue {queue_name} not found for {account_id}",
                 },
             )
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            if action != "GET" or is_throttling_error(e):
+                logger.error("Error checking queue policy: %s", e)
+                raise
+            logger.error("Error reading queue policy: %s", e)
+            return lambda_response(
+                500,
+                {
+                    "status": "error",
+                    "message": f"Error reading queue policy: {str(e)}",
+                },
+            )
 
         if action == "GET":
             # Return the queue policy
-            try:
-                attrs = sqs.get_queue_attributes(
-                    QueueUrl=queue_url, AttributeNames=["Policy"]
-                )
-                policy_str = attrs.get("Attributes", {}).get("Policy")
-                if policy_str:
-                    policy_json = json.loads(policy_str)
-                    logger.info("Queue policy found", extra={"policy": policy_json})
-                    return lambda_response(
-                        200,
-                        {
-                            "status": "success",
-                            "account_id": account_id,
-                            "resource_name": queue_name,
-                            "policy": policy_json,
-                        },
+            if policy_str:
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info(
+                        "Queue policy found",
+                        extra={"policy": policy_log_fields(policy_str)},
                     )
-                else:
-                    logger.info("Queue policy does not exist")
-                    return lambda_response(
-                        404,
-                        {
-                            "status": "not_found",
-                            "account_id": account_id,
-                            "message": f"No queue policy found for {queue_name} on {account_id}",
-                        },
-                    )
-            except Exception as e:
-                logger.error(f"Error reading queue policy: {e}")
+                if not deadline_passed():
+                    POLICY_CACHE.set((account_id, queue_name), policy_str)
+                return policy_response(account_id, queue_name, policy_str)
+            else:
+                logger.info("Queue policy does not exist")
                 return lambda_response(
-                    500,
+                    404,
                     {
-                        "status": "error",
-                        "message": f"Error reading queue policy: {str(e)}",
+                        "status": "not_found",
+                        "account_id": account_id,
+                        "message": f"No queue policy found for {queue_name} on {account_id}",
                     },
                 )
 
         # POST method: unlock (delete) the queue policy
-        # Check if queue policy exists
-        try:
-            attrs = sqs.get_queue_attributes(
-                QueueUrl=queue_url, AttributeNames=["Policy"]
-            )
-            policy_str = attrs.get("Attributes", {}).get("Policy")
-            queue_policy_exist = bool(policy_str)
-        except Exception as e:
-            logger.error(f"Error checking queue policy: {e}")
-            raise
-
+        queue_policy_exist = bool(policy_str)
         if queue_policy_exist:
             try:
-                sqs.set_queue_attributes(QueueUrl=queue_url, Attributes={"Policy": ""})
+                with timed("PolicyDelete"):
+                    SERVICE_GOVERNOR.call(
+                        account_id,
+                        sqs.set_queue_attributes,
+                        QueueUrl=queue_url,
+                        Attributes={"Policy": ""},
+                    )
                 logger.info("Queue policy deleted successfully")
                 return lambda_response(
                     200,
@@ -227,8 +415,12 @@ def lambda_handler(event, context):
                         "message": f"Queue policy deleted for {queue_name} on {account_id}",
                     },
                 )
+            except DeadlineExceeded:
+                raise
             except Exception as e:
-                logger.error(f"Failed to delete queue policy: {e}")
+                if is_throttling_error(e):
+                    raise
+                logger.error("Failed to delete queue policy: %s", e)
                 return lambda_response(
                     500,
                     {
@@ -246,8 +438,14 @@ def lambda_handler(event, context):
                     "message": f"No queue policy found for {queue_name} on {account_id}",
                 },
             )
+    except DeadlineExceeded as e:
+        logger.warning("Stopped before the Lambda timeout: %s", e)
+        return deadline_response(account_id, queue_name)
     except Exception as e:
-        logger.error(f"Unhandled exception: {e}")
+        if is_throttling_error(e):
+            logger.warning("Still throttled after retries: %s", e)
+            return throttled_response(account_id, queue_name)
+        logger.error("Unhandled exception: %s", e)
         return lambda_response(
             500,
             {
@@ -257,6 +455,148 @@ def lambda_handler(event, context):
         )
 
 
+def _sweep_queue(sqs, queue_url, unlock):
+    """Check one queue and, when ``unlock`` is set, clear a deny-all policy."""
+    queue_name = queue_url.rsplit("/", 1)[-1]
+    policy_str = _policy_attribute(sqs, queue_url)
+    if not policy_str or not policy_denies_all(json.loads(policy_str)):
+        return None
+
+    finding = {"queue_name": queue_name, "queue_url": queue_url, "status": "locked"}
+    if is_protected_queue(queue_name):
+        finding["status"] = "protected"
+    elif unlock:
+        with timed("PolicyDelete"):
+            SERVICE_GOVERNOR.call(
+                _queue_account(queue_url),
+                sqs.set_queue_attributes,
+                QueueUrl=queue_url,
+                Attributes={"Policy": ""},
+            )
+        logger.info("Queue policy deleted for %s", queue_name)
+        POLICY_CACHE.invalidate((_queue_account(queue_url), queue_name))
+        finding["status"] = "unlocked"
+    return finding
+
+
+def handle_sweep(event, context):
+    """Find (and optionally unlock) every locked queue in one account.
+
+    ``list_queues`` is paged once, optionally filtered by ``queue_name_prefix``,
+    and the ``Policy`` attributes are fetched in parallel.  With
+    ``"unlock": true`` every deny-all policy found is deleted, except on
+    protected queues, which are reported with status ``protected``.
+    """
+    account_id = event.get("account_id")
+    if not account_id:
+        logger.error("Missing account_id in event")
+        return lambda_response(
+            400,
+            {
+                "status": "error",
+                "account_id": None,
+                "message": "Missing account_id in path parameters",
+            },
+        )
+    prefix = event.get("queue_name_prefix")
+    unlock = bool(event.get("unlock", False))
+
+    if ENVIRONMENT == "development":
+        logger.info("DRY RUN: Simulating SQS queue sweep in account %s", account_id)
+        return lambda_response(
+            200,
+            {
+                "status": "success",
+                "account_id": account_id,
+                "queues_checked": 0,
+                "locked_queues": [],
+                "message": f"[DRY RUN] Queue sweep skipped on {account_id}",
+            },
+        )
+
+    try:
+        creds = assume_root(account_id, TARGET_POLICY_NAME)
+        sqs = get_service_client("sqs", creds)
+        paginate_kwargs = {"QueueNamePrefix": prefix} if prefix else {}
+        queue_urls = SERVICE_GOVERNOR.call(
+            account_id,
+            lambda: [
+                url
+                for page in sqs.get_paginator("list_queues").paginate(**paginate_kwargs)
+                for url in page.get("QueueUrls", [])
+            ],
+        )
+    except Exception as e:
+        logger.error("Failed to list SQS queues: %s", e)
+        return lambda_response(
+            500,
+            {
+                "status": "error",
+                "account_id": account_id,
+                "message": f"Failed to list SQS queues: {str(e)}",
+            },
+        )
+    logger.info("Sweeping %s queues in account %s", len(queue_urls), account_id)
+
+    timeout = None
+    if context is not None:
+        remaining_ms = context.get_remaining_time_in_millis() - BATCH_TIMEOUT_MARGIN_MS
+        timeout = max(remaining_ms, 0) / 1000
+
+    locked_queues = []
+    failed_queues = []
+    pending_queues = []
+    if queue_urls:
+        executor = ThreadPoolExecutor(
+            max_workers=min(SWEEP_CONCURRENCY, len(queue_urls))
+        )
+        futures = {
+            executor.submit(
+                traced(
+                    "SweepQueue", _sweep_queue, resource_name=url.rsplit("/", 1)[-1]
+                ),
+                sqs,
+                url,
+                unlock,
+            ): url
+            for url in queue_urls
+        }
+        wait(futures, timeout=timeout)
+        executor.shutdown(wait=False, cancel_futures=True)
+        for future, queue_url in futures.items():
+            if not future.done() or future.cancelled():
+                pending_queues.append(queue_url)
+            elif future.exception() is not None:
+                logger.error("Failed to sweep %s: %s", queue_url, future.exception())
+                failed_queues.append(
+                    {"queue_url": queue_url, "message": str(future.exception())}
+                )
+            elif future.result() is not None:
+                locked_queues.append(future.result())
+
+    status = "partial" if pending_queues or failed_queues else "success"
+    return lambda_response(
+        200,
+        {
+            "status": status,
+            "account_id": account_id,
+            "queues_checked": len(queue_urls) - len(pending_queues),
+            "locked_queues": locked_queues,
+            "failed_queues": failed_queues,
+            "pending_queues": pending_queues,
+        },
+    )
+
+
+SERVICE = UnlockService(
+    "SQS queue", "queue_name", unlock_request, actions={"SWEEP": handle_sweep}
+)
+
+
+if PREWARM_CLIENTS and ENVIRONMENT != "development":
+    prewarm("sqs")
+
+
 if __name__ == "__main__":
     # Example event for local testing
     os.environ["LOCAL_TEST"] = "true"
@@ -15,6 +15,186 @@ resource "aws_lambda_permission" "compliance_dashboard_unlock_sqs_queue" {
   principal     = "arn:aws:iam::${var.compliance_dashboard_account_id}:role/${var.compliance_dashboard_role_name}"
 }
 
+# Optional DynamoDB table shared by both Lambda functions to deduplicate
+# repeated unlock requests across containers (in-memory per container otherwise)
+resource "aws_dynamodb_table" "idempotency" {
+  count        = var.idempotency_table_enabled ? 1 : 0
+  name         = "aws-root-access-management-idempotency"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "id"
+
+  attribute {
+    name = "id"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expiration"
+    enabled        = true
+  }
+
+  tags = var.tags
+}
+
+locals {
+  idempotency_table_name = var.idempotency_table_enabled ? aws_dynamodb_table.idempotency[0].name : ""
+  idempotency_policy_statements = var.idempotency_table_enabled ? [
+    {
+      effect = "Allow"
+      actions = [
+        "dynamodb:GetItem",
+        "dynamodb:PutItem"
+      ]
+      resources = [
+        aws_dynamodb_table.idempotency[0].arn
+      ]
+    }
+  ] : []
+}
+
+# Optional DynamoDB table holding asynchronous unlock jobs ({"async": true}),
+# which each function runs by invoking itself and callers poll with STATUS
+resource "aws_dynamodb_table" "jobs" {
+  count        = var.async_jobs_enabled ? 1 : 0
+  name         = "aws-root-access-management-jobs"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "id"
+
+  attribute {
+    name = "id"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expiration"
+    enabled        = true
+  }
+
+  tags = var.tags
+}
+
+locals {
+  job_table_name = var.async_jobs_enabled ? aws_dynamodb_table.jobs[0].name : ""
+  job_policy_statements = {
+    for name in ["unlock_s3_bucket", "unlock_sqs_queue"] : name => var.async_jobs_enabled ? [
+      {
+        effect = "Allow"
+        actions = [
+          "dynamodb:GetItem",
+          "dynamodb:PutItem"
+        ]
+        resources = [
+          aws_dynamodb_table.jobs[0].arn
+        ]
+      },
+      {
+        effect = "Allow"
+        actions = [
+          "lambda:InvokeFunction"
+        ]
+        resources = [
+          "arn:aws:lambda:${data.aws_region.current.region}:${data.aws_caller_identity.current.account_id}:function:${name}",
+          "arn:aws:lambda:${data.aws_region.current.region}:${data.aws_caller_identity.current.account_id}:function:${name}:*"
+        ]
+      }
+    ] : []
+  }
+}
+
+# Optional SQS queues feeding unlock requests to the Lambda functions in batches,
+# so bursts of requests are absorbed instead of invoking the functions directly.
+# Messages that fail with a retryable error are redelivered and end up in the
+# dead-letter queue after maxReceiveCount attempts.
+resource "aws_sqs_queue" "unlock_requests_dlq" {
+  for_each                  = local.unlock_request_queues
+  name                      = "${each.key}-requests-dlq"
+  message_retention_seconds = 1209600
+
+  tags = var.tags
+}
+
+resource "aws_sqs_queue" "unlock_requests" {
+  for_each = local.unlock_request_queues
+  name     = "${each.key}-requests"
+  # AWS recommends at least six times the function timeout.
+  visibility_timeout_seconds = 180
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.unlock_requests_dlq[each.key].arn
+    maxReceiveCount     = 5
+  })
+
+  tags = var.tags
+}
+
+resource "aws_sqs_queue_policy" "unlock_requests" {
+  for_each  = local.unlock_request_queues
+  queue_url = aws_sqs_queue.unlock_requests[each.key].id
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Sid       = "AllowSendFromComplianceDashboard"
+        Effect    = "Allow"
+        Principal = { AWS = "arn:aws:iam::${var.compliance_dashboard_account_id}:role/${var.compliance_dashboard_role_name}" }
+        Action    = "sqs:SendMessage"
+        Resource  = aws_sqs_queue.unlock_requests[each.key].arn
+      }
+    ]
+  })
+}
+
+resource "aws_lambda_event_source_mapping" "unlock_requests" {
+  for_each                           = local.unlock_request_queues
+  event_source_arn                   = aws_sqs_queue.unlock_requests[each.key].arn
+  function_name                      = each.key == "unlock_s3_bucket" ? module.unlock_s3_bucket_lambda.lambda_function_name : module.unlock_sqs_queue_lambda.lambda_function_name
+  batch_size                         = var.unlock_request_batch_size
+  maximum_batching_window_in_seconds = var.unlock_request_batching_window_seconds
+  function_response_types            = ["ReportBatchItemFailures"]
+
+  lifecycle {
+    # Cross-variable validation needs Terraform 1.9; this module supports 1.5.7.
+    precondition {
+      condition     = var.unlock_request_batch_size <= 10 || var.unlock_request_batching_window_seconds > 0
+      error_message = "unlock_request_batch_size above 10 requires a non-zero unlock_request_batching_window_seconds."
+    }
+  }
+}
+
+locals {
+  unlock_request_queues = var.unlock_request_queues_enabled ? toset(["unlock_s3_bucket", "unlock_sqs_queue"]) : toset([])
+  unlock_request_queue_policy_statements = {
+    for name in ["unlock_s3_bucket", "unlock_sqs_queue"] : name => var.unlock_request_queues_enabled ? [
+      {
+        effect = "Allow"
+        actions = [
+          "sqs:ReceiveMessage",
+          "sqs:DeleteMessage",
+          "sqs:GetQueueAttributes"
+        ]
+        resources = [
+          aws_sqs_queue.unlock_requests[name].arn
+        ]
+      }
+    ] : []
+  }
+}
+
+# Layer shipping the infrastructure shared by both Lambda functions
+# (lambda_code/unlock_common_layer/python/unlock_common.py)
+data "archive_file" "unlock_common_layer" {
+  type        = "zip"
+  source_dir  = "${path.module}/lambda_code/unlock_common_layer"
+  output_path = "${path.root}/.terraform/tmp/unlock_common_layer.zip"
+}
+
+resource "aws_lambda_layer_version" "unlock_common" {
+  layer_name          = "unlock_common"
+  description         = "Infrastructure shared by the unlock Lambda functions"
+  filename            = data.archive_file.unlock_common_layer.output_path
+  source_code_hash    = data.archive_file.unlock_common_layer.output_base64sha256
+  compatible_runtimes = ["python3.12"]
+}
+
 module "unlock_s3_bucket_lambda" {
   source = "./modules/lambda"
 
@@ -24,20 +204,27 @@ module "unlock_s3_bucket_lambda" {
   runtime       = "python3.12"
   publish       = true
   timeout       = 30
+  tracing_mode  = "Active"
   source_path   = "${path.module}/lambda_code/unlock_s3_bucket_lambda"
 
   layers = [
-    "arn:aws:lambda:${data.aws_region.current.region}:017000801446:layer:AWSLambdaPowertoolsPythonV3-python312-x86_64:19"
+    "arn:aws:lambda:${data.aws_region.current.region}:017000801446:layer:AWSLambdaPowertoolsPythonV3-python312-x86_64:19",
+    aws_lambda_layer_version.unlock_common.arn
   ]
 
   environment_variables = {
-    POWERTOOLS_SERVICE_NAME          = "S3UnlockBucketPolicy"
-    POWERTOOLS_METRICS_FUNCTION_NAME = "S3UnlockBucketPolicy"
-    POWERTOOLS_LOG_LEVEL             = "INFO"
-    POWERTOOLS_METRICS_NAMESPACE     = "AWSRootAccessManagement"
-    ENVIRONMENT                      = var.environment
+    POWERTOOLS_SERVICE_NAME       = "S3UnlockBucketPolicy"
+    POWERTOOLS_LOG_LEVEL          = "INFO"
+    POWERTOOLS_METRICS_NAMESPACE  = "AWSRootAccessManagement"
+    ENVIRONMENT                   = var.environment
+    PROTECTED_BUCKETS             = join(",", var.protected_buckets)
+    PREWARM_CLIENTS               = "true"
+    IDEMPOTENCY_TABLE             = local.idempotency_table_name
+    JOB_TABLE                     = local.job_table_name
+    PROFILE_INVOCATIONS           = var.profile_invocations ? "true" : "false"
+    POWERTOOLS_LOGGER_SAMPLE_RATE = tostring(var.debug_log_sample_rate)
   }
-  policy_statements = [
+  policy_statements = concat([
     {
       effect = "Allow"
       actions = [
@@ -46,8 +233,17 @@ module "unlock_s3_bucket_lambda" {
       resources = [
         "*"
       ]
+    },
+    {
+      effect = "Allow"
+      actions = [
+        "organizations:ListAccounts"
+      ]
+      resources = [
+        "*"
+      ]
     }
-  ]
+  ], local.idempotency_policy_statements, local.job_policy_statements["unlock_s3_bucket"], local.unlock_request_queue_policy_statements["unlock_s3_bucket"])
   tags = var.tags
 }
 
@@ -60,20 +256,27 @@ module "unlock_sqs_queue_lambda" {
   runtime       = "python3.12"
   publish       = true
   timeout       = 30
+  tracing_mode  = "Active"
   source_path   = "${path.module}/lambda_code/unlock_sqs_queue_lambda"
 
   layers = [
-    "arn:aws:lambda:${data.aws_region.current.region}:017000801446:layer:AWSLambdaPowertoolsPythonV3-python312-x86_64:19"
+    "arn:aws:lambda:${data.aws_region.current.region}:017000801446:layer:AWSLambdaPowertoolsPythonV3-python312-x86_64:19",
+    aws_lambda_layer_version.unlock_common.arn
   ]
 
   environment_variables = {
-    POWERTOOLS_SERVICE_NAME          = "SQSUnlockQueuePolicy"
-    POWERTOOLS_METRICS_FUNCTION_NAME = "SQSUnlockQueuePolicy"
-    POWERTOOLS_LOG_LEVEL             = "INFO"
-    POWERTOOLS_METRICS_NAMESPACE     = "AWSRootAccessManagement"
-    ENVIRONMENT                      = var.environment
+    POWERTOOLS_SERVICE_NAME       = "SQSUnlockQueuePolicy"
+    POWERTOOLS_LOG_LEVEL          = "INFO"
+    POWERTOOLS_METRICS_NAMESPACE  = "AWSRootAccessManagement"
+    ENVIRONMENT                   = var.environment
+    PROTECTED_QUEUES              = join(",", var.protected_queues)
+    PREWARM_CLIENTS               = "true"
+    IDEMPOTENCY_TABLE             = local.idempotency_table_name
+    JOB_TABLE                     = local.job_table_name
+    PROFILE_INVOCATIONS           = var.profile_invocations ? "true" : "false"
+    POWERTOOLS_LOGGER_SAMPLE_RATE = tostring(var.debug_log_sample_rate)
   }
-  policy_statements = [
+  policy_statements = concat([
     {
       effect = "Allow"
       actions = [
@@ -83,6 +286,6 @@ module "unlock_sqs_queue_lambda" {
         "*"
       ]
     }
-  ]
+  ], local.idempotency_policy_statements, local.job_policy_statements["unlock_sqs_queue"], local.unlock_request_queue_policy_statements["unlock_sqs_queue"])
   tags = var.tags
 }
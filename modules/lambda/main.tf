@@ -26,6 +26,12 @@ resource "aws_iam_role_policy_attachment" "basic_execution" {
   policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole"
 }
 
+resource "aws_iam_role_policy_attachment" "xray" {
+  count      = var.tracing_mode == "Active" ? 1 : 0
+  role       = aws_iam_role.lambda.name
+  policy_arn = "arn:aws:iam::aws:policy/AWSXRayDaemonWriteAccess"
+}
+
 data "aws_iam_policy_document" "custom" {
   count = length(var.policy_statements) > 0 ? 1 : 0
 
@@ -64,6 +70,10 @@ resource "aws_lambda_function" "this" {
   source_code_hash = data.archive_file.lambda_zip.output_base64sha256
   layers           = var.layers
 
+  tracing_config {
+    mode = var.tracing_mode
+  }
+
   depends_on = [aws_cloudwatch_log_group.lambda]
 
   dynamic "environment" {
@@ -42,6 +42,12 @@ variable "layers" {
   default     = []
 }
 
+variable "tracing_mode" {
+  description = "X-Ray tracing mode for the Lambda function: PassThrough or Active"
+  type        = string
+  default     = "PassThrough"
+}
+
 variable "environment_variables" {
   description = "Map of environment variables to set on the Lambda function"
   type        = map(string)
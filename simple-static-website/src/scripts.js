@@ -1,10 +1,12 @@
 let apiBaseUrl = "";
+let asyncJobs = false;
 
 // Load config.json to get API base URL
 fetch("src/config.json")
   .then((response) => response.json())
   .then((config) => {
     apiBaseUrl = config.apiBaseUrl.replace(/\/$/, "");
+    asyncJobs = config.asyncJobs === true;
   })
   .catch((error) => {
     console.error(
@@ -41,6 +43,68 @@ function syntaxHighlight(json) {
   );
 }
 
+// When config.json sets asyncJobs, unlocks are started as asynchronous jobs
+// and polled until they finish, so no request is held open for the whole
+// unlock. Polling gives up after JOB_POLL_MAX_ATTEMPTS.
+const JOB_POLL_INTERVAL_MS = 1000;
+const JOB_POLL_MAX_ATTEMPTS = 300;
+
+function readJson(response) {
+  return response
+    .json()
+    .catch(() => ({}))
+    .then((data) => ({ ok: response.ok, data: data }));
+}
+
+function postJson(url, body) {
+  return fetch(url, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body),
+  }).then(readJson);
+}
+
+function pollJob(url, jobId, attempt = 1) {
+  return new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS))
+    .then(() => postJson(url, { action: "STATUS", job_id: jobId }))
+    .then(({ ok, data }) => {
+      if (ok && (data.status === "pending" || data.status === "running")) {
+        if (attempt >= JOB_POLL_MAX_ATTEMPTS) {
+          return {
+            ok: false,
+            data: {
+              status: "timeout",
+              job_id: jobId,
+              message: `Job ${jobId} is still running; check again later.`,
+            },
+          };
+        }
+        return pollJob(url, jobId, attempt + 1);
+      }
+      if (!ok || !data.results || !data.results.length) {
+        return { ok: false, data: data };
+      }
+      const result = data.results[0];
+      return { ok: result.statusCode < 400, data: result.body };
+    });
+}
+
+function failureMessage(prefix, data) {
+  return data && data.message ? `${prefix} ${data.message}` : prefix;
+}
+
+function postUnlock(url, body) {
+  if (!asyncJobs) {
+    return postJson(url, body);
+  }
+  return postJson(url, { ...body, async: true }).then(({ ok, data }) => {
+    if (ok && data.status === "accepted" && data.job_id) {
+      return pollJob(url, data.job_id);
+    }
+    return { ok: ok, data: data };
+  });
+}
+
 function getBucketPolicy() {
   showSpinner();
   const accountNumber = document.getElementById("s3accountNumber").value;
@@ -74,18 +138,26 @@ function deleteBucketPolicy() {
   showSpinner();
   const accountNumber = document.getElementById("s3accountNumber").value;
   const bucketName = document.getElementById("bucketName").value;
-  fetch(`${apiBaseUrl}/unlock-s3-bucket/${accountNumber}/${bucketName}`, {
-    method: "POST",
+  // Ask for the deleted policy in the same call so no separate GET is needed.
+  postUnlock(`${apiBaseUrl}/unlock-s3-bucket/${accountNumber}/${bucketName}`, {
+    return_policy: true,
   })
-    .then((response) => {
-      if (response.ok) {
+    .then(({ ok, data }) => {
+      const output = document
+        .getElementById("policyOutput")
+        .querySelector("code");
+      if (ok) {
         alert("Bucket policy deleted successfully.");
-        document.getElementById("policyOutput").textContent = "";
-        hideSpinner();
+        if (data.previous_policy) {
+          output.innerHTML = syntaxHighlight(data.previous_policy);
+        } else {
+          output.textContent = data.message || "";
+        }
       } else {
-        alert("Failed to delete bucket policy.");
-        hideSpinner();
+        alert(failureMessage("Failed to delete bucket policy.", data));
+        output.textContent = data.message || "";
       }
+      hideSpinner();
     })
     .catch((error) => {
       console.error("Error deleting bucket policy:", error);
@@ -126,16 +198,14 @@ function deleteSqsPolicy() {
   showSpinner();
   const accountNumber = document.getElementById("sqsAccountNumber").value;
   const queueName = document.getElementById("queueName").value;
-  fetch(`${apiBaseUrl}/unlock-sqs-queue/${accountNumber}/${queueName}`, {
-    method: "POST",
-  })
-    .then((response) => {
-      if (response.ok) {
+  postUnlock(`${apiBaseUrl}/unlock-sqs-queue/${accountNumber}/${queueName}`, {})
+    .then(({ ok, data }) => {
+      if (ok) {
         alert("Queue policy deleted successfully.");
         document.getElementById("sqsPolicyOutput").textContent = "";
         hideSpinner();
       } else {
-        alert("Failed to delete queue policy.");
+        alert(failureMessage("Failed to delete queue policy.", data));
         hideSpinner();
       }
     })
@@ -7,16 +7,27 @@ the ``tests/`` directory. It provides:
 * Python path setup so the Lambda modules can be imported without installing them.
 * Reusable constants (account IDs, bucket/queue names, fake credentials, sample policies).
 * Direct invocation event fixtures for both Lambda functions.
-* Mock AWS client fixtures (STS, S3, SQS) built with ``unittest.mock.MagicMock``.
+* Mock AWS client fixtures (STS, Organizations, S3, SQS, DynamoDB, Lambda) built with
+  ``unittest.mock.MagicMock``.
 * A composite ``mock_boto3_session`` fixture that routes ``session.client()`` calls
   to the appropriate mock client.
-* Module-scoped ``patch_*_boto3_session`` fixtures that patch ``boto3.Session`` inside
-  each Lambda module for the duration of a test.
+* Module-scoped ``patch_*_boto3_session`` fixtures that patch ``boto3.Session`` for
+  the Lambda modules for the duration of a test.
+* An ``aws_standin`` fixture running the local AWS stand-in server from
+  ``benchmarks/aws_standin.py`` for end-to-end tests over real HTTP.
+* A ``perf_benchmark`` fixture and ``--perf-*`` options for the ``perf``
+  suite, which compares hot-path timings against ``tests/perf_baseline.json``
+  scaled by the speed of the machine running the suite.
+* An autouse ``reset_lambda_caches`` fixture that clears the module-level caches
+  and shared clients kept by both Lambda modules and their shared module so
+  warm-container state never leaks between tests.
 """
 
+import gc
 import json
 import os
 import sys
+import time
 
 import pytest
 from unittest.mock import MagicMock, patch
@@ -27,12 +38,16 @@ from unittest.mock import MagicMock, patch
 _REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 _LAMBDA_CODE_DIR = os.path.join(_REPO_ROOT, "lambda_code")
 
+sys.path.insert(0, os.path.join(_LAMBDA_CODE_DIR, "unlock_common_layer", "python"))
 sys.path.insert(0, os.path.join(_LAMBDA_CODE_DIR, "unlock_s3_bucket_lambda"))
 sys.path.insert(0, os.path.join(_LAMBDA_CODE_DIR, "unlock_sqs_queue_lambda"))
+sys.path.insert(0, os.path.join(_REPO_ROOT, "benchmarks"))
 
 # Required by aws_lambda_powertools at module import time
 os.environ.setdefault("POWERTOOLS_SERVICE_NAME", "test-service")
 os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+# Keep the local job stores out of /tmp
+os.environ.setdefault("JOB_DB_PATH", ":memory:")
 
 # ---------------------------------------------------------------------------
 # Shared constants
@@ -121,10 +136,24 @@ def mock_sts_client():
     return client
 
 
+@pytest.fixture
+def mock_organizations_client():
+    """Mocked Organizations client whose ``list_accounts`` pages list ``ACCOUNT_ID``."""
+    client = MagicMock()
+    client.get_paginator.return_value.paginate.return_value = [
+        {"Accounts": [{"Id": ACCOUNT_ID, "Status": "ACTIVE"}]}
+    ]
+    return client
+
+
 @pytest.fixture
 def mock_s3_client():
-    """Mocked S3 client pre-configured with ``SAMPLE_S3_POLICY``."""
+    """Mocked S3 client in ``us-east-1`` pre-configured with ``SAMPLE_S3_POLICY``."""
     client = MagicMock()
+    client.meta.region_name = "us-east-1"
+    client.head_bucket.return_value = {
+        "ResponseMetadata": {"HTTPHeaders": {"x-amz-bucket-region": "us-east-1"}}
+    }
     client.get_bucket_policy.return_value = {"Policy": json.dumps(SAMPLE_S3_POLICY)}
     return client
 
@@ -133,6 +162,8 @@ def mock_s3_client():
 def mock_sqs_client():
     """Mocked SQS client pre-configured with ``SAMPLE_SQS_POLICY``."""
     client = MagicMock()
+    client.meta.region_name = "us-east-1"
+    client.meta.endpoint_url = "https://sqs.us-east-1.amazonaws.com"
     client.get_queue_url.return_value = {"QueueUrl": QUEUE_URL}
     client.get_queue_attributes.return_value = {
         "Attributes": {"Policy": json.dumps(SAMPLE_SQS_POLICY)}
@@ -140,13 +171,34 @@ def mock_sqs_client():
     return client
 
 
+@pytest.fixture
+def mock_dynamodb_client():
+    """Mocked DynamoDB client for the idempotency store; ``get_item`` finds nothing."""
+    client = MagicMock()
+    client.get_item.return_value = {}
+    return client
+
+
+@pytest.fixture
+def mock_lambda_client():
+    """Mocked Lambda client used to start asynchronous jobs."""
+    return MagicMock()
+
+
 # ---------------------------------------------------------------------------
 # Composite boto3 session fixture
 # ---------------------------------------------------------------------------
 
 
 @pytest.fixture
-def mock_boto3_session(mock_sts_client, mock_s3_client, mock_sqs_client):
+def mock_boto3_session(
+    mock_sts_client,
+    mock_organizations_client,
+    mock_s3_client,
+    mock_sqs_client,
+    mock_dynamodb_client,
+    mock_lambda_client,
+):
     """
     Mocked ``boto3.Session`` instance.
 
@@ -157,8 +209,11 @@ def mock_boto3_session(mock_sts_client, mock_s3_client, mock_sqs_client):
 
     _client_map = {
         "sts": mock_sts_client,
+        "organizations": mock_organizations_client,
         "s3": mock_s3_client,
         "sqs": mock_sqs_client,
+        "dynamodb": mock_dynamodb_client,
+        "lambda": mock_lambda_client,
     }
 
     def _client_factory(service, **kwargs):
@@ -176,20 +231,213 @@ def mock_boto3_session(mock_sts_client, mock_s3_client, mock_sqs_client):
 @pytest.fixture
 def patch_s3_boto3_session(mock_boto3_session):
     """
-    Patches ``boto3.Session`` inside the *unlock_s3_bucket* module for the
-    duration of the test.  Yields the ``mock_boto3_session`` so tests can
+    Patches ``boto3.Session`` for the *unlock_s3_bucket* tests (the session
+    is built by the shared *unlock_common* module) for the duration of the test.  Yields the ``mock_boto3_session`` so tests can
     assert on session-level calls if needed.
     """
-    with patch("unlock_s3_bucket.boto3.Session", return_value=mock_boto3_session):
+    with patch("unlock_common.boto3.Session", return_value=mock_boto3_session):
         yield mock_boto3_session
 
 
 @pytest.fixture
 def patch_sqs_boto3_session(mock_boto3_session):
     """
-    Patches ``boto3.Session`` inside the *unlock_sqs_queue* module for the
-    duration of the test.  Yields the ``mock_boto3_session`` so tests can
+    Patches ``boto3.Session`` for the *unlock_sqs_queue* tests (the session
+    is built by the shared *unlock_common* module) for the duration of the test.  Yields the ``mock_boto3_session`` so tests can
     assert on session-level calls if needed.
     """
-    with patch("unlock_sqs_queue.boto3.Session", return_value=mock_boto3_session):
+    with patch("unlock_common.boto3.Session", return_value=mock_boto3_session):
         yield mock_boto3_session
+
+
+# ---------------------------------------------------------------------------
+# Local AWS stand-in server
+# ---------------------------------------------------------------------------
+
+
+@pytest.fixture
+def aws_standin(monkeypatch):
+    """
+    Runs the local AWS stand-in server for the duration of the test, seeded
+    with ``SAMPLE_S3_POLICY`` on ``locked-bucket`` and ``SAMPLE_SQS_POLICY`` on
+    ``locked-queue`` (plus policy-less ``open-bucket`` / ``open-queue``) in
+    ``ACCOUNT_ID``.  Fake base credentials are set in the environment; point a
+    module at ``aws_standin.endpoint_url`` through its ``ENDPOINT_URL``.
+    """
+    import aws_standin as standin
+
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    monkeypatch.delenv("AWS_PROFILE", raising=False)
+    fixture = {
+        "accounts": {
+            ACCOUNT_ID: {
+                "buckets": {"locked-bucket": SAMPLE_S3_POLICY, "open-bucket": None},
+                "queues": {"locked-queue": SAMPLE_SQS_POLICY, "open-queue": None},
+            }
+        }
+    }
+    server = standin.start_server(fixture=fixture)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+# ---------------------------------------------------------------------------
+# Performance regression suite (``pytest -m perf``)
+# ---------------------------------------------------------------------------
+
+PERF_BASELINE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "perf_baseline.json"
+)
+
+# Baseline key of the calibration workload, timed on the machine that
+# recorded the baseline.  The baseline is scaled by how much slower or faster
+# the same workload runs now, so it holds on other machines too.
+PERF_CALIBRATION_KEY = "_calibration"
+
+# Timings measured in this session, in microseconds per call.
+_PERF_RESULTS = {}
+
+
+def _calibration_workload():
+    data = json.dumps({str(i): [i, str(i), {"n": i}] for i in range(50)})
+    return sorted(json.loads(data).items(), key=lambda item: item[1][0])
+
+
+def _perf_time(fn, number, repeat):
+    """Return the fastest of ``repeat`` rounds of ``number`` calls, in µs per call."""
+    rounds = []
+    # Like timeit: collections of pytest's own heap would dominate otherwise.
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            rounds.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return round(min(rounds) / number * 1e6, 3)
+
+
+def _perf_calibration():
+    """Time the calibration workload once per session, in µs per call."""
+    if PERF_CALIBRATION_KEY not in _PERF_RESULTS:
+        _calibration_workload()
+        _PERF_RESULTS[PERF_CALIBRATION_KEY] = _perf_time(
+            _calibration_workload, number=200, repeat=7
+        )
+    return _PERF_RESULTS[PERF_CALIBRATION_KEY]
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("perf", "performance regression suite")
+    group.addoption(
+        "--perf-baseline",
+        default=PERF_BASELINE_PATH,
+        help="JSON file of baseline timings in microseconds per call",
+    )
+    group.addoption(
+        "--perf-threshold",
+        type=float,
+        default=0.5,
+        help="fail when a timing exceeds its baseline by more than this fraction",
+    )
+    group.addoption(
+        "--perf-save",
+        action="store_true",
+        help="write the measured timings to the baseline file instead of comparing",
+    )
+
+
+def _load_perf_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    if not _PERF_RESULTS or not config.getoption("--perf-save"):
+        return
+    path = config.getoption("--perf-baseline")
+    baseline = _load_perf_baseline(path)
+    baseline.update(_PERF_RESULTS)
+    with open(path, "w") as f:
+        json.dump(dict(sorted(baseline.items())), f, indent=2)
+        f.write("\n")
+
+
+@pytest.fixture
+def perf_benchmark(request):
+    """
+    Times ``fn()`` and compares it with the stored baseline.
+
+    ``perf_benchmark(name, fn, number, repeat)`` calls ``fn`` ``number`` times
+    in each of ``repeat`` rounds, with garbage collection disabled, and keeps
+    the fastest round, which is the least disturbed by the rest of the
+    machine.  The baseline for ``name`` is first scaled by the calibration
+    workload's time here relative to its time in the baseline; the test fails
+    when the time per call exceeds the scaled baseline by more than
+    ``--perf-threshold``.  Names without a baseline are only recorded.
+    Returns the time per call in microseconds.
+    """
+    config = request.config
+    baseline = _load_perf_baseline(config.getoption("--perf-baseline"))
+    threshold = config.getoption("--perf-threshold")
+
+    def _measure(name, fn, number=1000, repeat=7):
+        calibration = _perf_calibration()
+        fn()  # warm-up: lazy imports, clients and caches
+        per_call_us = _perf_time(fn, number, repeat)
+        _PERF_RESULTS[name] = per_call_us
+        expected = baseline.get(name)
+        if expected and not config.getoption("--perf-save"):
+            scale = calibration / baseline.get(PERF_CALIBRATION_KEY, calibration)
+            limit = expected * scale * (1 + threshold)
+            assert per_call_us <= limit, (
+                f"{name} regressed: {per_call_us} µs per call, baseline {expected} µs "
+                f"x {scale:.2f} machine speed "
+                f"(+{per_call_us / (expected * scale) - 1:.0%}, "
+                f"threshold {threshold:.0%})"
+            )
+        return per_call_us
+
+    return _measure
+
+
+# ---------------------------------------------------------------------------
+# Module-level cache reset
+# ---------------------------------------------------------------------------
+
+
+@pytest.fixture(autouse=True)
+def reset_lambda_caches():
+    """
+    Clears the module-level caches of both Lambda modules and of the shared
+    ``unlock_common`` module before and after every test.  The caches
+    intentionally survive across warm invocations, so without this a test
+    could be served credentials cached by a previous one.
+    """
+    import unlock_common
+    import unlock_s3_bucket
+    import unlock_sqs_queue
+
+    def _reset():
+        unlock_common.CREDENTIALS_CACHE.clear()
+        unlock_common.IDEMPOTENCY_STORE.clear()
+        unlock_common.JOB_STORE.clear()
+        unlock_common.start_deadline(None)
+        unlock_common.reset_clients()
+        for module in (unlock_s3_bucket, unlock_sqs_queue):
+            module.DRY_RUN_SIMULATOR.reset()
+            module.POLICY_CACHE.clear()
+            module.NEGATIVE_CACHE.clear()
+        unlock_s3_bucket.BUCKET_REGION_CACHE.clear()
+        unlock_sqs_queue.QUEUE_URL_CACHE.clear()
+
+    _reset()
+    yield
+    _reset()
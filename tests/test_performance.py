@@ -0,0 +1,240 @@
+"""
+Performance regression suite for both unlock Lambda functions.
+
+Deselected by default; run with ``pytest -m perf``.  Every test times one hot
+path with the ``perf_benchmark`` fixture and fails when it is slower than its
+entry in ``tests/perf_baseline.json``, scaled to the speed of this machine,
+by more than ``--perf-threshold``.  After an intended change, refresh the
+baseline with ``pytest -m perf --perf-save``.
+
+Test classes
+------------
+* ``TestHandlerPerf``   – ``lambda_handler`` dispatch: mocked GET (uncached and cached), dry-run
+                          GET, invalid events
+* ``TestMatcherPerf``   – protected-name matching against a large rule set
+* ``TestResponsePerf``  – ``lambda_response`` and ``policy_response``
+* ``TestDryRunPerf``    – ``handle_dry_run_s3`` / ``handle_dry_run_sqs``
+"""
+
+import json
+import os
+from contextlib import ExitStack, redirect_stdout
+
+import pytest
+from unittest.mock import patch
+
+import unlock_s3_bucket as s3_lambda
+import unlock_sqs_queue as sqs_lambda
+import unlock_common as common
+from tests.conftest import (
+    ACCOUNT_ID,
+    BUCKET_NAME,
+    QUEUE_NAME,
+    SAMPLE_S3_POLICY,
+    SAMPLE_SQS_POLICY,
+)
+
+pytestmark = pytest.mark.perf
+
+SERVICES = {
+    "s3": {
+        "module": s3_lambda,
+        "name_key": "bucket_name",
+        "name": BUCKET_NAME,
+        "patch_fixture": "patch_s3_boto3_session",
+        "dry_run": s3_lambda.handle_dry_run_s3,
+        "is_protected": s3_lambda.is_protected_bucket,
+        "matcher": "PROTECTED_BUCKET_MATCHER",
+        "policy": SAMPLE_S3_POLICY,
+    },
+    "sqs": {
+        "module": sqs_lambda,
+        "name_key": "queue_name",
+        "name": QUEUE_NAME,
+        "patch_fixture": "patch_sqs_boto3_session",
+        "dry_run": sqs_lambda.handle_dry_run_sqs,
+        "is_protected": sqs_lambda.is_protected_queue,
+        "matcher": "PROTECTED_QUEUE_MATCHER",
+        "policy": SAMPLE_SQS_POLICY,
+    },
+}
+
+
+@pytest.fixture(params=sorted(SERVICES))
+def service(request):
+    return request.param, SERVICES[request.param]
+
+
+@pytest.fixture(autouse=True)
+def unlimited_rate():
+    """Time CPU cost, not the client-side rate limits of the governors."""
+    with ExitStack() as stack:
+        stack.enter_context(
+            patch.object(common, "STS_GOVERNOR", common.RateGovernor())
+        )
+        for module in (s3_lambda, sqs_lambda):
+            stack.enter_context(
+                patch.object(module, "SERVICE_GOVERNOR", common.RateGovernor())
+            )
+        yield
+
+
+@pytest.fixture(autouse=True)
+def discard_output():
+    """Serialize logs and EMF metrics as in Lambda, but write them to /dev/null.
+
+    pytest's output and log capture would otherwise dominate, and add noise
+    to, every handler timing.
+    """
+    with ExitStack() as stack:
+        devnull = stack.enter_context(open(os.devnull, "w"))
+        stack.enter_context(redirect_stdout(devnull))
+        logger = common.logger._logger
+        stack.enter_context(patch.object(logger, "propagate", False))
+        for handler in logger.handlers:
+            stack.enter_context(patch.object(handler, "stream", devnull))
+        yield
+
+
+def _event(spec, action, name=None):
+    return {
+        "account_id": ACCOUNT_ID,
+        spec["name_key"]: name or spec["name"],
+        "action": action,
+    }
+
+
+# ===========================================================================
+# TestHandlerPerf
+# ===========================================================================
+
+
+class TestHandlerPerf:
+    """Timings of ``lambda_handler`` dispatch."""
+
+    def test_mocked_get(self, request, service, perf_benchmark):
+        """Every call assumes root and reads the policy: no credential or policy cache."""
+        name, spec = service
+        request.getfixturevalue(spec["patch_fixture"])
+        module = spec["module"]
+        event = {**_event(spec, "GET"), "refresh": True}
+
+        def _uncached_get():
+            common.CREDENTIALS_CACHE.clear()
+            return module.lambda_handler(event, None)
+
+        with patch.object(module, "ENVIRONMENT", ""):
+            perf_benchmark(f"{name}.handler_mocked_get", _uncached_get, number=200)
+
+    def test_cached_get(self, request, service, perf_benchmark):
+        """Every call after the warm-up is answered from the policy cache."""
+        name, spec = service
+        request.getfixturevalue(spec["patch_fixture"])
+        event = _event(spec, "GET")
+        with patch.object(spec["module"], "ENVIRONMENT", ""):
+            perf_benchmark(
+                f"{name}.handler_cached_get",
+                lambda: spec["module"].lambda_handler(event, None),
+                number=200,
+            )
+
+    def test_dry_run_get(self, service, perf_benchmark):
+        name, spec = service
+        event = _event(spec, "GET", name=f"present-{spec['name']}")
+        with patch.object(spec["module"], "ENVIRONMENT", "development"):
+            perf_benchmark(
+                f"{name}.handler_dry_run_get",
+                lambda: spec["module"].lambda_handler(event, None),
+                number=200,
+            )
+
+    def test_invalid_event(self, service, perf_benchmark):
+        name, spec = service
+        event = {"action": "GET"}
+        perf_benchmark(
+            f"{name}.handler_invalid_event",
+            lambda: spec["module"].lambda_handler(event, None),
+            number=200,
+        )
+
+
+# ===========================================================================
+# TestMatcherPerf
+# ===========================================================================
+
+
+class TestMatcherPerf:
+    """Timings of protected-name matching with many rules."""
+
+    RULES = (
+        [f"exact-{i}" for i in range(100)]
+        + [f"team-{i}-*" for i in range(50)]
+        + [f"*-backup-{i}" for i in range(25)]
+        + [f"re:^archive-{i}-[0-9]+$" for i in range(25)]
+    )
+    NAMES = [
+        "exact-42",
+        "team-7-logs",
+        "data-backup-3",
+        "archive-9-2024",
+        "unprotected",
+    ]
+
+    def test_is_protected(self, service, perf_benchmark):
+        name, spec = service
+        matcher = spec["module"].ProtectedResourceMatcher(self.RULES)
+        is_protected = spec["is_protected"]
+
+        def _match_all():
+            for resource_name in self.NAMES:
+                is_protected(resource_name)
+
+        with patch.object(spec["module"], spec["matcher"], matcher):
+            assert [is_protected(n) for n in self.NAMES] == [True] * 4 + [False]
+            perf_benchmark(f"{name}.is_protected", _match_all, number=5000)
+
+
+# ===========================================================================
+# TestResponsePerf
+# ===========================================================================
+
+
+class TestResponsePerf:
+    """Timings of response building."""
+
+    def test_lambda_response(self, service, perf_benchmark):
+        name, spec = service
+        body = {"status": "unlocked", "account_id": ACCOUNT_ID}
+        perf_benchmark(
+            f"{name}.lambda_response",
+            lambda: spec["module"].lambda_response(200, body),
+            number=20000,
+        )
+
+    def test_policy_response(self, service, perf_benchmark):
+        name, spec = service
+        policy = json.dumps(spec["policy"])
+        perf_benchmark(
+            f"{name}.policy_response",
+            lambda: spec["module"].policy_response(ACCOUNT_ID, spec["name"], policy),
+            number=5000,
+        )
+
+
+# ===========================================================================
+# TestDryRunPerf
+# ===========================================================================
+
+
+class TestDryRunPerf:
+    """Timings of the dry-run handlers against the in-memory simulator."""
+
+    @pytest.mark.parametrize("action", ["GET", "POST"])
+    def test_handle_dry_run(self, service, action, perf_benchmark):
+        name, spec = service
+        resource_name = f"present-{spec['name']}"
+        perf_benchmark(
+            f"{name}.dry_run_{action.lower()}",
+            lambda: spec["dry_run"](ACCOUNT_ID, resource_name, action),
+            number=1000,
+        )
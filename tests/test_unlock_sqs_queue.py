@@ -6,17 +6,46 @@ Test classes
 * ``TestLambdaResponseSQS``   – helper function ``lambda_response``
 * ``TestGetBoto3SessionSQS``  – helper function ``get_boto3_session``
 * ``TestHandleDryRunSQS``     – dry-run simulation ``handle_dry_run_sqs``
+* ``TestDryRunSimulatorSQS``  – stateful dry-run backend: fixtures, latency, throttling and errors
 * ``TestAssumeRootSQS``       – STS root-assumption helper ``assume_root``
+* ``TestCredentialsCacheSQS`` – ``TTLCache`` and credential reuse in ``assume_root``
+* ``TestClientFactorySQS``    – shared session and pooled client helpers
+* ``TestProtectedResourceMatcherSQS`` – protection rules and ``is_protected_queue``
 * ``TestLambdaHandlerSQS``    – main ``lambda_handler`` entry point
+* ``TestPolicyCacheSQS``      – GET policy cache and invalidation on POST / SWEEP
+* ``TestNegativeCacheSQS``    – not-found / not-locked cache and ``refresh``
+* ``TestIdempotencySQS``      – single-flight and stored results for repeated requests
+* ``TestDeadlineSQS``         – invocation deadline, client timeouts and 504 responses
+* ``TestRateGovernorSQS``     – token buckets, AIMD concurrency, throttling retries and 429s
+* ``TestHandleBatchSQS``      – ``items`` batch mode ``handle_batch``
+* ``TestHandleSqsEventSQS``   – SQS event-source mode ``handle_sqs_event``
+* ``TestAsyncJobsSQS``        – async job mode: ``submit_job``, ``run_job`` and ``STATUS``
+* ``TestPolicyDeniesAllSQS``  – lock-out detector ``policy_denies_all``
+* ``TestHandleSweepSQS``      – account-wide ``SWEEP`` mode ``handle_sweep``
+* ``TestReadQueuePolicySQS``  – queue URL cache and ``read_queue_policy``
+* ``TestMetricsSQS``          – EMF latency, throttle and outcome metrics
+* ``TestTracingSQS``          – phase / fan-out spans, exporters and X-Ray subsegments
+* ``TestAwsStandInSQS``       – end-to-end over HTTP against ``benchmarks/aws_standin.py``
+* ``TestProfilingSQS``        – opt-in cProfile / sampling profiler around ``lambda_handler``
+* ``TestLoggingSQS``          – event summaries, capped policy logs, sampling and the log budget
 """
 
+import hashlib
+import io
 import json
 import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 
+import botocore.exceptions
 import pytest
 from unittest.mock import MagicMock, patch
 
 import unlock_sqs_queue as sqs_lambda
+import unlock_common as common
 from tests.conftest import (
     ACCOUNT_ID,
     FAKE_CREDENTIALS,
@@ -60,22 +89,22 @@ class TestGetBoto3SessionSQS:
     def test_returns_profile_session_when_local_test_is_set(self, monkeypatch):
         monkeypatch.setenv("LOCAL_TEST", "true")
         monkeypatch.delenv("AWS_SAM_LOCAL", raising=False)
-        with patch("unlock_sqs_queue.boto3.Session") as mock_session:
-            sqs_lambda.get_boto3_session()
-            mock_session.assert_called_once_with(profile_name=sqs_lambda.PROFILE_NAME)
+        with patch("unlock_common.boto3.Session") as mock_session:
+            common.get_boto3_session()
+            mock_session.assert_called_once_with(profile_name=common.PROFILE_NAME)
 
     def test_returns_profile_session_when_sam_local_is_set(self, monkeypatch):
         monkeypatch.setenv("AWS_SAM_LOCAL", "true")
         monkeypatch.delenv("LOCAL_TEST", raising=False)
-        with patch("unlock_sqs_queue.boto3.Session") as mock_session:
-            sqs_lambda.get_boto3_session()
-            mock_session.assert_called_once_with(profile_name=sqs_lambda.PROFILE_NAME)
+        with patch("unlock_common.boto3.Session") as mock_session:
+            common.get_boto3_session()
+            mock_session.assert_called_once_with(profile_name=common.PROFILE_NAME)
 
     def test_returns_plain_session_in_production(self, monkeypatch):
         monkeypatch.delenv("LOCAL_TEST", raising=False)
         monkeypatch.delenv("AWS_SAM_LOCAL", raising=False)
-        with patch("unlock_sqs_queue.boto3.Session") as mock_session:
-            sqs_lambda.get_boto3_session()
+        with patch("unlock_common.boto3.Session") as mock_session:
+            common.get_boto3_session()
             mock_session.assert_called_once_with()
 
 
@@ -116,6 +145,81 @@ class TestHandleDryRunSQS:
         assert response["body"]["resource_name"] == "present-queue"
 
 
+# ===========================================================================
+# TestDryRunSimulatorSQS
+# ===========================================================================
+
+
+class TestDryRunSimulatorSQS:
+    """Unit tests for the stateful dry-run backend ``DryRunSimulator``."""
+
+    @pytest.fixture
+    def fixture_path(self, tmp_path):
+        path = tmp_path / "dry_run.json"
+        path.write_text(
+            json.dumps(
+                {
+                    "accounts": {
+                        ACCOUNT_ID: {
+                            "queues": {"locked-queue": SAMPLE_SQS_POLICY, "open-queue": None}
+                        }
+                    }
+                }
+            )
+        )
+        return str(path)
+
+    def test_unlock_changes_state(self):
+        first = sqs_lambda.handle_dry_run_sqs(ACCOUNT_ID, "present-queue", "POST")
+        second = sqs_lambda.handle_dry_run_sqs(ACCOUNT_ID, "present-queue", "POST")
+        get = sqs_lambda.handle_dry_run_sqs(ACCOUNT_ID, "present-queue", "GET")
+        assert first["body"]["status"] == "unlocked"
+        assert second["body"]["status"] == "not_locked"
+        assert get["statusCode"] == 404
+
+    def test_fixture_seeds_accounts_and_policies(self, fixture_path):
+        with patch.object(sqs_lambda.DRY_RUN_SIMULATOR, "fixture_path", fixture_path):
+            locked = sqs_lambda.handle_dry_run_sqs(ACCOUNT_ID, "locked-queue", "GET")
+            opened = sqs_lambda.handle_dry_run_sqs(ACCOUNT_ID, "open-queue", "POST")
+            unknown = sqs_lambda.handle_dry_run_sqs(ACCOUNT_ID, "present-queue", "GET")
+            other_account = sqs_lambda.handle_dry_run_sqs("210987654321", "locked-queue", "GET")
+        assert locked["body"]["policy"] == SAMPLE_SQS_POLICY
+        assert opened["body"]["status"] == "not_locked"
+        assert unknown["statusCode"] == 404
+        assert other_account["statusCode"] == 404
+
+    def test_reset_restores_fixture(self, fixture_path):
+        with patch.object(sqs_lambda.DRY_RUN_SIMULATOR, "fixture_path", fixture_path):
+            sqs_lambda.handle_dry_run_sqs(ACCOUNT_ID, "locked-queue", "POST")
+            sqs_lambda.DRY_RUN_SIMULATOR.reset()
+            response = sqs_lambda.handle_dry_run_sqs(ACCOUNT_ID, "locked-queue", "POST")
+        assert response["body"]["status"] == "unlocked"
+
+    def test_injected_latency(self):
+        with patch.object(sqs_lambda.DRY_RUN_SIMULATOR, "latency_ms", 50):
+            start = time.monotonic()
+            sqs_lambda.handle_dry_run_sqs(ACCOUNT_ID, "present-queue", "GET")
+        assert time.monotonic() - start >= 0.05
+
+    def test_injected_throttling_is_retried_then_429(self):
+        operation = MagicMock(side_effect=sqs_lambda.DRY_RUN_SIMULATOR.get_policy)
+        with patch.object(sqs_lambda.DRY_RUN_SIMULATOR, "throttle_rate", 1.0), patch.object(
+            sqs_lambda.DRY_RUN_SIMULATOR, "get_policy", operation
+        ), patch.object(sqs_lambda.SERVICE_GOVERNOR, "base_delay_ms", 0):
+            response = sqs_lambda.handle_dry_run_sqs(ACCOUNT_ID, "present-queue", "GET")
+        assert response["statusCode"] == 429
+        assert operation.call_count == sqs_lambda.SERVICE_GOVERNOR.max_retries + 1
+
+    def test_injected_errors_return_500(self):
+        with patch.object(sqs_lambda.DRY_RUN_SIMULATOR, "error_rate", 1.0):
+            response = sqs_lambda.handle_dry_run_sqs(ACCOUNT_ID, "present-queue", "POST")
+        assert response["statusCode"] == 500
+        assert "InternalError" in response["body"]["message"]
+        assert sqs_lambda.handle_dry_run_sqs(ACCOUNT_ID, "present-queue", "POST")[
+            "body"
+        ]["status"] == "unlocked"
+
+
 # ===========================================================================
 # TestAssumeRootSQS
 # ===========================================================================
@@ -155,6 +259,229 @@ class TestAssumeRootSQS:
             sqs_lambda.assume_root(ACCOUNT_ID, "SQSUnlockQueuePolicy")
 
 
+# ===========================================================================
+# TestCredentialsCacheSQS
+# ===========================================================================
+
+
+class TestCredentialsCacheSQS:
+    """Unit tests for ``TTLCache`` and credential reuse in ``assume_root``."""
+
+    def test_second_call_reuses_cached_credentials(
+        self, patch_s3_boto3_session, mock_sts_client
+    ):
+        first = sqs_lambda.assume_root(ACCOUNT_ID, "SQSUnlockQueuePolicy")
+        second = sqs_lambda.assume_root(ACCOUNT_ID, "SQSUnlockQueuePolicy")
+        assert first == second == FAKE_CREDENTIALS
+        mock_sts_client.assume_root.assert_called_once()
+        assert common.CREDENTIALS_CACHE.hits == 1
+        assert common.CREDENTIALS_CACHE.misses == 1
+
+    def test_cache_is_keyed_by_account_and_policy(
+        self, patch_s3_boto3_session, mock_sts_client
+    ):
+        sqs_lambda.assume_root(ACCOUNT_ID, "SQSUnlockQueuePolicy")
+        sqs_lambda.assume_root(ACCOUNT_ID, "OtherPolicy")
+        sqs_lambda.assume_root("210987654321", "SQSUnlockQueuePolicy")
+        assert mock_sts_client.assume_root.call_count == 3
+
+    def test_credentials_close_to_expiration_are_not_cached(
+        self, patch_s3_boto3_session, mock_sts_client
+    ):
+        expiring = dict(
+            FAKE_CREDENTIALS,
+            Expiration=datetime.now(timezone.utc) + timedelta(seconds=30),
+        )
+        mock_sts_client.assume_root.return_value = {"Credentials": expiring}
+        sqs_lambda.assume_root(ACCOUNT_ID, "SQSUnlockQueuePolicy")
+        sqs_lambda.assume_root(ACCOUNT_ID, "SQSUnlockQueuePolicy")
+        assert mock_sts_client.assume_root.call_count == 2
+
+    def test_assume_root_locks_do_not_grow_with_accounts(
+        self, patch_sqs_boto3_session, mock_sts_client
+    ):
+        locks = common._assume_root_locks
+        governor = common.RateGovernor()
+        with patch.object(common, "STS_GOVERNOR", governor):
+            for i in range(3 * len(locks)):
+                sqs_lambda.assume_root(f"{i:012d}", "SQSUnlockQueuePolicy")
+        assert common._assume_root_locks is locks
+        assert len(locks) == max(common.CREDENTIALS_CACHE_SIZE, 1)
+
+    def test_expired_entry_is_a_miss(self):
+        cache = sqs_lambda.TTLCache(max_size=4)
+        cache.set("key", "value", ttl_seconds=10)
+        with patch("unlock_common.time.monotonic", return_value=1e12):
+            assert cache.get("key") is None
+        assert cache.misses == 1
+        assert len(cache) == 0
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = sqs_lambda.TTLCache(max_size=2, ttl_seconds=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.stats()["evictions"] == 1
+
+
+# ===========================================================================
+# TestClientFactorySQS
+# ===========================================================================
+
+
+class TestClientFactorySQS:
+    """Unit tests for the shared session / pooled client helpers."""
+
+    def test_sts_client_is_created_once(
+        self, patch_sqs_boto3_session, mock_sts_client
+    ):
+        assert common.get_sts_client() is common.get_sts_client()
+        sts_calls = [
+            c for c in patch_sqs_boto3_session.client.call_args_list if c.args == ("sts",)
+        ]
+        assert len(sts_calls) == 1
+        assert sts_calls[0].kwargs["config"] is common.get_client_config()
+
+    def test_base_session_is_created_once(self):
+        with patch("unlock_common.boto3.Session") as mock_session:
+            common.get_base_session()
+            common.get_base_session()
+        mock_session.assert_called_once()
+
+    def test_service_client_is_reused_for_same_credentials(
+        self, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        first = sqs_lambda.get_service_client("sqs", FAKE_CREDENTIALS)
+        second = sqs_lambda.get_service_client("sqs", FAKE_CREDENTIALS)
+        assert first is second is mock_sqs_client
+        patch_sqs_boto3_session.client.assert_called_once_with(
+            "sqs",
+            aws_access_key_id=FAKE_CREDENTIALS["AccessKeyId"],
+            aws_secret_access_key=FAKE_CREDENTIALS["SecretAccessKey"],
+            aws_session_token=FAKE_CREDENTIALS["SessionToken"],
+            region_name=None,
+            config=common.get_client_config(),
+        )
+
+    def test_new_credentials_get_a_new_client(self, patch_sqs_boto3_session):
+        other = dict(FAKE_CREDENTIALS, AccessKeyId="ASIAOTHEREXAMPLE")
+        sqs_lambda.get_service_client("sqs", FAKE_CREDENTIALS)
+        sqs_lambda.get_service_client("sqs", other)
+        assert patch_sqs_boto3_session.client.call_count == 2
+
+    def test_client_is_dropped_with_expiring_credentials(
+        self, patch_sqs_boto3_session
+    ):
+        expiring = dict(
+            FAKE_CREDENTIALS,
+            Expiration=datetime.now(timezone.utc) + timedelta(seconds=5),
+        )
+        sqs_lambda.get_service_client("sqs", expiring)
+        sqs_lambda.get_service_client("sqs", expiring)
+        assert patch_sqs_boto3_session.client.call_count == 2
+
+    def test_warm_invocations_reuse_clients(
+        self, sqs_get_event, patch_sqs_boto3_session, mock_sts_client
+    ):
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            sqs_lambda.lambda_handler(sqs_get_event, None)
+            sqs_lambda.lambda_handler(sqs_get_event, None)
+        mock_sts_client.assume_root.assert_called_once()
+        assert patch_sqs_boto3_session.client.call_count == 2  # sts + sqs
+
+    def test_prewarm_builds_shared_clients(self, patch_sqs_boto3_session):
+        sqs_lambda.prewarm("sqs")
+        services = [c.args[0] for c in patch_sqs_boto3_session.client.call_args_list]
+        assert services == ["sts", "sqs"]
+
+    def test_dry_run_does_not_import_boto3(self, sqs_get_event):
+        # Run in a fresh interpreter: this test process has boto3 loaded already.
+        code = (
+            "import sys, unlock_sqs_queue; "
+            "unlock_sqs_queue.lambda_handler(%r, None); "
+            "print('boto3' in sys.modules)" % (sqs_get_event,)
+        )
+        env = dict(os.environ, ENVIRONMENT="development", PYTHONPATH=os.pathsep.join(sys.path))
+        result = subprocess.run(
+            [sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True
+        )
+        assert result.stdout.strip().splitlines()[-1] == "False"
+
+
+# ===========================================================================
+# TestProtectedResourceMatcherSQS
+# ===========================================================================
+
+
+class TestProtectedResourceMatcherSQS:
+    """Unit tests for queue protection via ``PROTECTED_QUEUE_MATCHER``."""
+
+    @pytest.fixture
+    def protected(self):
+        matcher = sqs_lambda.ProtectedResourceMatcher(
+            ["billing-events", "prod-*", "*-dlq", r"re:^audit-\d+$"]
+        )
+        with patch.object(sqs_lambda, "PROTECTED_QUEUE_MATCHER", matcher):
+            yield matcher
+
+    def test_rules_are_matched(self, protected):
+        assert sqs_lambda.is_protected_queue("billing-events")
+        assert sqs_lambda.is_protected_queue("prod-orders")
+        assert sqs_lambda.is_protected_queue("orders-dlq")
+        assert sqs_lambda.is_protected_queue("audit-7")
+        assert not sqs_lambda.is_protected_queue("audit-x")
+        assert not sqs_lambda.is_protected_queue(QUEUE_NAME)
+
+    def test_regex_with_inline_flags_or_groups_is_kept_separate(self):
+        matcher = sqs_lambda.ProtectedResourceMatcher(
+            [
+                "re:(?i)prod-.*",
+                "re:(?P<env>dev)-a",
+                "re:(?P<env>qa)-b",
+                r"re:(x)\1-c",
+                r"re:^plain-\d+$",
+                "*-backup",
+            ]
+        )
+        assert len(matcher._separate) == 4
+        assert matcher.matches("PROD-data")
+        assert matcher.matches("dev-a")
+        assert matcher.matches("qa-b")
+        assert matcher.matches("xx-c")
+        assert matcher.matches("plain-12")
+        assert matcher.matches("db-backup")
+        assert not matcher.matches("staging-a")
+
+    def test_invalid_regex_rule_is_rejected(self):
+        with pytest.raises(ValueError, match=r"Invalid protection rule 're:\('"):
+            sqs_lambda.ProtectedResourceMatcher(["re:("])
+
+    def test_no_queues_are_protected_by_default(self):
+        assert not sqs_lambda.is_protected_queue(QUEUE_NAME)
+
+    def test_protected_queue_returns_403(self, protected):
+        event = {"account_id": ACCOUNT_ID, "queue_name": "prod-orders"}
+        response = sqs_lambda.lambda_handler(event, None)
+        assert response["statusCode"] == 403
+        assert "protected" in response["body"]["message"]
+
+    def test_sweep_does_not_unlock_protected_queues(
+        self, protected, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        url = f"https://sqs.us-east-1.amazonaws.com/{ACCOUNT_ID}/orders-dlq"
+        mock_sqs_client.get_paginator.return_value.paginate.return_value = [
+            {"QueueUrls": [url]}
+        ]
+        event = {"action": "SWEEP", "account_id": ACCOUNT_ID, "unlock": True}
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            response = sqs_lambda.lambda_handler(event, None)
+        assert response["body"]["locked_queues"][0]["status"] == "protected"
+        mock_sqs_client.set_queue_attributes.assert_not_called()
+
+
 # ===========================================================================
 # TestLambdaHandlerSQS
 # ===========================================================================
@@ -204,7 +531,9 @@ class TestLambdaHandlerSQS:
     def test_queue_not_found_returns_404(
         self, sqs_get_event, patch_sqs_boto3_session, mock_sqs_client
     ):
-        mock_sqs_client.get_queue_url.side_effect = Exception("Queue does not exist")
+        mock_sqs_client.get_queue_url.side_effect = botocore.exceptions.ClientError(
+            {"Error": {"Code": "QueueDoesNotExist", "Message": "x"}}, "GetQueueUrl"
+        )
         with patch.object(sqs_lambda, "ENVIRONMENT", ""):
             response = sqs_lambda.lambda_handler(sqs_get_event, None)
         assert response["statusCode"] == 404
@@ -287,3 +616,1688 @@ class TestLambdaHandlerSQS:
             response = sqs_lambda.lambda_handler(sqs_post_event, None)
         assert response["statusCode"] == 500
         assert response["body"]["status"] == "error"
+
+
+# ===========================================================================
+# TestPolicyCacheSQS
+# ===========================================================================
+
+
+class TestPolicyCacheSQS:
+    """Unit tests for the GET policy cache and its invalidation on POST."""
+
+    def test_repeated_get_is_served_from_cache(
+        self, sqs_get_event, patch_sqs_boto3_session, mock_sts_client, mock_sqs_client
+    ):
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            first = sqs_lambda.lambda_handler(sqs_get_event, None)
+            second = sqs_lambda.lambda_handler(sqs_get_event, None)
+        assert first["body"]["cached"] is False
+        assert second["body"]["cached"] is True
+        assert second["body"]["policy"] == SAMPLE_SQS_POLICY
+        mock_sqs_client.get_queue_attributes.assert_called_once()
+        mock_sts_client.assume_root.assert_called_once()
+
+    def test_post_invalidates_cached_policy(
+        self, sqs_get_event, sqs_post_event, patch_sqs_boto3_session
+    ):
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            sqs_lambda.lambda_handler(sqs_get_event, None)
+            sqs_lambda.lambda_handler(sqs_post_event, None)
+        assert sqs_lambda.POLICY_CACHE.peek((ACCOUNT_ID, QUEUE_NAME)) is None
+
+    def test_failed_post_keeps_cached_policy(
+        self, sqs_get_event, sqs_post_event, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        mock_sqs_client.set_queue_attributes.side_effect = Exception("boom")
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            sqs_lambda.lambda_handler(sqs_get_event, None)
+            sqs_lambda.lambda_handler(sqs_post_event, None)
+        assert sqs_lambda.POLICY_CACHE.peek((ACCOUNT_ID, QUEUE_NAME)) is not None
+
+    def test_missing_policy_is_not_cached(
+        self, sqs_get_event, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        mock_sqs_client.get_queue_attributes.return_value = {"Attributes": {}}
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            sqs_lambda.lambda_handler(sqs_get_event, None)
+        assert len(sqs_lambda.POLICY_CACHE) == 0
+
+    def test_sweep_unlock_invalidates_cached_policy(
+        self, sqs_get_event, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        mock_sqs_client.get_paginator.return_value.paginate.return_value = [
+            {"QueueUrls": [QUEUE_URL]}
+        ]
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            sqs_lambda.lambda_handler(sqs_get_event, None)
+            sqs_lambda.lambda_handler(
+                {"action": "SWEEP", "account_id": ACCOUNT_ID, "unlock": True}, None
+            )
+        assert sqs_lambda.POLICY_CACHE.peek((ACCOUNT_ID, QUEUE_NAME)) is None
+
+    def test_cached_policy_expires(self, sqs_get_event, patch_sqs_boto3_session, mock_sqs_client):
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            sqs_lambda.lambda_handler(sqs_get_event, None)
+            with patch("unlock_common.time.monotonic", return_value=1e12):
+                response = sqs_lambda.lambda_handler(sqs_get_event, None)
+        assert response["body"]["cached"] is False
+        assert mock_sqs_client.get_queue_attributes.call_count == 2
+
+
+# ===========================================================================
+# TestNegativeCacheSQS
+# ===========================================================================
+
+
+class TestNegativeCacheSQS:
+    """Unit tests for the not-found / not-locked cache and ``refresh`` bypass."""
+
+    NO_POLICY = {"Attributes": {}}
+
+    def test_repeated_not_found_is_served_from_cache(
+        self, sqs_get_event, patch_sqs_boto3_session, mock_sts_client, mock_sqs_client
+    ):
+        mock_sqs_client.get_queue_attributes.return_value = self.NO_POLICY
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            first = sqs_lambda.lambda_handler(sqs_get_event, None)
+            second = sqs_lambda.lambda_handler(sqs_get_event, None)
+        assert first["statusCode"] == second["statusCode"] == 404
+        assert "cached" not in first["body"]
+        assert second["body"]["cached"] is True
+        mock_sts_client.assume_root.assert_called_once()
+
+    def test_repeated_not_locked_is_served_from_cache(
+        self, sqs_post_event, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        mock_sqs_client.get_queue_attributes.return_value = self.NO_POLICY
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            sqs_lambda.lambda_handler(sqs_post_event, None)
+            response = sqs_lambda.lambda_handler(sqs_post_event, None)
+        assert response["body"]["status"] == "not_locked"
+        assert response["body"]["cached"] is True
+        assert "idempotent_replay" not in response["body"]
+
+    def test_refresh_bypasses_negative_cache(
+        self, sqs_get_event, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        policy = mock_sqs_client.get_queue_attributes.return_value
+        mock_sqs_client.get_queue_attributes.return_value = self.NO_POLICY
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            sqs_lambda.lambda_handler(sqs_get_event, None)
+            mock_sqs_client.get_queue_attributes.return_value = policy
+            response = sqs_lambda.lambda_handler(dict(sqs_get_event, refresh=True), None)
+        assert response["statusCode"] == 200
+        assert mock_sqs_client.get_queue_attributes.call_count == 2
+
+    def test_refresh_skips_stored_post_result(
+        self, sqs_post_event, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            sqs_lambda.lambda_handler(sqs_post_event, None)
+            response = sqs_lambda.lambda_handler(dict(sqs_post_event, refresh=True), None)
+        assert "idempotent_replay" not in response["body"]
+        assert mock_sqs_client.set_queue_attributes.call_count == 2
+
+    def test_found_policy_clears_negative_entries(
+        self, sqs_get_event, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        policy = mock_sqs_client.get_queue_attributes.return_value
+        mock_sqs_client.get_queue_attributes.return_value = self.NO_POLICY
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            sqs_lambda.lambda_handler(sqs_get_event, None)
+            mock_sqs_client.get_queue_attributes.return_value = policy
+            sqs_lambda.lambda_handler(dict(sqs_get_event, refresh=True), None)
+        assert len(sqs_lambda.NEGATIVE_CACHE) == 0
+
+    def test_negative_entry_expires(
+        self, sqs_get_event, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        mock_sqs_client.get_queue_attributes.return_value = self.NO_POLICY
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            sqs_lambda.lambda_handler(sqs_get_event, None)
+            with patch("unlock_common.time.monotonic", return_value=1e12):
+                response = sqs_lambda.lambda_handler(sqs_get_event, None)
+        assert "cached" not in response["body"]
+        assert mock_sqs_client.get_queue_attributes.call_count == 2
+
+    def test_missing_queue_is_cached(
+        self, sqs_post_event, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        mock_sqs_client.get_queue_url.side_effect = botocore.exceptions.ClientError(
+            {"Error": {"Code": "AWS.SimpleQueueService.NonExistentQueue", "Message": "x"}},
+            "GetQueueUrl",
+        )
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            sqs_lambda.lambda_handler(sqs_post_event, None)
+            response = sqs_lambda.lambda_handler(sqs_post_event, None)
+        assert response["statusCode"] == 404
+        assert response["body"]["cached"] is True
+        mock_sqs_client.get_queue_url.assert_called_once()
+
+
+# ===========================================================================
+# TestIdempotencySQS
+# ===========================================================================
+
+
+class TestIdempotencySQS:
+    """Unit tests for single-flight and stored results of repeated requests."""
+
+    def test_repeated_post_is_replayed(
+        self, sqs_post_event, patch_sqs_boto3_session, mock_sts_client, mock_sqs_client
+    ):
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            first = sqs_lambda.lambda_handler(sqs_post_event, None)
+            second = sqs_lambda.lambda_handler(sqs_post_event, None)
+        assert first["body"]["status"] == second["body"]["status"] == "unlocked"
+        assert "idempotent_replay" not in first["body"]
+        assert second["body"]["idempotent_replay"] is True
+        mock_sqs_client.set_queue_attributes.assert_called_once()
+        mock_sts_client.assume_root.assert_called_once()
+
+    def test_get_is_not_stored(self, sqs_get_event, patch_sqs_boto3_session, mock_sqs_client):
+        # Bypass the GET policy cache so both requests reach the service.
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""), patch.object(
+            sqs_lambda, "POLICY_CACHE", sqs_lambda.TTLCache(0)
+        ):
+            sqs_lambda.lambda_handler(sqs_get_event, None)
+            sqs_lambda.lambda_handler(sqs_get_event, None)
+        assert mock_sqs_client.get_queue_attributes.call_count == 2
+
+    def test_server_errors_are_retried(
+        self, sqs_post_event, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        mock_sqs_client.set_queue_attributes.side_effect = [Exception("boom"), None]
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            first = sqs_lambda.lambda_handler(sqs_post_event, None)
+            second = sqs_lambda.lambda_handler(sqs_post_event, None)
+        assert first["statusCode"] == 500
+        assert second["statusCode"] == 200
+        assert "idempotent_replay" not in second["body"]
+
+    def test_zero_ttl_disables_stored_results(
+        self, sqs_post_event, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""), patch.object(
+            common, "IDEMPOTENCY_TTL_SECONDS", 0
+        ):
+            sqs_lambda.lambda_handler(sqs_post_event, None)
+            sqs_lambda.lambda_handler(sqs_post_event, None)
+        assert mock_sqs_client.set_queue_attributes.call_count == 2
+
+    def test_store_failure_does_not_fail_request(self, sqs_post_event, patch_sqs_boto3_session):
+        store = MagicMock()
+        store.get.side_effect = Exception("table missing")
+        store.put.side_effect = Exception("table missing")
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""), patch.object(
+            common, "IDEMPOTENCY_STORE", store
+        ):
+            response = sqs_lambda.lambda_handler(sqs_post_event, None)
+        assert response["statusCode"] == 200
+
+    def test_concurrent_calls_share_one_execution(self):
+        flight = common.SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {"statusCode": 200}
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do("k", slow)))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=lambda: results.append(flight.do("k", slow)))
+        follower.start()
+        # Release the leader only once the follower is waiting on its result.
+        future = flight._calls["k"]
+        for _ in range(500):
+            if future._condition._waiters:
+                break
+            threading.Event().wait(0.01)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+        assert len(calls) == 1
+        assert sorted(shared for _, shared in results) == [False, True]
+
+    def test_dynamodb_store_round_trip(self, patch_sqs_boto3_session, mock_dynamodb_client):
+        store = common.DynamoDBIdempotencyStore("idempotency")
+        store.put("key", '{"statusCode": 200}', 60)
+        item = mock_dynamodb_client.put_item.call_args.kwargs["Item"]
+        assert mock_dynamodb_client.put_item.call_args.kwargs["TableName"] == "idempotency"
+        mock_dynamodb_client.get_item.return_value = {"Item": item}
+        assert store.get("key") == '{"statusCode": 200}'
+
+    def test_dynamodb_store_ignores_expired_items(
+        self, patch_sqs_boto3_session, mock_dynamodb_client
+    ):
+        mock_dynamodb_client.get_item.return_value = {
+            "Item": {"id": {"S": "key"}, "data": {"S": "{}"}, "expiration": {"N": "1"}}
+        }
+        assert common.DynamoDBIdempotencyStore("idempotency").get("key") is None
+
+
+# ===========================================================================
+# TestDeadlineSQS
+# ===========================================================================
+
+
+def _context(remaining_ms):
+    context = MagicMock()
+    context.get_remaining_time_in_millis.return_value = remaining_ms
+    return context
+
+
+class TestDeadlineSQS:
+    """Unit tests for the invocation deadline taken from the Lambda context."""
+
+    def test_remaining_seconds_keeps_the_margin(self):
+        common.start_deadline(_context(common.DEADLINE_MARGIN_MS + 5000))
+        assert 4 < common.remaining_seconds() <= 5
+
+    def test_no_context_means_no_deadline(self):
+        common.start_deadline(None)
+        assert common.remaining_seconds() is None
+        common.check_deadline()
+
+    def test_check_deadline_raises_once_expired(self):
+        common.start_deadline(_context(0))
+        with pytest.raises(sqs_lambda.DeadlineExceeded):
+            common.check_deadline()
+
+    def test_client_config_does_not_depend_on_the_first_deadline(self):
+        common.start_deadline(_context(common.DEADLINE_MARGIN_MS + 2000))
+        config = common.get_client_config()
+        assert config.read_timeout == common.CLIENT_CONFIG_OPTIONS["read_timeout"]
+        assert config.connect_timeout == common.CLIENT_CONFIG_OPTIONS["connect_timeout"]
+
+    def test_read_timeout_is_capped_per_request(self):
+        request = MagicMock(context={})
+        common.check_deadline(request=request)
+        assert request.context == {}
+        common.start_deadline(_context(common.DEADLINE_MARGIN_MS + 3000))
+        common.check_deadline(request=request)
+        assert 2 < request.context["read_timeout"] <= 3
+
+    def test_abandoned_worker_keeps_its_own_deadline(self):
+        released = threading.Event()
+        finished = threading.Event()
+        sent = []
+
+        def _late_request():
+            released.wait(5)
+            try:
+                common.check_deadline()
+                sent.append(True)
+            except sqs_lambda.DeadlineExceeded:
+                sent.append(False)
+            finished.set()
+
+        common.start_deadline(_context(common.DEADLINE_MARGIN_MS + 50))
+        assert common.run_before_deadline(_late_request) is None
+        # The next invocation starts with a fresh deadline.
+        common.start_deadline(_context(60000))
+        released.set()
+        assert finished.wait(5)
+        assert sent == [False]
+        assert common.remaining_seconds() > 50
+
+    def test_client_timeouts_default_without_deadline(self):
+        config = common.get_client_config()
+        assert config.read_timeout == common.CLIENT_CONFIG_OPTIONS["read_timeout"]
+
+    def test_session_registers_the_deadline_hook(self, patch_sqs_boto3_session):
+        common.get_base_session()
+        patch_sqs_boto3_session.events.register.assert_called_once_with(
+            "before-send", common.check_deadline
+        )
+
+    def test_real_client_does_not_send_after_deadline(self):
+        session = common.boto3.Session(
+            aws_access_key_id="a", aws_secret_access_key="b", region_name="us-east-1"
+        )
+        with patch.object(common, "get_boto3_session", return_value=session):
+            client = sqs_lambda.get_service_client("sqs", FAKE_CREDENTIALS)
+            common.start_deadline(_context(0))
+            with pytest.raises(sqs_lambda.DeadlineExceeded):
+                client.get_queue_url(QueueName=QUEUE_NAME)
+
+    def test_deadline_during_unlock_returns_timeout(
+        self, sqs_post_event, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        mock_sqs_client.set_queue_attributes.side_effect = sqs_lambda.DeadlineExceeded(
+            "late"
+        )
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            response = sqs_lambda.lambda_handler(sqs_post_event, None)
+        assert response["statusCode"] == 504
+        assert response["body"]["status"] == "timeout"
+        assert response["body"]["resource_name"] == QUEUE_NAME
+
+    def test_hanging_request_is_answered_at_deadline(self, sqs_post_event):
+        released = threading.Event()
+
+        def _hanging_unlock(*args, **kwargs):
+            released.wait(5)
+            return sqs_lambda.lambda_response(200, {"status": "unlocked"})
+
+        context = _context(common.DEADLINE_MARGIN_MS + 50)
+        with patch.object(sqs_lambda, "unlock_queue", side_effect=_hanging_unlock):
+            response = sqs_lambda.lambda_handler(sqs_post_event, context)
+        released.set()
+        assert response["statusCode"] == 504
+        assert response["body"]["status"] == "timeout"
+
+    def test_request_within_deadline_returns_its_result(
+        self, sqs_get_event, patch_sqs_boto3_session
+    ):
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            response = sqs_lambda.lambda_handler(sqs_get_event, _context(30000))
+        assert response["statusCode"] == 200
+        assert response["body"]["policy"] == SAMPLE_SQS_POLICY
+
+
+
+    def test_deadline_is_not_reported_as_missing_queue(
+        self, sqs_get_event, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        mock_sqs_client.get_queue_url.side_effect = sqs_lambda.DeadlineExceeded("late")
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            response = sqs_lambda.lambda_handler(sqs_get_event, None)
+        assert response["statusCode"] == 504
+        assert len(sqs_lambda.NEGATIVE_CACHE) == 0
+
+
+# ===========================================================================
+# TestRateGovernorSQS
+# ===========================================================================
+
+
+def _throttling_error(operation="AssumeRoot"):
+    return botocore.exceptions.ClientError(
+        {"Error": {"Code": "Throttling", "Message": "Rate exceeded"}}, operation
+    )
+
+
+class TestRateGovernorSQS:
+    """Unit tests for ``TokenBucket``, ``AdaptiveConcurrencyLimit`` and ``RateGovernor``."""
+
+    def test_token_bucket_allows_one_second_of_burst(self):
+        bucket = common.TokenBucket(5)
+        assert [bucket.take() for _ in range(5)] == [0.0] * 5
+        assert bucket.take() > 0
+
+    def test_token_bucket_refills_over_time(self):
+        with patch("unlock_common.time.monotonic", return_value=100.0):
+            bucket = common.TokenBucket(2)
+            bucket.take(), bucket.take()
+        with patch("unlock_common.time.monotonic", return_value=100.5):
+            assert bucket.take() == 0.0
+            assert bucket.take() == pytest.approx(0.5)
+
+    def test_zero_rate_disables_the_bucket(self):
+        bucket = common.TokenBucket(0)
+        assert all(bucket.take() == 0.0 for _ in range(100))
+
+    def test_concurrency_limit_is_halved_on_throttling(self):
+        limit = common.AdaptiveConcurrencyLimit(16)
+        limit.acquire()
+        limit.release(throttled=True)
+        assert limit.limit == 8
+        limit.acquire()
+        limit.release()
+        assert 8 < limit.limit < 9
+
+    def test_concurrency_limit_blocks_when_full(self):
+        limit = common.AdaptiveConcurrencyLimit(1)
+        assert limit.acquire()
+        assert not limit.acquire(timeout=0.01)
+
+    def test_throttled_calls_are_retried(self):
+        governor = common.RateGovernor(base_delay_ms=0)
+        fn = MagicMock(side_effect=[_throttling_error(), _throttling_error(), "ok"])
+        assert governor.call(ACCOUNT_ID, fn, Key="value") == "ok"
+        assert fn.call_count == 3
+        fn.assert_called_with(Key="value")
+        assert governor.concurrency.limit < common.GOVERNOR_MAX_CONCURRENCY
+
+    def test_other_errors_are_not_retried(self):
+        governor = common.RateGovernor(base_delay_ms=0)
+        fn = MagicMock(side_effect=ValueError("boom"))
+        with pytest.raises(ValueError):
+            governor.call(ACCOUNT_ID, fn)
+        fn.assert_called_once()
+
+    @pytest.mark.parametrize(
+        "error",
+        [
+            botocore.exceptions.ClientError(
+                {"Error": {"Code": "InternalError", "Message": "x"}}, "Op"
+            ),
+            botocore.exceptions.EndpointConnectionError(endpoint_url="https://x"),
+        ],
+    )
+    def test_transient_errors_are_retried_without_shrinking_the_limit(self, error):
+        governor = common.RateGovernor(base_delay_ms=0)
+        fn = MagicMock(side_effect=[error, "ok"])
+        assert governor.call(ACCOUNT_ID, fn) == "ok"
+        assert fn.call_count == 2
+        assert governor.concurrency.limit == governor.max_concurrency
+
+    def test_governed_clients_leave_retries_to_the_governor(self):
+        governed = common.get_client_config()
+        ungoverned = common.get_client_config(retries=True)
+        assert governed.retries["total_max_attempts"] == 1
+        assert ungoverned.retries == common.CLIENT_CONFIG_OPTIONS["retries"]
+        assert common.get_client_config() is governed
+
+    def test_gives_up_after_max_retries(self):
+        governor = common.RateGovernor(max_retries=2, base_delay_ms=0)
+        fn = MagicMock(side_effect=_throttling_error())
+        with pytest.raises(botocore.exceptions.ClientError):
+            governor.call(ACCOUNT_ID, fn)
+        assert fn.call_count == 3
+
+    def test_rate_limit_wait_stops_at_deadline(self):
+        governor = common.RateGovernor(account_rate=1)
+        governor.call(ACCOUNT_ID, MagicMock())
+        context = MagicMock()
+        context.get_remaining_time_in_millis.return_value = common.DEADLINE_MARGIN_MS
+        common.start_deadline(context)
+        with pytest.raises(sqs_lambda.DeadlineExceeded):
+            governor.call(ACCOUNT_ID, MagicMock())
+        governor.call("210987654321", MagicMock())
+
+    def test_throttled_assume_root_returns_429(
+        self, sqs_get_event, patch_sqs_boto3_session, mock_sts_client
+    ):
+        mock_sts_client.assume_root.side_effect = _throttling_error()
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""), patch.object(
+            common.STS_GOVERNOR, "base_delay_ms", 0
+        ):
+            response = sqs_lambda.lambda_handler(sqs_get_event, None)
+        assert response["statusCode"] == 429
+        assert response["body"]["status"] == "throttled"
+        assert mock_sts_client.assume_root.call_count == common.GOVERNOR_MAX_RETRIES + 1
+
+    def test_throttled_post_is_not_stored(
+        self, sqs_post_event, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        mock_sqs_client.set_queue_attributes.side_effect = _throttling_error(
+            "SetQueueAttributes"
+        )
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""), patch.object(
+            sqs_lambda.SERVICE_GOVERNOR, "base_delay_ms", 0
+        ):
+            first = sqs_lambda.lambda_handler(sqs_post_event, None)
+            mock_sqs_client.set_queue_attributes.side_effect = None
+            second = sqs_lambda.lambda_handler(sqs_post_event, None)
+        assert first["statusCode"] == 429
+        assert second["body"]["status"] == "unlocked"
+
+
+
+    def test_throttled_get_queue_url_is_not_reported_as_missing(
+        self, sqs_get_event, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        mock_sqs_client.get_queue_url.side_effect = _throttling_error("GetQueueUrl")
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""), patch.object(
+            sqs_lambda.SERVICE_GOVERNOR, "base_delay_ms", 0
+        ):
+            response = sqs_lambda.lambda_handler(sqs_get_event, None)
+        assert response["statusCode"] == 429
+        assert len(sqs_lambda.NEGATIVE_CACHE) == 0
+
+
+# ===========================================================================
+# TestHandleBatchSQS
+# ===========================================================================
+
+
+class TestHandleBatchSQS:
+    """Unit tests for the ``items`` batch mode of the SQS unlock Lambda."""
+
+    def test_batch_reports_result_per_item_in_order(
+        self, patch_s3_boto3_session, mock_sqs_client
+    ):
+        event = {
+            "items": [
+                {"account_id": ACCOUNT_ID, "queue_name": "queue-a"},
+                {"account_id": ACCOUNT_ID, "queue_name": "queue-b"},
+            ]
+        }
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            response = sqs_lambda.lambda_handler(event, None)
+        assert response["statusCode"] == 200
+        body = response["body"]
+        assert body["status"] == "success"
+        assert body["succeeded"] == 2
+        assert [r["queue_name"] for r in body["results"]] == ["queue-a", "queue-b"]
+        assert all(r["body"]["status"] == "unlocked" for r in body["results"])
+        assert mock_sqs_client.set_queue_attributes.call_count == 2
+
+    def test_credentials_are_shared_per_account(
+        self, patch_s3_boto3_session, mock_sts_client
+    ):
+        event = {
+            "action": "GET",
+            "items": [
+                {"account_id": ACCOUNT_ID, "queue_name": f"queue-{i}"}
+                for i in range(10)
+            ],
+        }
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            sqs_lambda.lambda_handler(event, None)
+        mock_sts_client.assume_root.assert_called_once()
+
+    def test_failed_items_make_batch_partial(self, patch_s3_boto3_session):
+        event = {
+            "items": [
+                {"account_id": ACCOUNT_ID, "queue_name": QUEUE_NAME},
+                {"account_id": ACCOUNT_ID},
+                "not-an-object",
+            ]
+        }
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            response = sqs_lambda.lambda_handler(event, None)
+        body = response["body"]
+        assert response["statusCode"] == 207
+        assert body["status"] == "partial"
+        assert body["failed"] == 2
+        assert [r["statusCode"] for r in body["results"]] == [200, 400, 400]
+
+    def test_empty_items_returns_400(self):
+        response = sqs_lambda.lambda_handler({"items": []}, None)
+        assert response["statusCode"] == 400
+
+    def test_too_many_items_returns_400(self):
+        event = {"items": [{"account_id": ACCOUNT_ID, "queue_name": "b"}] * 3}
+        with patch.object(common, "BATCH_MAX_ITEMS", 2):
+            response = sqs_lambda.lambda_handler(event, None)
+        assert response["statusCode"] == 400
+
+    def test_items_still_running_at_deadline_report_timeout(self):
+        context = MagicMock()
+        context.get_remaining_time_in_millis.return_value = (
+            sqs_lambda.BATCH_TIMEOUT_MARGIN_MS + 50
+        )
+        released = threading.Event()
+
+        def _slow_unlock(account_id, queue_name, action, **options):
+            if queue_name == "slow-queue":
+                released.wait(5)
+            return sqs_lambda.lambda_response(200, {"status": "unlocked"})
+
+        event = {
+            "items": [
+                {"account_id": ACCOUNT_ID, "queue_name": "fast-queue"},
+                {"account_id": ACCOUNT_ID, "queue_name": "slow-queue"},
+            ]
+        }
+        with patch.object(sqs_lambda, "unlock_queue", side_effect=_slow_unlock):
+            response = sqs_lambda.lambda_handler(event, context)
+        released.set()
+        results = response["body"]["results"]
+        assert results[0]["body"]["status"] == "unlocked"
+        assert results[1]["statusCode"] == 504
+        assert results[1]["body"]["status"] == "timeout"
+
+    def test_batch_in_development_uses_dry_run(self):
+        event = {
+            "items": [
+                {"account_id": ACCOUNT_ID, "queue_name": "present-queue"},
+                {"account_id": ACCOUNT_ID, "queue_name": "absent-queue"},
+            ]
+        }
+        with patch.object(sqs_lambda, "ENVIRONMENT", "development"):
+            response = sqs_lambda.lambda_handler(event, None)
+        assert [r["statusCode"] for r in response["body"]["results"]] == [200, 404]
+
+
+# ===========================================================================
+# TestHandleSqsEventSQS
+# ===========================================================================
+
+
+def _sqs_event(*bodies):
+    return {
+        "Records": [
+            {
+                "messageId": f"msg-{index}",
+                "eventSource": "aws:sqs",
+                "body": body if isinstance(body, str) else json.dumps(body),
+            }
+            for index, body in enumerate(bodies)
+        ]
+    }
+
+
+class TestHandleSqsEventSQS:
+    """Unit tests for the SQS event-source mode ``handle_sqs_event``."""
+
+    def test_detects_sqs_events(self):
+        assert common.is_sqs_event(_sqs_event({}))
+        assert not common.is_sqs_event({"Records": []})
+        assert not common.is_sqs_event({"account_id": ACCOUNT_ID})
+
+    def test_successful_messages_are_not_reported(
+        self, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        event = _sqs_event(
+            {"account_id": ACCOUNT_ID, "queue_name": QUEUE_NAME},
+            {"account_id": ACCOUNT_ID, "queue_name": QUEUE_NAME, "action": "GET"},
+        )
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            response = sqs_lambda.lambda_handler(event, None)
+        assert response == {"batchItemFailures": []}
+        mock_sqs_client.set_queue_attributes.assert_called_once()
+
+    def test_only_retryable_failures_are_reported(
+        self, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        policy = mock_sqs_client.get_queue_attributes.return_value
+
+        def _get_queue_url(QueueName):
+            return {"QueueUrl": f"https://sqs.us-east-1.amazonaws.com/{ACCOUNT_ID}/{QueueName}"}
+
+        def _get_queue_attributes(QueueUrl, AttributeNames):
+            if QueueUrl.endswith("/broken-queue"):
+                raise Exception("boom")
+            return policy
+
+        mock_sqs_client.get_queue_url.side_effect = _get_queue_url
+        mock_sqs_client.get_queue_attributes.side_effect = _get_queue_attributes
+        event = _sqs_event(
+            {"account_id": ACCOUNT_ID, "queue_name": "queue-a"},
+            {"account_id": ACCOUNT_ID, "queue_name": "broken-queue"},
+            {"account_id": ACCOUNT_ID},
+            "not json",
+        )
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            response = sqs_lambda.lambda_handler(event, None)
+        assert response == {"batchItemFailures": [{"itemIdentifier": "msg-1"}]}
+
+    def test_throttled_messages_are_retried(
+        self, patch_sqs_boto3_session, mock_sts_client
+    ):
+        mock_sts_client.assume_root.side_effect = botocore.exceptions.ClientError(
+            {"Error": {"Code": "Throttling", "Message": "Rate exceeded"}}, "AssumeRoot"
+        )
+        event = _sqs_event({"account_id": ACCOUNT_ID, "queue_name": QUEUE_NAME})
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""), patch.object(
+            common.STS_GOVERNOR, "base_delay_ms", 0
+        ):
+            response = sqs_lambda.lambda_handler(event, None)
+        assert response == {"batchItemFailures": [{"itemIdentifier": "msg-0"}]}
+
+    def test_messages_running_at_deadline_are_retried(self):
+        context = MagicMock()
+        context.get_remaining_time_in_millis.return_value = (
+            sqs_lambda.BATCH_TIMEOUT_MARGIN_MS + 50
+        )
+        released = threading.Event()
+
+        def _slow_unlock(account_id, queue_name, action, **options):
+            if queue_name == "slow-queue":
+                released.wait(5)
+            return sqs_lambda.lambda_response(200, {"status": "unlocked"})
+
+        event = _sqs_event(
+            {"account_id": ACCOUNT_ID, "queue_name": "fast-queue"},
+            {"account_id": ACCOUNT_ID, "queue_name": "slow-queue"},
+        )
+        with patch.object(sqs_lambda, "unlock_queue", side_effect=_slow_unlock):
+            response = sqs_lambda.lambda_handler(event, context)
+        released.set()
+        assert response == {"batchItemFailures": [{"itemIdentifier": "msg-1"}]}
+
+    def test_outcome_metric_uses_sqs_event_action(self, capsys):
+        event = _sqs_event({"account_id": ACCOUNT_ID})
+        sqs_lambda.lambda_handler(event, None)
+        blob = _request_blob(capsys)
+        assert blob["action"] == "SQS_EVENT"
+        assert blob["status_code"] == "200"
+
+
+# ===========================================================================
+# TestAsyncJobsSQS
+# ===========================================================================
+
+
+def _wait_for_job(job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        body = common.get_job_status(job_id)["body"]
+        if body["status"] not in ("pending", "running"):
+            return body
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+class TestAsyncJobsSQS:
+    """Unit tests for asynchronous jobs: ``submit_job``, ``run_job`` and STATUS."""
+
+    def test_async_post_returns_job_id(self, sqs_post_event):
+        with patch.object(common, "start_job") as start_job:
+            response = sqs_lambda.lambda_handler({**sqs_post_event, "async": True}, None)
+        assert response["statusCode"] == 202
+        job_id = response["body"]["job_id"]
+        start_job.assert_called_once_with(sqs_lambda.SERVICE, job_id)
+
+        status = sqs_lambda.lambda_handler({"action": "STATUS", "job_id": job_id}, None)
+        assert status["statusCode"] == 200
+        assert status["body"]["status"] == "pending"
+        assert status["body"]["total"] == 1
+        assert status["body"]["completed"] == 0
+
+    def test_run_job_records_item_results(
+        self, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        policy = mock_sqs_client.get_queue_attributes.return_value
+
+        def _get_queue_url(QueueName):
+            return {"QueueUrl": f"https://sqs.us-east-1.amazonaws.com/{ACCOUNT_ID}/{QueueName}"}
+
+        def _get_queue_attributes(QueueUrl, AttributeNames):
+            if QueueUrl.endswith("/broken-queue"):
+                raise Exception("boom")
+            return policy
+
+        mock_sqs_client.get_queue_url.side_effect = _get_queue_url
+        mock_sqs_client.get_queue_attributes.side_effect = _get_queue_attributes
+        event = {
+            "async": True,
+            "items": [
+                {"account_id": ACCOUNT_ID, "queue_name": "queue-a"},
+                {"account_id": ACCOUNT_ID, "queue_name": "broken-queue"},
+            ],
+        }
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""), patch.object(
+            common, "start_job"
+        ):
+            job_id = sqs_lambda.lambda_handler(event, None)["body"]["job_id"]
+            response = sqs_lambda.lambda_handler(
+                {"action": "RUN_JOB", "job_id": job_id}, None
+            )
+        assert response["statusCode"] == 200
+        body = common.get_job_status(job_id)["body"]
+        assert body["status"] == "partial"
+        assert (body["completed"], body["succeeded"], body["failed"]) == (2, 1, 1)
+        assert [r["queue_name"] for r in body["results"]] == ["queue-a", "broken-queue"]
+        assert [r["statusCode"] for r in body["results"]] == [200, 500]
+
+    def test_finished_job_is_not_run_again(
+        self, patch_sqs_boto3_session, mock_sqs_client, sqs_post_event
+    ):
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""), patch.object(
+            common, "start_job"
+        ):
+            job_id = common.submit_job(sqs_lambda.SERVICE, {**sqs_post_event, "async": True})["body"][
+                "job_id"
+            ]
+            common.run_job(sqs_lambda.SERVICE, job_id, None)
+            common.run_job(sqs_lambda.SERVICE, job_id, None)
+        mock_sqs_client.set_queue_attributes.assert_called_once()
+
+    def test_runs_on_background_thread_outside_lambda(self):
+        event = {"account_id": ACCOUNT_ID, "queue_name": "present-queue", "async": True}
+        with patch.object(sqs_lambda, "ENVIRONMENT", "development"):
+            response = sqs_lambda.lambda_handler(event, None)
+            body = _wait_for_job(response["body"]["job_id"])
+        assert body["status"] == "success"
+        assert body["results"][0]["body"]["status"] == "unlocked"
+
+    def test_invokes_itself_in_lambda(
+        self, patch_sqs_boto3_session, mock_lambda_client, sqs_post_event
+    ):
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""), patch.object(
+            common, "JOB_TABLE", "jobs"
+        ), patch.dict(os.environ, {"AWS_LAMBDA_FUNCTION_NAME": "unlock_sqs_queue"}):
+            response = sqs_lambda.lambda_handler({**sqs_post_event, "async": True}, None)
+        kwargs = mock_lambda_client.invoke.call_args.kwargs
+        assert kwargs["FunctionName"] == "unlock_sqs_queue"
+        assert kwargs["InvocationType"] == "Event"
+        assert json.loads(kwargs["Payload"]) == {
+            "action": "RUN_JOB",
+            "job_id": response["body"]["job_id"],
+        }
+
+    def test_unfinished_items_continue_in_next_run(self):
+        context = _context(sqs_lambda.BATCH_TIMEOUT_MARGIN_MS + 200)
+        released = threading.Event()
+
+        def _slow_unlock(account_id, queue_name, action, **options):
+            if queue_name == "slow-queue":
+                released.wait(5)
+            return sqs_lambda.lambda_response(200, {"status": "unlocked"})
+
+        event = {
+            "async": True,
+            "items": [
+                {"account_id": ACCOUNT_ID, "queue_name": "fast-queue"},
+                {"account_id": ACCOUNT_ID, "queue_name": "slow-queue"},
+            ],
+        }
+        with patch.object(common, "start_job") as start_job, patch.object(
+            sqs_lambda, "unlock_queue", side_effect=_slow_unlock
+        ):
+            job_id = common.submit_job(sqs_lambda.SERVICE, event)["body"]["job_id"]
+            response = common.run_job(sqs_lambda.SERVICE, job_id, context)
+            released.set()
+            assert response["statusCode"] == 202
+            assert response["body"]["status"] == "running"
+            assert response["body"]["completed"] == 1
+            assert start_job.call_count == 2
+
+            common.run_job(sqs_lambda.SERVICE, job_id, None)
+        assert _wait_for_job(job_id)["succeeded"] == 2
+
+    def test_run_without_progress_times_out_items(self):
+        context = _context(sqs_lambda.BATCH_TIMEOUT_MARGIN_MS)
+        released = threading.Event()
+
+        def _slow_unlock(account_id, queue_name, action, **options):
+            released.wait(5)
+            return sqs_lambda.lambda_response(200, {"status": "unlocked"})
+
+        with patch.object(common, "start_job") as start_job, patch.object(
+            sqs_lambda, "unlock_queue", side_effect=_slow_unlock
+        ):
+            job_id = common.submit_job(sqs_lambda.SERVICE, 
+                {"account_id": ACCOUNT_ID, "queue_name": QUEUE_NAME, "async": True}
+            )["body"]["job_id"]
+            response = common.run_job(sqs_lambda.SERVICE, job_id, context)
+        released.set()
+        assert response["body"]["status"] == "error"
+        assert response["body"]["results"][0]["statusCode"] == 504
+        start_job.assert_called_once()
+
+    def test_status_requires_known_job(self):
+        missing = sqs_lambda.lambda_handler({"action": "STATUS"}, None)
+        assert missing["statusCode"] == 400
+        unknown = sqs_lambda.lambda_handler({"action": "STATUS", "job_id": "nope"}, None)
+        assert unknown["statusCode"] == 404
+        assert unknown["body"]["status"] == "not_found"
+
+    def test_lambda_requires_job_table(self, sqs_post_event):
+        with patch.dict(os.environ, {"AWS_LAMBDA_FUNCTION_NAME": "unlock_sqs_queue"}):
+            response = sqs_lambda.lambda_handler({**sqs_post_event, "async": True}, None)
+        assert response["statusCode"] == 400
+        assert "JOB_TABLE" in response["body"]["message"]
+
+    def test_async_batch_is_validated(self):
+        response = sqs_lambda.lambda_handler({"async": True, "items": []}, None)
+        assert response["statusCode"] == 400
+
+    def test_start_failure_returns_500(self, sqs_post_event):
+        with patch.object(common, "start_job", side_effect=Exception("denied")):
+            response = sqs_lambda.lambda_handler({**sqs_post_event, "async": True}, None)
+        assert response["statusCode"] == 500
+        assert "denied" in response["body"]["message"]
+
+    def test_dynamodb_store_round_trip(self, patch_sqs_boto3_session, mock_dynamodb_client):
+        store = common.DynamoDBJobStore("jobs")
+        job = {"job_id": "job-1", "status": "pending", "expiration": int(time.time()) + 60}
+        store.put(job)
+        item = mock_dynamodb_client.put_item.call_args.kwargs["Item"]
+        assert item["id"] == {"S": "job-1"}
+        mock_dynamodb_client.get_item.return_value = {"Item": item}
+        assert store.get("job-1") == job
+
+    def test_dynamodb_store_truncates_oversized_results(
+        self, patch_sqs_boto3_session, mock_dynamodb_client
+    ):
+        body = {"status": "unlocked", "message": "done", "previous_policy": "x" * 2000}
+        job = {
+            "job_id": "job-1",
+            "status": "success",
+            "expiration": int(time.time()) + 60,
+            "results": {
+                str(i): {"index": i, "queue_name": f"queue-{i}", "statusCode": 200, "body": body}
+                for i in range(10)
+            },
+        }
+        with patch.object(common, "JOB_ITEM_MAX_BYTES", 10000):
+            common.DynamoDBJobStore("jobs").put(job)
+        data = mock_dynamodb_client.put_item.call_args.kwargs["Item"]["data"]["S"]
+        assert len(data) <= 10000
+        stored = json.loads(data)
+        assert len(stored["results"]) == 10
+        assert stored["results"]["3"]["queue_name"] == "queue-3"
+        assert stored["results"]["3"]["body"] == {
+            "status": "unlocked",
+            "message": "done",
+            "truncated": True,
+        }
+        assert job["results"]["3"]["body"] is body
+
+    def test_job_store_write_failure_fails_the_job(self, sqs_post_event):
+        with patch.object(common, "start_job"):
+            job_id = common.submit_job(sqs_lambda.SERVICE, {**sqs_post_event, "async": True})["body"]["job_id"]
+        put = common.JOB_STORE.put
+        errors = [Exception("Item size has exceeded the maximum")]
+
+        def _put(job):
+            if errors:
+                raise errors.pop()
+            put(job)
+
+        with patch.object(common.JOB_STORE, "put", side_effect=_put), patch.object(
+            sqs_lambda, "unlock_queue"
+        ) as unlock_queue:
+            response = common.run_job(sqs_lambda.SERVICE, job_id, None)
+        assert response["statusCode"] == 500
+        unlock_queue.assert_not_called()
+        body = common.get_job_status(job_id)["body"]
+        assert body["status"] == "error"
+        assert "Item size has exceeded" in body["message"]
+
+
+# ===========================================================================
+# TestPolicyDeniesAllSQS
+# ===========================================================================
+
+
+class TestPolicyDeniesAllSQS:
+    """Unit tests for the ``policy_denies_all`` lock-out detector."""
+
+    def test_deny_all_policy_is_detected(self):
+        assert sqs_lambda.policy_denies_all(SAMPLE_SQS_POLICY)
+
+    def test_scoped_action_is_not_a_lock(self):
+        statement = dict(SAMPLE_SQS_POLICY["Statement"][0], Action="sqs:SendMessage")
+        assert not sqs_lambda.policy_denies_all({"Statement": [statement]})
+
+    def test_specific_principal_is_not_a_lock(self):
+        statement = dict(
+            SAMPLE_SQS_POLICY["Statement"][0],
+            Principal={"AWS": "arn:aws:iam::123456789012:root"},
+        )
+        assert not sqs_lambda.policy_denies_all({"Statement": [statement]})
+
+
+# ===========================================================================
+# TestHandleSweepSQS
+# ===========================================================================
+
+
+class TestHandleSweepSQS:
+    """Unit tests for the account-wide ``SWEEP`` mode."""
+
+    LOCKED_URL = f"https://sqs.us-east-1.amazonaws.com/{ACCOUNT_ID}/locked-queue"
+    OPEN_URL = f"https://sqs.us-east-1.amazonaws.com/{ACCOUNT_ID}/open-queue"
+
+    @pytest.fixture
+    def queues(self, mock_sqs_client):
+        mock_sqs_client.get_paginator.return_value.paginate.return_value = [
+            {"QueueUrls": [self.LOCKED_URL]},
+            {"QueueUrls": [self.OPEN_URL]},
+        ]
+        policies = {self.LOCKED_URL: json.dumps(SAMPLE_SQS_POLICY)}
+
+        def _get_queue_attributes(QueueUrl, AttributeNames):
+            policy = policies.get(QueueUrl)
+            return {"Attributes": {"Policy": policy}} if policy else {}
+
+        mock_sqs_client.get_queue_attributes.side_effect = _get_queue_attributes
+        return mock_sqs_client
+
+    def test_sweep_reports_locked_queues_without_unlocking(
+        self, patch_sqs_boto3_session, queues
+    ):
+        event = {"action": "SWEEP", "account_id": ACCOUNT_ID}
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            response = sqs_lambda.lambda_handler(event, None)
+        body = response["body"]
+        assert response["statusCode"] == 200
+        assert body["queues_checked"] == 2
+        assert body["locked_queues"] == [
+            {"queue_name": "locked-queue", "queue_url": self.LOCKED_URL, "status": "locked"}
+        ]
+        queues.set_queue_attributes.assert_not_called()
+        queues.get_queue_url.assert_not_called()
+
+    def test_sweep_with_unlock_clears_locked_policies(
+        self, patch_sqs_boto3_session, queues
+    ):
+        event = {"action": "SWEEP", "account_id": ACCOUNT_ID, "unlock": True}
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            response = sqs_lambda.lambda_handler(event, None)
+        assert response["body"]["locked_queues"][0]["status"] == "unlocked"
+        queues.set_queue_attributes.assert_called_once_with(
+            QueueUrl=self.LOCKED_URL, Attributes={"Policy": ""}
+        )
+
+    def test_prefix_is_passed_to_list_queues(self, patch_sqs_boto3_session, queues):
+        event = {
+            "action": "SWEEP",
+            "account_id": ACCOUNT_ID,
+            "queue_name_prefix": "orders-",
+        }
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            sqs_lambda.lambda_handler(event, None)
+        queues.get_paginator.assert_called_once_with("list_queues")
+        queues.get_paginator.return_value.paginate.assert_called_once_with(
+            QueueNamePrefix="orders-"
+        )
+
+    def test_queue_failure_makes_sweep_partial(self, patch_sqs_boto3_session, queues):
+        queues.get_queue_attributes.side_effect = Exception("Throttled")
+        event = {"action": "SWEEP", "account_id": ACCOUNT_ID}
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            response = sqs_lambda.lambda_handler(event, None)
+        assert response["body"]["status"] == "partial"
+        assert len(response["body"]["failed_queues"]) == 2
+
+    def test_missing_account_id_returns_400(self):
+        response = sqs_lambda.lambda_handler({"action": "SWEEP"}, None)
+        assert response["statusCode"] == 400
+
+    def test_list_failure_returns_500(self, patch_sqs_boto3_session, mock_sqs_client):
+        mock_sqs_client.get_paginator.side_effect = Exception("AccessDenied")
+        event = {"action": "SWEEP", "account_id": ACCOUNT_ID}
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            response = sqs_lambda.lambda_handler(event, None)
+        assert response["statusCode"] == 500
+
+
+# ===========================================================================
+# TestReadQueuePolicySQS
+# ===========================================================================
+
+
+class TestReadQueuePolicySQS:
+    """Unit tests for the queue URL cache and ``read_queue_policy``."""
+
+    NOT_FOUND = botocore.exceptions.ClientError(
+        {"Error": {"Code": "AWS.SimpleQueueService.NonExistentQueue", "Message": "x"}},
+        "GetQueueAttributes",
+    )
+
+    def test_queue_url_is_cached_across_invocations(
+        self, sqs_get_event, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""), patch.object(
+            sqs_lambda, "POLICY_CACHE", sqs_lambda.TTLCache(0)
+        ):
+            sqs_lambda.lambda_handler(sqs_get_event, None)
+            response = sqs_lambda.lambda_handler(sqs_get_event, None)
+        assert response["statusCode"] == 200
+        mock_sqs_client.get_queue_url.assert_called_once_with(QueueName=QUEUE_NAME)
+        assert mock_sqs_client.get_queue_attributes.call_count == 2
+
+    def test_built_url_skips_get_queue_url(self, mock_sqs_client):
+        with patch.object(sqs_lambda, "SQS_BUILD_QUEUE_URL", True):
+            queue_url, policy_str = sqs_lambda.read_queue_policy(
+                mock_sqs_client, ACCOUNT_ID, QUEUE_NAME
+            )
+        assert queue_url == QUEUE_URL
+        assert json.loads(policy_str) == SAMPLE_SQS_POLICY
+        mock_sqs_client.get_queue_url.assert_not_called()
+
+    def test_built_url_uses_the_client_endpoint(self, mock_sqs_client):
+        mock_sqs_client.meta.endpoint_url = "http://127.0.0.1:4566/"
+        with patch.object(sqs_lambda, "SQS_BUILD_QUEUE_URL", True):
+            queue_url, _ = sqs_lambda.read_queue_policy(
+                mock_sqs_client, ACCOUNT_ID, QUEUE_NAME
+            )
+        assert queue_url == f"http://127.0.0.1:4566/{ACCOUNT_ID}/{QUEUE_NAME}"
+
+    def test_rejected_built_url_falls_back_to_get_queue_url(self, mock_sqs_client):
+        resolved_url = "https://sqs.us-east-1.amazonaws.com/999999999999/test-queue"
+        mock_sqs_client.get_queue_url.return_value = {"QueueUrl": resolved_url}
+        mock_sqs_client.get_queue_attributes.side_effect = [
+            self.NOT_FOUND,
+            {"Attributes": {}},
+        ]
+        with patch.object(sqs_lambda, "SQS_BUILD_QUEUE_URL", True):
+            queue_url, policy_str = sqs_lambda.read_queue_policy(
+                mock_sqs_client, ACCOUNT_ID, QUEUE_NAME
+            )
+        assert queue_url == resolved_url
+        assert policy_str is None
+        mock_sqs_client.get_queue_url.assert_called_once()
+
+    def test_stale_cached_url_is_replaced(self, mock_sqs_client):
+        key = (ACCOUNT_ID, "us-east-1", QUEUE_NAME)
+        sqs_lambda.QUEUE_URL_CACHE.set(key, "https://stale.example/queue")
+        mock_sqs_client.get_queue_attributes.side_effect = [
+            self.NOT_FOUND,
+            {"Attributes": {}},
+        ]
+        queue_url, _ = sqs_lambda.read_queue_policy(
+            mock_sqs_client, ACCOUNT_ID, QUEUE_NAME
+        )
+        assert queue_url == QUEUE_URL
+        assert sqs_lambda.QUEUE_URL_CACHE.get(key) == QUEUE_URL
+
+    def test_unresolvable_queue_raises_queue_not_found(self, mock_sqs_client):
+        mock_sqs_client.get_queue_url.side_effect = botocore.exceptions.ClientError(
+            {"Error": {"Code": "QueueDoesNotExist", "Message": "x"}}, "GetQueueUrl"
+        )
+        with pytest.raises(sqs_lambda.QueueNotFoundError):
+            sqs_lambda.read_queue_policy(mock_sqs_client, ACCOUNT_ID, QUEUE_NAME)
+
+    @pytest.mark.parametrize("code", ["InternalError", "AccessDenied"])
+    def test_other_get_queue_url_errors_are_not_not_found(self, mock_sqs_client, code):
+        error = botocore.exceptions.ClientError(
+            {"Error": {"Code": code, "Message": "x"}}, "GetQueueUrl"
+        )
+        mock_sqs_client.get_queue_url.side_effect = error
+        with pytest.raises(botocore.exceptions.ClientError) as raised:
+            sqs_lambda.read_queue_policy(mock_sqs_client, ACCOUNT_ID, QUEUE_NAME)
+        assert raised.value is error
+
+    @pytest.mark.parametrize("code", ["InternalError", "AccessDenied"])
+    def test_get_queue_url_failure_is_an_uncached_error(
+        self, sqs_get_event, patch_sqs_boto3_session, mock_sqs_client, code
+    ):
+        mock_sqs_client.get_queue_url.side_effect = botocore.exceptions.ClientError(
+            {"Error": {"Code": code, "Message": "x"}}, "GetQueueUrl"
+        )
+        governor = common.RateGovernor(base_delay_ms=0)
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""), patch.object(
+            sqs_lambda, "SERVICE_GOVERNOR", governor
+        ):
+            first = sqs_lambda.lambda_handler(sqs_get_event, None)
+            calls = mock_sqs_client.get_queue_url.call_count
+            second = sqs_lambda.lambda_handler(sqs_get_event, None)
+        assert first["statusCode"] == second["statusCode"] == 500
+        assert "cached" not in second["body"]
+        assert mock_sqs_client.get_queue_url.call_count == 2 * calls
+
+    @pytest.mark.parametrize("code", ["InternalError", "AccessDenied"])
+    def test_get_queue_url_failure_keeps_sqs_message_for_retry(
+        self, patch_sqs_boto3_session, mock_sqs_client, code
+    ):
+        mock_sqs_client.get_queue_url.side_effect = botocore.exceptions.ClientError(
+            {"Error": {"Code": code, "Message": "x"}}, "GetQueueUrl"
+        )
+        event = _sqs_event({"account_id": ACCOUNT_ID, "queue_name": QUEUE_NAME})
+        governor = common.RateGovernor(base_delay_ms=0)
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""), patch.object(
+            sqs_lambda, "SERVICE_GOVERNOR", governor
+        ):
+            response = sqs_lambda.lambda_handler(event, None)
+        assert response == {"batchItemFailures": [{"itemIdentifier": "msg-0"}]}
+
+
+# ===========================================================================
+# TestMetricsSQS
+# ===========================================================================
+
+
+def _emf_blobs(capsys):
+    """Return the EMF metric blobs printed to stdout so far."""
+    lines = capsys.readouterr().out.splitlines()
+    return [json.loads(l) for l in lines if l.startswith("{") and '"_aws"' in l]
+
+
+def _request_blob(capsys):
+    return next(b for b in _emf_blobs(capsys) if "Requests" in b)
+
+
+class TestMetricsSQS:
+    """Unit tests for the EMF metrics emitted by ``lambda_handler``."""
+
+    def test_get_emits_phase_latencies(self, capsys, sqs_get_event, patch_sqs_boto3_session):
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            sqs_lambda.lambda_handler(sqs_get_event, None)
+        blob = _request_blob(capsys)
+        for name in (
+            "AssumeRootLatency",
+            "ClientInitLatency",
+            "GetQueueUrlLatency",
+            "PolicyReadLatency",
+        ):
+            assert name in blob
+        assert blob["action"] == "GET"
+        assert blob["status_code"] == "200"
+        assert blob["account_id"] == ACCOUNT_ID
+        assert blob["Requests"] == [1.0]
+
+    def test_post_emits_delete_latency(self, capsys, sqs_post_event, patch_sqs_boto3_session):
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            sqs_lambda.lambda_handler(sqs_post_event, None)
+        blob = _request_blob(capsys)
+        assert "PolicyDeleteLatency" in blob
+        assert blob["action"] == "POST"
+
+    def test_throttling_is_counted(
+        self, capsys, sqs_get_event, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        mock_sqs_client.get_queue_attributes.side_effect = botocore.exceptions.ClientError(
+            {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}},
+            "GetQueueAttributes",
+        )
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""), patch.object(
+            sqs_lambda.SERVICE_GOVERNOR, "base_delay_ms", 0
+        ):
+            sqs_lambda.lambda_handler(sqs_get_event, None)
+        blob = _request_blob(capsys)
+        assert blob["Throttles"] == [1.0]
+        assert blob["ThrottleRetries"] == [1.0] * common.GOVERNOR_MAX_RETRIES
+        assert blob["status_code"] == "429"
+
+    def test_validation_error_is_counted_without_phases(self, capsys):
+        sqs_lambda.lambda_handler({"queue_name": "q", "action": "GET"}, None)
+        blob = _request_blob(capsys)
+        assert blob["status_code"] == "400"
+        assert "AssumeRootLatency" not in blob
+
+    def test_cold_start_is_keyed_by_function_name(self, capsys):
+        with patch("aws_lambda_powertools.metrics.provider.cold_start.is_cold_start", True):
+            sqs_lambda.lambda_handler({"queue_name": "q", "action": "GET"}, None)
+        blob = next(b for b in _emf_blobs(capsys) if "ColdStart" in b)
+        assert blob["function_name"] == "unlock_sqs_queue"
+        assert blob["function_name"] != sqs_lambda.TARGET_POLICY_NAME
+
+    def test_action_dimension_does_not_leak_into_next_request(
+        self, capsys, sqs_get_event, sqs_post_event
+    ):
+        with patch.object(sqs_lambda, "ENVIRONMENT", "development"):
+            sqs_lambda.lambda_handler(sqs_get_event, None)
+            sqs_lambda.lambda_handler(sqs_post_event, None)
+        blobs = [b for b in _emf_blobs(capsys) if "Requests" in b]
+        assert [b["action"] for b in blobs] == ["GET", "POST"]
+
+    def test_concurrent_requests_keep_their_own_dimensions(self, capsys):
+        events = [
+            {"account_id": ACCOUNT_ID, "queue_name": "present-queue", "action": "GET"},
+            {"account_id": ACCOUNT_ID, "queue_name": "missing-queue", "action": "POST"},
+        ] * 8
+        barrier = threading.Barrier(len(events))
+
+        def invoke(event):
+            barrier.wait(5)
+            sqs_lambda.lambda_handler(event, None)
+
+        simulator = common.DryRunSimulator("queues", "sqs:*", latency_ms=20)
+        with patch.object(sqs_lambda, "ENVIRONMENT", "development"), patch.object(
+            sqs_lambda, "DRY_RUN_SIMULATOR", simulator
+        ):
+            threads = [threading.Thread(target=invoke, args=(e,)) for e in events]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(5)
+        blobs = [b for b in _emf_blobs(capsys) if "Requests" in b]
+        assert len(blobs) == len(events)
+        assert sorted((b["action"], b["status_code"]) for b in blobs) == sorted(
+            [("GET", "200"), ("POST", "404")] * 8
+        )
+        assert all(b["Requests"] == [1.0] for b in blobs)
+
+
+# ===========================================================================
+# TestTracingSQS
+# ===========================================================================
+
+
+@pytest.fixture
+def span_collector():
+    """Route spans of the SQS Lambda to an in-memory stub collector."""
+    collector = common.InMemorySpanExporter()
+    with patch.object(common, "span_exporter", collector):
+        yield collector
+
+
+class TestTracingSQS:
+    """Unit tests for phase and fan-out spans in the SQS unlock Lambda."""
+
+    def test_no_spans_without_tracer_or_exporter(self):
+        with common.span("Phase"):
+            pass
+        assert common.current_trace_context() == (None, None)
+
+    def test_get_records_nested_phase_spans(
+        self, span_collector, sqs_get_event, patch_sqs_boto3_session
+    ):
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            sqs_lambda.lambda_handler(sqs_get_event, None)
+        spans = {s["name"]: s for s in span_collector.spans}
+        root = spans["## lambda_handler"]
+        for name in ("AssumeRoot", "ClientInit", "GetQueueUrl", "PolicyRead"):
+            assert spans[name]["parent_id"] == root["id"]
+            assert spans[name]["trace_id"] == root["trace_id"]
+            assert spans[name]["annotations"]["account_id"] == ACCOUNT_ID
+            assert spans[name]["annotations"]["resource_name"] == QUEUE_NAME
+        assert root["parent_id"] is None
+        assert root["annotations"]["action"] == "GET"
+
+    def test_failed_call_is_marked_as_error(
+        self, span_collector, sqs_get_event, patch_sqs_boto3_session, mock_sqs_client
+    ):
+        mock_sqs_client.get_queue_attributes.side_effect = botocore.exceptions.ClientError(
+            {"Error": {"Code": "AccessDenied", "Message": "Access Denied"}},
+            "GetQueueAttributes",
+        )
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            sqs_lambda.lambda_handler(sqs_get_event, None)
+        spans = {s["name"]: s for s in span_collector.spans}
+        assert "AccessDenied" in spans["PolicyRead"]["error"]
+        assert spans["## lambda_handler"]["error"] is None
+
+    def test_batch_workers_are_parented_to_the_handler(
+        self, span_collector, patch_sqs_boto3_session
+    ):
+        event = {
+            "action": "GET",
+            "items": [
+                {"account_id": ACCOUNT_ID, "queue_name": "queue-a"},
+                {"account_id": ACCOUNT_ID, "queue_name": "queue-b"},
+            ],
+        }
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""):
+            sqs_lambda.lambda_handler(event, None)
+        root = next(s for s in span_collector.spans if s["name"] == "## lambda_handler")
+        items = [s for s in span_collector.spans if s["name"] == "BatchItem"]
+        assert sorted(s["annotations"]["resource_name"] for s in items) == ["queue-a", "queue-b"]
+        assert all(s["parent_id"] == root["id"] for s in items)
+        item_ids = {s["id"] for s in items}
+        reads = [s for s in span_collector.spans if s["name"] == "PolicyRead"]
+        assert len(reads) == 2
+        assert all(s["parent_id"] in item_ids for s in reads)
+
+    def test_file_exporter_writes_json_lines(self, tmp_path):
+        path = tmp_path / "spans.jsonl"
+        with patch.object(common, "span_exporter", common.FileSpanExporter(str(path))):
+            with common.span("Outer", account_id=ACCOUNT_ID):
+                with common.span("Inner"):
+                    pass
+        records = [json.loads(line) for line in path.read_text().splitlines()]
+        assert [r["name"] for r in records] == ["Inner", "Outer"]
+        assert records[0]["parent_id"] == records[1]["id"]
+        assert records[0]["annotations"] == {"account_id": ACCOUNT_ID}
+
+    def test_xray_subsegments_are_annotated(self):
+        tracer = MagicMock()
+        subsegment = tracer.provider.in_subsegment.return_value.__enter__.return_value
+        with patch.object(common, "get_tracer", return_value=tracer):
+            with common.span("AssumeRoot", account_id=ACCOUNT_ID):
+                pass
+        tracer.provider.in_subsegment.assert_called_once_with("AssumeRoot")
+        subsegment.put_annotation.assert_called_once_with("account_id", ACCOUNT_ID)
+
+
+# ===========================================================================
+# TestAwsStandInSQS
+# ===========================================================================
+
+
+class TestAwsStandInSQS:
+    """End-to-end tests over real HTTP against the local AWS stand-in server."""
+
+    @pytest.fixture(autouse=True)
+    def endpoint(self, aws_standin):
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""), patch.object(
+            common, "ENDPOINT_URL", aws_standin.endpoint_url
+        ):
+            yield
+
+    def _handle(self, queue_name, action, **options):
+        event = {"account_id": ACCOUNT_ID, "queue_name": queue_name, "action": action}
+        return sqs_lambda.lambda_handler({**event, **options}, None)
+
+    def test_get_and_unlock_change_remote_state(self):
+        get = self._handle("locked-queue", "GET")
+        post = self._handle("locked-queue", "POST")
+        again = self._handle("locked-queue", "POST", refresh=True)
+        assert get["body"]["policy"] == SAMPLE_SQS_POLICY
+        assert post["body"]["status"] == "unlocked"
+        assert again["body"]["status"] == "not_locked"
+
+    def test_missing_queue_and_policy_return_404(self):
+        assert self._handle("missing-queue", "GET")["statusCode"] == 404
+        assert self._handle("open-queue", "GET")["statusCode"] == 404
+
+    def test_sweep_lists_locked_queues(self):
+        response = sqs_lambda.lambda_handler(
+            {"action": "SWEEP", "account_id": ACCOUNT_ID}, None
+        )
+        assert [q["queue_name"] for q in response["body"]["locked_queues"]] == [
+            "locked-queue"
+        ]
+
+    def test_injected_throttling_returns_429(self, aws_standin):
+        import aws_standin as standin
+
+        aws_standin.faults["GetQueueUrl"] = standin.FaultProfile(throttle_rate=1.0)
+        with patch.object(sqs_lambda.SERVICE_GOVERNOR, "base_delay_ms", 0):
+            response = self._handle("locked-queue", "GET")
+        assert response["statusCode"] == 429
+        assert aws_standin.stats["GetQueueUrl"]["throttled"] == (
+            sqs_lambda.SERVICE_GOVERNOR.max_retries + 1
+        )
+
+
+# ===========================================================================
+# TestProfilingSQS
+# ===========================================================================
+
+
+class TestProfilingSQS:
+    """Unit tests for opt-in profiling: ``run_profiled`` and ``write_profile``."""
+
+    @pytest.fixture(autouse=True)
+    def output_dir(self, tmp_path):
+        with patch.object(common, "PROFILE_OUTPUT_DIR", str(tmp_path)), patch.object(
+            sqs_lambda, "ENVIRONMENT", "development"
+        ):
+            yield tmp_path
+
+    def _event(self, **options):
+        return {"account_id": ACCOUNT_ID, "queue_name": "present-queue", **options}
+
+    def test_not_profiled_by_default(self, output_dir):
+        with patch.object(common, "run_profiled") as run_profiled:
+            response = sqs_lambda.lambda_handler(self._event(action="GET"), None)
+        assert response["statusCode"] == 200
+        run_profiled.assert_not_called()
+        assert list(output_dir.iterdir()) == []
+
+    def test_event_flag_writes_pstats_and_logs_top(self, output_dir):
+        import pstats
+
+        context = _context(60000)
+        context.aws_request_id = "req-1"
+        with patch.object(sqs_lambda.logger, "info") as info:
+            response = sqs_lambda.lambda_handler(
+                self._event(action="GET", profile=True), context
+            )
+        assert response["statusCode"] == 200
+        path = output_dir / "unlock_sqs_queue-req-1.pstats"
+        functions = {name for _, _, name in pstats.Stats(str(path)).stats}
+        assert "handle_dry_run_sqs" in functions
+        summary = info.call_args_list[-1].kwargs["extra"]["profile"]
+        assert summary["path"] == str(path)
+        assert 0 < len(summary["top"]) <= common.PROFILE_LOG_TOP
+        assert {"function", "calls", "cumulative_ms", "own_ms"} <= set(summary["top"][0])
+
+    def test_sample_mode_writes_collapsed_stacks(self, output_dir):
+        with patch.object(common, "PROFILE_INVOCATIONS", True), patch.object(
+            common, "PROFILE_MODE", "sample"
+        ), patch.object(common, "PROFILE_INTERVAL_MS", 1), patch.object(
+            sqs_lambda.DRY_RUN_SIMULATOR, "latency_ms", 50
+        ):
+            response = sqs_lambda.lambda_handler(self._event(action="GET"), None)
+        assert response["statusCode"] == 200
+        [path] = output_dir.glob("unlock_sqs_queue-*.collapsed")
+        lines = path.read_text().splitlines()
+        stack, count = lines[0].rsplit(" ", 1)
+        assert int(count) >= 1
+        assert any("handle_dry_run_sqs (unlock_sqs_queue.py" in line for line in lines)
+
+    def test_write_failure_does_not_fail_invocation(self, output_dir):
+        with patch.object(
+            common, "PROFILE_OUTPUT_DIR", str(output_dir / "missing")
+        ), patch.object(sqs_lambda.logger, "warning") as warning:
+            response = sqs_lambda.lambda_handler(
+                self._event(action="GET", profile=True), None
+            )
+        assert response["statusCode"] == 200
+        assert "Could not write profile" in warning.call_args.args[0]
+
+    @staticmethod
+    def _fan_out(results):
+        thread = threading.Thread(target=lambda: results.append(sum(range(100))))
+        thread.start()
+        thread.join(5)
+        return results
+
+    def test_worker_profiler_error_leaves_worker_running(self):
+        import cProfile
+
+        class _ActiveElsewhere(cProfile.Profile):
+            def enable(self, *args, **kwargs):
+                if threading.current_thread() is not threading.main_thread():
+                    raise ValueError("Another profiling tool is already active")
+                super().enable(*args, **kwargs)
+
+        profiler = common.ThreadedProfile()
+        with patch.object(profiler, "per_thread", True), patch.object(
+            cProfile, "Profile", _ActiveElsewhere
+        ):
+            assert profiler.runcall(self._fan_out, []) == [4950]
+        assert len(profiler._profilers) == 1
+        assert profiler.stats().total_calls > 0
+
+    def test_single_profiler_when_cprofile_sees_all_threads(self):
+        profiler = common.ThreadedProfile()
+        with patch.object(profiler, "per_thread", False), patch.object(
+            threading, "setprofile"
+        ) as setprofile:
+            assert profiler.runcall(self._fan_out, []) == [4950]
+        setprofile.assert_not_called()
+        assert len(profiler._profilers) == 1
+
+    def test_concurrent_invocation_runs_unprofiled(self, output_dir):
+        with common._profile_lock:
+            response = sqs_lambda.lambda_handler(
+                self._event(action="GET", profile=True), None
+            )
+        assert response["statusCode"] == 200
+        assert list(output_dir.iterdir()) == []
+
+
+# ===========================================================================
+# TestLoggingSQS
+# ===========================================================================
+
+
+class TestLoggingSQS:
+    """Unit tests for event summaries, policy log fields, sampling and the log budget."""
+
+    @pytest.fixture
+    def log_stream(self):
+        stream = io.StringIO()
+        with patch.object(common.log_handler, "stream", stream):
+            yield stream
+
+    @pytest.fixture
+    def log_level(self):
+        logger = sqs_lambda.logger
+        original = logger.level
+        yield logger.setLevel
+        logger.setLevel(original)
+
+    def _records(self, stream):
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    def _get(self):
+        event = {
+            "account_id": ACCOUNT_ID,
+            "queue_name": "present-queue",
+            "action": "GET",
+        }
+        with patch.object(sqs_lambda, "ENVIRONMENT", "development"):
+            return sqs_lambda.lambda_handler(event, None)
+
+    def test_event_is_summarized_at_info(self, log_stream, log_level):
+        log_level("INFO")
+        assert self._get()["statusCode"] == 200
+        records = self._records(log_stream)
+        start = next(r for r in records if r["message"].startswith("Starting unlock"))
+        assert start["request"] == {
+            "action": "GET",
+            "account_id": ACCOUNT_ID,
+            "queue_name": "present-queue",
+            "items": 0,
+        }
+        assert not any("event" in r for r in records)
+
+    def test_full_event_is_logged_at_debug(self, log_stream, log_level):
+        log_level("DEBUG")
+        self._get()
+        records = self._records(log_stream)
+        incoming = next(r for r in records if r["message"] == "Incoming event")
+        assert incoming["event"]["queue_name"] == "present-queue"
+
+    def test_small_policy_is_logged_in_full(self):
+        fields = sqs_lambda.policy_log_fields(json.dumps(SAMPLE_SQS_POLICY))
+        assert fields["document"] == SAMPLE_SQS_POLICY
+        assert len(fields["sha256"]) == 16
+
+    def test_large_policy_is_logged_as_size_and_hash(self):
+        policy_str = json.dumps(SAMPLE_SQS_POLICY)
+        with patch.object(common, "LOG_POLICY_MAX_BYTES", 10):
+            fields = sqs_lambda.policy_log_fields(policy_str)
+        assert fields == {
+            "bytes": len(policy_str),
+            "sha256": hashlib.sha256(policy_str.encode()).hexdigest()[:16],
+        }
+
+    def test_policy_fields_not_built_when_info_is_filtered(
+        self, patch_sqs_boto3_session, log_level
+    ):
+        log_level("WARNING")
+        event = {"account_id": ACCOUNT_ID, "queue_name": QUEUE_NAME, "action": "GET"}
+        with patch.object(sqs_lambda, "ENVIRONMENT", ""), patch.object(
+            sqs_lambda, "policy_log_fields"
+        ) as policy_log_fields:
+            response = sqs_lambda.lambda_handler(event, None)
+        assert response["statusCode"] == 200
+        policy_log_fields.assert_not_called()
+
+    def test_sampling_is_refreshed_per_invocation_when_enabled(self):
+        logger = sqs_lambda.logger
+        with patch.object(logger, "refresh_sample_rate_calculation") as refresh:
+            self._get()
+            refresh.assert_not_called()
+            with patch.object(logger, "sampling_rate", 0.1):
+                self._get()
+        refresh.assert_called_once_with()
+
+    def test_budget_drops_records_below_warning(self):
+        import logging
+
+        stream = io.StringIO()
+        handler = common.LogBudgetHandler(stream, budget=30)
+        for level, msg in [
+            (logging.INFO, "first message fits"),
+            (logging.INFO, "second message is over the budget"),
+            (logging.ERROR, "errors are always written"),
+        ]:
+            handler.handle(logging.makeLogRecord({"levelno": level, "msg": msg}))
+        assert stream.getvalue().splitlines() == [
+            "first message fits",
+            "errors are always written",
+        ]
+        assert (handler.dropped, handler.dropped_bytes) == (1, 34)
+        handler.start_invocation()
+        assert (handler.written, handler.dropped) == (0, 0)
+
+    def test_invocation_over_budget_warns_once(self, log_stream, log_level):
+        log_level("INFO")
+        with patch.object(common.log_handler, "budget", 1):
+            assert self._get()["statusCode"] == 200
+        records = self._records(log_stream)
+        assert [r["level"] for r in records] == ["WARNING"]
+        assert records[0]["message"].startswith("Log budget of 1 bytes exceeded")
+        assert common.log_handler.dropped > 0
@@ -22,3 +22,67 @@ variable "compliance_dashboard_account_id" {
   description = "AWS account ID of the remote account whose compliance-dashboard IAM role will invoke the Lambda functions"
   type        = string
 }
+
+variable "protected_buckets" {
+  description = "Protection rules for S3 buckets that must never be unlocked: exact names, \"prefix*\", globs or \"re:<regex>\""
+  type        = list(string)
+  default     = []
+}
+
+variable "protected_queues" {
+  description = "Protection rules for SQS queues that must never be unlocked: exact names, \"prefix*\", globs or \"re:<regex>\""
+  type        = list(string)
+  default     = []
+}
+
+variable "idempotency_table_enabled" {
+  description = "Create a DynamoDB table so repeated unlock requests are deduplicated across Lambda containers; without it results are only shared within a container"
+  type        = bool
+  default     = false
+}
+
+variable "async_jobs_enabled" {
+  description = "Create a DynamoDB job table and allow each Lambda function to invoke itself, enabling asynchronous unlock jobs ({\"async\": true}) polled with the STATUS action"
+  type        = bool
+  default     = false
+}
+
+variable "profile_invocations" {
+  description = "Profile every invocation of both Lambda functions (PROFILE_INVOCATIONS) and log the top functions; single invocations can also be profiled with {\"profile\": true}"
+  type        = bool
+  default     = false
+}
+
+variable "debug_log_sample_rate" {
+  description = "Fraction (0-1) of invocations of both Lambda functions logged at DEBUG, including the full event (POWERTOOLS_LOGGER_SAMPLE_RATE)"
+  type        = number
+  default     = 0
+}
+
+variable "unlock_request_queues_enabled" {
+  description = "Create an SQS queue (with a dead-letter queue) per Lambda function so unlock requests can be sent as messages and processed in batches"
+  type        = bool
+  default     = false
+}
+
+variable "unlock_request_batch_size" {
+  description = "Maximum number of unlock request messages passed to one Lambda invocation; values above 10 require a batching window"
+  type        = number
+  default     = 10
+
+  validation {
+    condition     = var.unlock_request_batch_size >= 1 && var.unlock_request_batch_size <= 10000
+    error_message = "unlock_request_batch_size must be between 1 and 10000."
+  }
+}
+
+variable "unlock_request_batching_window_seconds" {
+  description = "Maximum time in seconds to gather unlock request messages before invoking the Lambda function"
+  type        = number
+  default     = 0
+
+  validation {
+    condition     = var.unlock_request_batching_window_seconds >= 0 && var.unlock_request_batching_window_seconds <= 300
+    error_message = "unlock_request_batching_window_seconds must be between 0 and 300."
+  }
+}